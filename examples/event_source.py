@@ -2,11 +2,15 @@
 
 from __future__ import annotations
 
-import collections
+import itertools
 import os
+from typing import TYPE_CHECKING
 
-from jmaplib import Client, Ref, TypeState
-from jmaplib.methods import EmailChanges, EmailGet, EmailGetResponse
+from jmaplib import Client, Email
+from jmaplib.push import PushUpdater
+
+if TYPE_CHECKING:
+    from jmaplib.changes import ChangesPage
 
 MAX_EVENTS = 5
 
@@ -16,33 +20,23 @@ client = Client.create_with_api_token(
 )
 
 
-# Create a callback for email state changes
-def email_change_callback(prev_state: str | None, new_state: str | None) -> None:
-    if not prev_state or not new_state:
+# Create a callback for email changes
+def email_change_callback(
+    account_id: str, type_name: str, page: ChangesPage | None
+) -> None:
+    if not page:
         return
-    results = client.request(
-        [EmailChanges(since_state=prev_state), EmailGet(ids=Ref("/created"))]
-    )
-    email_get_response = results[1].response
-    assert isinstance(email_get_response, EmailGetResponse)
-    for new_email in email_get_response.data:
+    for new_email in page.created:
+        assert isinstance(new_email, Email)
         to = new_email.to[0].email if new_email.to else "(unknown)"
         print(f'Received email for "{to}" with subject "{new_email.subject}"')
 
 
-# Listen for events from the EventSource endpoint
-all_prev_state: dict[str, TypeState] = collections.defaultdict(TypeState)
-for i, event in enumerate(client.events):
-    if i >= MAX_EVENTS:
-        # Exit after receiving MAX_EVENTS events
-        print(f"Exiting after {i} events")
-        break
-    for account_id, new_state in event.data.changed.items():
-        prev_state = all_prev_state[account_id]
-        if new_state != prev_state:
-            if prev_state.email != new_state.email:
-                email_change_callback(prev_state.email, new_state.email)
-            all_prev_state[account_id] = new_state
+# Fetch email changes announced by events from the EventSource endpoint
+updater = PushUpdater(client)
+updater.register("Email", email_change_callback)
+updater.run(itertools.islice(client.events, MAX_EVENTS))
+print(f"Exiting after {MAX_EVENTS} events")
 
 # Example output:
 #
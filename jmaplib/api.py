@@ -65,6 +65,14 @@ class APIRequest(Model):
         metadata=config(encoder=lambda value: sorted(value)),
     )
 
+    @property
+    def account_ids(self) -> set[str]:
+        return {
+            arguments["accountId"]
+            for _, arguments, _ in self.method_calls
+            if isinstance(arguments, dict) and arguments.get("accountId")
+        }
+
     @staticmethod
     def from_calls(
         account_id: str,
@@ -0,0 +1,272 @@
+from __future__ import annotations
+
+import dataclasses
+import functools
+import threading
+from concurrent.futures import Future
+from typing import TYPE_CHECKING, Any, TypeVar, cast, overload
+
+from jmaplib import errors
+from jmaplib.client import ClientError
+from jmaplib.methods import Invocation, InvocationResponseOrError, Response
+from jmaplib.methods.base import ResponseCollector
+from jmaplib.ref import Ref, ResultReference
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator, Sequence
+
+    from jmaplib.client import Client
+    from jmaplib.methods import Request
+
+ResponseT = TypeVar("ResponseT", bound=Response)
+
+
+def iter_references(value: Any) -> Iterator[Ref | ResultReference]:
+    """Yield the result references in a method or any value nested in it."""
+    if isinstance(value, (Ref, ResultReference)):
+        yield value
+    elif dataclasses.is_dataclass(value) and not isinstance(value, type):
+        for f in dataclasses.fields(value):
+            yield from iter_references(getattr(value, f.name))
+    elif isinstance(value, dict):
+        for v in value.values():
+            yield from iter_references(v)
+    elif isinstance(value, (list, tuple)):
+        for v in value:
+            yield from iter_references(v)
+
+
+def uses_reference(value: Any) -> bool:
+    """Whether a method (or any value nested in it) contains a result reference."""
+    return next(iter_references(value), None) is not None
+
+
+def _referenced_positions(
+    position: int, invocation: Invocation, positions: dict[str, int]
+) -> Iterator[int]:
+    for ref in iter_references(invocation.method):
+        target = ref.result_of if isinstance(ref, ResultReference) else ref.method
+        if isinstance(target, int):
+            # Positions count from the start of the request, or back from the call
+            yield from range(position + target if target < 0 else 0, position)
+        elif target in positions:
+            yield positions[target]
+
+
+def _reference_groups(invocations: Sequence[Invocation]) -> list[list[Invocation]]:
+    """Group calls with all the calls they reference, in their original order.
+
+    References by call id join the two calls. References by position are
+    resolved within the request, so all calls from the target to the
+    referencing call are kept together to keep their positions.
+    """
+    parents = list(range(len(invocations)))
+
+    def _root(i: int) -> int:
+        while parents[i] != i:
+            parents[i] = parents[parents[i]]
+            i = parents[i]
+        return i
+
+    def _union(i: int, j: int) -> None:
+        # The earliest call is the root, so groups are ordered by first call
+        i, j = _root(i), _root(j)
+        parents[max(i, j)] = min(i, j)
+
+    positions = {invocation.id: i for i, invocation in enumerate(invocations)}
+    for i, invocation in enumerate(invocations):
+        for j in _referenced_positions(i, invocation, positions):
+            _union(j, i)
+    groups: dict[int, list[Invocation]] = {}
+    for i, invocation in enumerate(invocations):
+        groups.setdefault(_root(i), []).append(invocation)
+    return list(groups.values())
+
+
+def pack_invocations(
+    invocations: Sequence[Invocation], max_calls: int
+) -> list[list[Invocation]]:
+    """Split invocations into API requests of at most max_calls each.
+
+    Calls with result references are kept in the same request as the calls
+    they reference, directly or through other references.
+    """
+    chunks: list[list[Invocation]] = []
+    for group in _reference_groups(invocations):
+        if len(group) > max_calls:
+            raise ValueError(
+                f"{len(group)} chained method calls starting with {group[0].id}"
+                f" exceed the server limit of {max_calls} calls per request"
+            )
+        if chunks and len(chunks[-1]) + len(group) <= max_calls:
+            chunks[-1].extend(group)
+        else:
+            chunks.append(list(group))
+    return chunks
+
+
+def _response_type(invocation: Invocation) -> type[Response]:
+    """Look up the response class registered for the invocation's method."""
+    response_type = ResponseCollector.response_types.get(
+        invocation.method.jmap_method_name
+    )
+    if isinstance(response_type, type) and issubclass(response_type, Response):
+        return response_type
+    return Response
+
+
+class Batch:
+    """Collects method calls and sends them in as few API requests as possible.
+
+    Every added call returns a future that resolves to the response of that
+    call once the batch has been executed.
+    """
+
+    def __init__(self, client: Client) -> None:
+        self._client = client
+        self._invocations: list[Invocation] = []
+        self._futures: dict[str, Future[Any]] = {}
+        self._response_types: dict[str, type[Response]] = {}
+        self._sent = False
+
+    def __len__(self) -> int:
+        return len(self._invocations)
+
+    @overload
+    def add(self, call: Request) -> Future[Response]: ...  # pragma: no cover
+
+    @overload
+    def add(
+        self, call: Request, response_type: type[ResponseT]
+    ) -> Future[ResponseT]: ...  # pragma: no cover
+
+    def add(
+        self, call: Request, response_type: type[Response] | None = None
+    ) -> Future[Any]:
+        if self._sent:
+            raise RuntimeError("Batch has already been sent")
+        if isinstance(call, Invocation):
+            invocation = call
+        else:
+            invocation = Invocation(
+                id=f"{len(self._invocations)}.{call.jmap_method_name}", method=call
+            )
+        if invocation.id in self._futures:
+            raise ValueError(f"Duplicate method call ID {invocation.id}")
+        future: Future[Any] = Future()
+        self._invocations.append(invocation)
+        self._futures[invocation.id] = future
+        self._response_types[invocation.id] = response_type or _response_type(
+            invocation
+        )
+        return future
+
+    def execute(self) -> list[InvocationResponseOrError]:
+        """Send all calls from the calling thread and wait for the responses."""
+        results: list[InvocationResponseOrError] = []
+        chunks = self._chunks()
+        sent = 0
+        try:
+            for chunk in chunks:
+                results.extend(self._send(chunk))
+                sent += 1
+        except BaseException:
+            for unsent in chunks[sent + 1 :]:
+                for invocation in unsent:
+                    self._futures[invocation.id].cancel()
+            raise
+        return results
+
+    def submit(self) -> Future[list[InvocationResponseOrError]]:
+        """Send all calls in the background using the client's thread pool.
+
+        Independent API requests of the batch are sent concurrently; the
+        returned future resolves once all of them have completed.
+        """
+        chunks = self._chunks()
+        batch_future: Future[list[InvocationResponseOrError]] = Future()
+        chunk_results: list[list[InvocationResponseOrError] | None] = [None] * len(
+            chunks
+        )
+        remaining = [len(chunks)]
+        lock = threading.Lock()
+
+        def _chunk_done(index: int, chunk_future: Future[Any]) -> None:
+            exc = chunk_future.exception()
+            with lock:
+                if exc is None:
+                    chunk_results[index] = chunk_future.result()
+                remaining[0] -= 1
+                done = remaining[0] == 0
+            if exc is not None and not batch_future.done():
+                batch_future.set_exception(exc)
+            elif done and not batch_future.done():
+                batch_future.set_result(
+                    [r for results in chunk_results for r in results or []]
+                )
+
+        if not chunks:
+            batch_future.set_result([])
+        for i, chunk in enumerate(chunks):
+            chunk_future = self._client.executor.submit(self._send, chunk)
+            chunk_future.add_done_callback(functools.partial(_chunk_done, i))
+        return batch_future
+
+    def _chunks(self) -> list[list[Invocation]]:
+        if self._sent:
+            raise RuntimeError("Batch has already been sent")
+        self._sent = True
+        max_calls = self._client.jmap_session.capabilities.core.max_calls_in_request
+        return pack_invocations(self._invocations, max_calls)
+
+    def _send(self, chunk: list[Invocation]) -> list[InvocationResponseOrError]:
+        try:
+            results = cast(
+                "Sequence[InvocationResponseOrError]", self._client.request(chunk)
+            )
+        except BaseException as e:
+            for invocation in chunk:
+                if not self._futures[invocation.id].done():
+                    self._futures[invocation.id].set_exception(e)
+            raise
+        for invocation in chunk:
+            self._resolve(invocation, results)
+        return list(results)
+
+    def _resolve(
+        self,
+        invocation: Invocation,
+        results: Sequence[InvocationResponseOrError],
+    ) -> None:
+        future = self._futures[invocation.id]
+        if future.done():
+            return
+        matches = [r for r in results if r.id == invocation.id]
+        if not matches:
+            future.set_exception(
+                ClientError(
+                    f"No response received for method call {invocation.id}",
+                    result=results,
+                )
+            )
+            return
+        response = matches[0].response
+        if isinstance(response, errors.Error):
+            future.set_exception(
+                ClientError(
+                    f'Method call {invocation.id} failed with "{response.type}"',
+                    result=matches,
+                )
+            )
+            return
+        response_type = self._response_types[invocation.id]
+        if not isinstance(response, response_type):
+            future.set_exception(
+                ClientError(
+                    f"Unexpected {type(response).__name__} for method call"
+                    f" {invocation.id}, expected {response_type.__name__}",
+                    result=matches,
+                )
+            )
+            return
+        future.set_result(response)
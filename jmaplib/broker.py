@@ -0,0 +1,236 @@
+from __future__ import annotations
+
+import contextlib
+import fcntl
+import os
+import queue
+import socket
+import stat
+import threading
+import time
+from typing import TYPE_CHECKING, cast
+
+from jmaplib.logging import log
+from jmaplib.models import Event
+from jmaplib.sse import MAX_RECONNECT_DELAY, RECONNECT_DELAY
+
+if TYPE_CHECKING:
+    from collections.abc import Generator, Iterable
+    from types import TracebackType
+
+    from typing_extensions import Self
+
+    from jmaplib.client import Client
+
+# Events buffered per subscriber before it is disconnected as too slow
+SUBSCRIBER_QUEUE_SIZE = 1000
+
+_CLOSE = b""
+
+
+class BrokerRunningError(RuntimeError):
+    """Another event broker is already listening on the socket."""
+
+
+class _Subscriber:
+    def __init__(self, sock: socket.socket) -> None:
+        self.sock = sock
+        self.queue: queue.Queue[bytes] = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        threading.Thread(
+            target=self._write, name="jmaplib-broker-writer", daemon=True
+        ).start()
+
+    def send(self, line: bytes) -> bool:
+        try:
+            self.queue.put_nowait(line)
+        except queue.Full:
+            return False
+        return True
+
+    def close(self) -> None:
+        """Close the connection once the queued events have been sent."""
+        try:
+            self.queue.put_nowait(_CLOSE)
+        except queue.Full:
+            # Too slow to read the queued events anyway
+            with contextlib.suppress(OSError):
+                self.sock.shutdown(socket.SHUT_RDWR)
+
+    def _write(self) -> None:
+        with self.sock, contextlib.suppress(OSError):
+            while line := self.queue.get():
+                self.sock.sendall(line)
+
+
+class EventBroker:
+    """Shares one upstream event stream with local processes.
+
+    The broker reads the events of a single ``Client.events`` stream and
+    re-broadcasts them as newline-delimited JSON to every process connected
+    to the Unix domain socket at ``path``. Processes receive them with
+    ``broker_events()``. New subscribers first receive the last event seen,
+    so they start with the current states. Subscribers that can't keep up
+    with ``SUBSCRIBER_QUEUE_SIZE`` buffered events are disconnected.
+
+    Only one broker listens on a path: the broker holds an exclusive lock on
+    ``<path>.lock`` while it runs, and ``listen()`` raises BrokerRunningError
+    if another process holds it, so that process can subscribe instead. A
+    socket left behind by a broker that didn't close is replaced, but other
+    files at ``path`` are never removed.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        client: Client | None = None,
+        events: Iterable[Event] | None = None,
+    ) -> None:
+        if client is None and events is None:
+            raise ValueError("Either a client or events are required")
+        self.path = path
+        self.client = client
+        self.last_event: Event | None = None
+        self._events = events
+        self._lock = threading.Lock()
+        self._subscribers: list[_Subscriber] = []
+        self._listener: socket.socket | None = None
+        self._lock_fd: int | None = None
+
+    def __enter__(self) -> Self:
+        self.start()
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc_value: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        self.close()
+
+    @property
+    def subscribers(self) -> int:
+        with self._lock:
+            return len(self._subscribers)
+
+    def start(self) -> None:
+        """Listen on the socket and broadcast events in background threads."""
+        self.listen()
+        threading.Thread(target=self.run, name="jmaplib-broker", daemon=True).start()
+
+    def listen(self) -> None:
+        lock_fd = os.open(f"{self.path}.lock", os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            try:
+                fcntl.flock(lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                raise BrokerRunningError(
+                    f"An event broker is already listening on {self.path}"
+                ) from None
+            self._remove_stale_socket()
+            listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            listener.bind(self.path)
+            listener.listen()
+        except BaseException:
+            os.close(lock_fd)
+            raise
+        self._lock_fd = lock_fd
+        self._listener = listener
+        threading.Thread(
+            target=self._accept, name="jmaplib-broker-accept", daemon=True
+        ).start()
+
+    def run(self) -> None:
+        """Broadcast upstream events until the stream ends, then close."""
+        events = self._events
+        if events is None:
+            events = cast("Client", self.client).events
+        try:
+            for event in events:
+                self.broadcast(event)
+        finally:
+            self.close()
+
+    def broadcast(self, event: Event) -> None:
+        line = event.to_json().encode() + b"\n"
+        with self._lock:
+            self.last_event = event
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            if not subscriber.send(line):
+                log.warning("Disconnecting event broker subscriber too slow to read")
+                self._remove(subscriber)
+
+    def close(self) -> None:
+        listener, self._listener = self._listener, None
+        if listener is not None:
+            # Shutting down wakes up the accept() call before closing the socket
+            with contextlib.suppress(OSError):
+                listener.shutdown(socket.SHUT_RDWR)
+            listener.close()
+            with contextlib.suppress(FileNotFoundError):
+                os.unlink(self.path)
+        lock_fd, self._lock_fd = self._lock_fd, None
+        if lock_fd is not None:
+            # Another process can take over once the socket is gone
+            os.close(lock_fd)
+        with self._lock:
+            subscribers, self._subscribers = self._subscribers, []
+        for subscriber in subscribers:
+            subscriber.close()
+
+    def _remove_stale_socket(self) -> None:
+        try:
+            mode = os.stat(self.path).st_mode
+        except FileNotFoundError:
+            return
+        if not stat.S_ISSOCK(mode):
+            raise FileExistsError(f"{self.path} exists and is not a socket")
+        # The broker that created it no longer holds the lock
+        log.debug(f"Removing stale event broker socket {self.path}")
+        os.unlink(self.path)
+
+    def _accept(self) -> None:
+        while (listener := self._listener) is not None:
+            try:
+                sock, _ = listener.accept()
+            except OSError:
+                return
+            subscriber = _Subscriber(sock)
+            with self._lock:
+                if self.last_event is not None:
+                    subscriber.send(self.last_event.to_json().encode() + b"\n")
+                self._subscribers.append(subscriber)
+            log.debug(f"Event broker subscriber connected to {self.path}")
+
+    def _remove(self, subscriber: _Subscriber) -> None:
+        with self._lock:
+            if subscriber in self._subscribers:
+                self._subscribers.remove(subscriber)
+        subscriber.close()
+
+
+def broker_events(path: str, reconnect: bool = True) -> Generator[Event, None, None]:
+    """Yield the events re-broadcast by an ``EventBroker`` listening on path.
+
+    Like ``Client.events``, the connection is reestablished with exponential
+    backoff when it fails or the broker goes away, unless reconnect is False.
+    """
+    delay = RECONNECT_DELAY
+    while True:
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+                sock.connect(path)
+                with sock.makefile("rb") as lines:
+                    for line in lines:
+                        delay = RECONNECT_DELAY
+                        yield Event.from_json(line)
+        except OSError as e:
+            if not reconnect:
+                raise
+            log.debug(f"Event broker connection failed: {e}")
+        if not reconnect:
+            return
+        log.debug(f"Reconnecting to event broker in {delay} seconds")
+        time.sleep(delay)
+        delay = min(delay * 2, MAX_RECONNECT_DELAY)
@@ -0,0 +1,173 @@
+from __future__ import annotations
+
+import collections
+import dataclasses
+import itertools
+from collections.abc import Iterable, Sequence
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING
+
+from jmaplib.client import ClientError
+from jmaplib.logging import log
+from jmaplib.methods import (
+    EmailCopy,
+    EmailCopyResponse,
+    EmailParse,
+    EmailParseResponse,
+    EmailQuery,
+    EmailSetResponse,
+)
+from jmaplib.models import Email
+
+if TYPE_CHECKING:
+    from concurrent.futures import Future
+
+    from jmaplib.client import Client
+    from jmaplib.methods import Response
+    from jmaplib.models import EmailQueryFilter, SetError
+
+
+@dataclass
+class CopyResult:
+    """The aggregated results of all Email/copy calls of a bulk copy.
+
+    Emails are keyed by their id in the source account; ``created`` maps
+    them to the id of their copy.
+    """
+
+    created: dict[str, str] = field(default_factory=dict)
+    not_created: dict[str, SetError] = field(default_factory=dict)
+    destroyed: list[str] = field(default_factory=list)
+    not_destroyed: dict[str, SetError] = field(default_factory=dict)
+
+
+@dataclass
+class ParseResult:
+    """The aggregated results of all Email/parse calls, keyed by blob id."""
+
+    parsed: dict[str, Email] = field(default_factory=dict)
+    not_parsable: list[str] = field(default_factory=list)
+    not_found: list[str] = field(default_factory=list)
+
+
+def copy_emails(
+    client: Client,
+    from_account_id: str,
+    emails: EmailQueryFilter | Iterable[str],
+    mailbox_ids: dict[str, bool],
+    keywords: dict[str, bool] | None = None,
+    account_id: str | None = None,
+    on_success_destroy_original: bool = False,
+    chunk_size: int | None = None,
+) -> CopyResult:
+    """Copy emails from another account server-side, without their blobs.
+
+    ``emails`` is either the ids of the emails in ``from_account_id`` or a
+    filter to query them. The copies are created in ``mailbox_ids`` of
+    ``account_id`` (the client's account by default), optionally with new
+    ``keywords``. Emails are copied with one Email/copy call per chunk of up
+    to ``maxObjectsInSet`` ids, and up to ``maxConcurrentRequests`` calls
+    are sent concurrently. With ``on_success_destroy_original``, the copied
+    emails are destroyed in the source account, moving them.
+
+    Method errors raise a ``ClientError``, while emails that couldn't be
+    copied or destroyed are collected in the returned ``CopyResult``.
+    """
+    core = client.jmap_session.capabilities.core
+    chunk_size = min(chunk_size or core.max_objects_in_set, core.max_objects_in_set)
+    if isinstance(emails, Iterable):
+        email_ids = iter(emails)
+    else:
+        # Query all ids first, as moving emails changes the query results
+        email_ids = iter(
+            list(
+                client.iter_query(EmailQuery(filter=emails, account_id=from_account_id))
+            )
+        )
+    result = CopyResult()
+    pending: collections.deque[Future[Response | Sequence[Response]]] = (
+        collections.deque()
+    )
+    try:
+        while chunk := list(itertools.islice(email_ids, chunk_size)):
+            copy = EmailCopy(
+                from_account_id=from_account_id,
+                on_success_destroy_original=on_success_destroy_original,
+                create={
+                    email_id: Email(
+                        id=email_id, mailbox_ids=mailbox_ids, keywords=keywords
+                    )
+                    for email_id in chunk
+                },
+                account_id=account_id,
+            )
+            pending.append(client.executor.submit(_copy, client, copy))
+            if len(pending) >= core.max_concurrent_requests:
+                _record(result, pending.popleft().result())
+        while pending:
+            _record(result, pending.popleft().result())
+    finally:
+        for future in pending:
+            future.cancel()
+    log.debug(
+        f"Copied {len(result.created)} emails from account {from_account_id},"
+        f" {len(result.not_created)} not copied"
+    )
+    return result
+
+
+def _copy(client: Client, copy: EmailCopy) -> Response | Sequence[Response]:
+    return client.request(copy, raise_errors=True)
+
+
+def _record(result: CopyResult, responses: Response | Sequence[Response]) -> None:
+    if not isinstance(responses, Sequence):
+        responses = [responses]
+    for response in responses:
+        if isinstance(response, EmailCopyResponse):
+            for email_id, email in (response.created or {}).items():
+                if email is None or not email.id:
+                    raise ClientError(f"Email {email_id} copied without id", result=[])
+                result.created[email_id] = email.id
+            result.not_created.update(response.not_created or {})
+        elif isinstance(response, EmailSetResponse):
+            # Implicit Email/set call destroying the originals
+            result.destroyed += response.destroyed or []
+            result.not_destroyed.update(response.not_destroyed or {})
+        else:
+            raise ClientError(
+                f"Unexpected response for Email/copy: {response}", result=[]
+            )
+
+
+def parse_emails(client: Client, parse: EmailParse) -> ParseResult:
+    """Parse many uploaded messages server-side, as Email objects.
+
+    The blob ids of ``parse`` are split into Email/parse calls of up to
+    ``maxObjectsInGet`` ids, which keep the other arguments of ``parse``.
+    The calls are sent as a batch, so each API request parses up to
+    ``maxCallsInRequest`` chunks and requests are sent concurrently.
+    """
+    if not isinstance(parse.blob_ids, list):
+        raise TypeError("Blob ids of bulk Email/parse calls can't be references")
+    chunk_size = client.jmap_session.capabilities.core.max_objects_in_get
+    batch = client.batch()
+    futures = [
+        batch.add(
+            dataclasses.replace(parse, blob_ids=parse.blob_ids[i : i + chunk_size]),
+            EmailParseResponse,
+        )
+        for i in range(0, len(parse.blob_ids), chunk_size)
+    ]
+    batch.submit().result()
+    result = ParseResult()
+    for future in futures:
+        response = future.result()
+        result.parsed.update(response.parsed or {})
+        result.not_parsable += response.not_parsable or []
+        result.not_found += response.not_found or []
+    log.debug(
+        f"Parsed {len(result.parsed)} emails, {len(result.not_parsable)}"
+        f" not parsable, {len(result.not_found)} not found"
+    )
+    return result
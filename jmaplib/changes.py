@@ -0,0 +1,169 @@
+from __future__ import annotations
+
+import dataclasses
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, cast
+
+from jmaplib import errors
+from jmaplib.client import ClientError
+from jmaplib.coalesce import object_id
+from jmaplib.methods import (
+    EmailChanges,
+    EmailGet,
+    EmailSubmissionChanges,
+    EmailSubmissionGet,
+    IdentityChanges,
+    IdentityGet,
+    MailboxChanges,
+    MailboxGet,
+    ThreadChanges,
+    ThreadGet,
+)
+from jmaplib.methods.base import ChangesResponse
+from jmaplib.ref import Ref
+
+if TYPE_CHECKING:
+    from collections.abc import Generator, Iterator, Sequence
+    from concurrent.futures import Future
+
+    from jmaplib.client import Client
+    from jmaplib.methods import InvocationResponseOrError, Method
+    from jmaplib.methods.base import Changes, Get
+
+GET_METHODS: dict[type[Changes], type[Get]] = {
+    EmailChanges: EmailGet,
+    EmailSubmissionChanges: EmailSubmissionGet,
+    IdentityChanges: IdentityGet,
+    MailboxChanges: MailboxGet,
+    ThreadChanges: ThreadGet,
+}
+
+
+class CannotCalculateChangesError(ClientError):
+    """The server can't calculate the changes since the given state."""
+
+
+@dataclass
+class ChangesPage:
+    old_state: str
+    new_state: str
+    has_more_changes: bool
+    created: list[Any] = field(default_factory=list)
+    updated: list[Any] = field(default_factory=list)
+    destroyed: list[str] = field(default_factory=list)
+
+
+class ChangesWalker:
+    """Streams all changes since a state, one API request per page.
+
+    Each page chains the /changes method with /get methods for the created
+    and updated ids, unless ``fetch`` is disabled, in which case pages hold
+    the changed ids instead of objects. While ``hasMoreChanges`` is set, the
+    next page is requested in the background as soon as the current one has
+    arrived.
+
+    ``maxChanges`` is the given value, capped at the server's
+    ``maxObjectsInGet`` so the chained /get calls of a page are never too
+    large; pages have this fixed size.
+
+    ``state`` is the state up to which all pages have been consumed.
+    """
+
+    def __init__(
+        self,
+        client: Client,
+        changes: Changes,
+        fetch: bool = True,
+        get: Get | None = None,
+    ) -> None:
+        self._client = client
+        self._changes = changes
+        self._get: Get | None = None
+        if fetch:
+            self._get = get or GET_METHODS[type(changes)](ids=None)
+        max_objects = client.jmap_session.capabilities.core.max_objects_in_get
+        self._max_changes = min(changes.max_changes or max_objects, max_objects)
+        self.state = changes.since_state
+
+    def __iter__(self) -> Iterator[ChangesPage]:
+        page = self.fetch(self.state)
+        prefetch: Future[ChangesPage] | None = None
+        try:
+            while True:
+                if page.has_more_changes:
+                    prefetch = self._client.executor.submit(self.fetch, page.new_state)
+                yield page
+                self.state = page.new_state
+                if not prefetch:
+                    return
+                page = prefetch.result()
+                prefetch = None
+        finally:
+            if prefetch:
+                prefetch.cancel()
+
+    def fetch(self, since_state: str) -> ChangesPage:
+        """Request one page of changes since the given state."""
+        results = cast(
+            "Sequence[InvocationResponseOrError]",
+            self._client.request(self._calls(since_state)),
+        )
+        for r in results:
+            if isinstance(r.response, errors.CannotCalculateChanges):
+                raise CannotCalculateChangesError(
+                    f'Cannot calculate changes since state "{since_state}"',
+                    result=results,
+                )
+            if isinstance(r.response, errors.Error):
+                raise ClientError(
+                    f'Method call {r.id} failed with "{r.response.type}"',
+                    result=results,
+                )
+        return self._page(results)
+
+    def _calls(self, since_state: str) -> list[Method]:
+        calls: list[Method] = [
+            dataclasses.replace(
+                self._changes, since_state=since_state, max_changes=self._max_changes
+            )
+        ]
+        if self._get:
+            calls += [
+                dataclasses.replace(self._get, ids=Ref("/created", method=0)),
+                dataclasses.replace(self._get, ids=Ref("/updated", method=0)),
+            ]
+        return calls
+
+    def _page(self, results: Sequence[InvocationResponseOrError]) -> ChangesPage:
+        changes_response = results[0].response
+        if not isinstance(changes_response, ChangesResponse):
+            raise ClientError("Unexpected response for changes", result=results)
+        page = ChangesPage(
+            old_state=changes_response.old_state,
+            new_state=changes_response.new_state,
+            has_more_changes=changes_response.has_more_changes,
+            created=list(changes_response.created),
+            updated=list(changes_response.updated),
+            destroyed=list(changes_response.destroyed),
+        )
+        if self._get:
+            page.created = self._objects(results[1].response, page.created)
+            page.updated = self._objects(results[2].response, page.updated)
+        return page
+
+    @staticmethod
+    def _objects(response: Any, ids: list[str]) -> list[Any]:
+        objects = {object_id(o): o for o in getattr(response, "data", [])}
+        return [objects[i] for i in ids if i in objects]
+
+
+def iter_changes(
+    client: Client,
+    changes: Changes,
+    fetch: bool = True,
+    get: Get | None = None,
+) -> Generator[ChangesPage, None, str]:
+    """Yield pages of changes and return the final state."""
+    walker = ChangesWalker(client, changes, fetch=fetch, get=get)
+    yield from walker
+    return walker.state
@@ -2,15 +2,25 @@ from __future__ import annotations
 
 import functools
 import mimetypes
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import asdict, dataclass
 from pathlib import Path
-from typing import TYPE_CHECKING, Any, Literal, TypeVar, Union, cast, overload
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    BinaryIO,
+    Literal,
+    TypeVar,
+    Union,
+    cast,
+    overload,
+)
 
 import requests
-import sseclient
 from typing_extensions import Self
 
-from jmaplib import errors
+from jmaplib import constants, errors
 from jmaplib.api import APIRequest, APIResponse
 from jmaplib.auth import BearerAuth
 from jmaplib.logging import log
@@ -24,15 +34,24 @@ from jmaplib.methods import (
 )
 from jmaplib.models import Blob, Email, EmailBodyPart, Event
 from jmaplib.session import Session
+from jmaplib.sse import EventSource
+from jmaplib.websocket import WebSocketTransport
 
 if TYPE_CHECKING:
-    from collections.abc import Generator, Sequence
+    from collections.abc import Callable, Generator, Iterable, Sequence
     from pathlib import Path
+    from types import TracebackType
+
+    from jmaplib.batch import Batch
+    from jmaplib.changes import ChangesPage
+    from jmaplib.methods.base import Changes, Get, Query
+    from jmaplib.sse import ServerSentEvent
 
 RequestsAuth = Union[requests.auth.AuthBase, tuple[str, str]]
 ClientType = TypeVar("ClientType", bound="Client")
 
 REQUEST_TIMEOUT = 30
+DOWNLOAD_CHUNK_SIZE = 65536
 
 
 @dataclass
@@ -83,6 +102,12 @@ class Client:
         auth: RequestsAuth | None = None,
         last_event_id: str | None = None,
         event_source_config: EventSourceConfig | None = None,
+        use_websocket: bool = True,
+        account_id: str | None = None,
+        requests_session: requests.Session | None = None,
+        jmap_session: Session | None = None,
+        executor: ThreadPoolExecutor | None = None,
+        on_session_invalidated: Callable[[], None] | None = None,
     ) -> None:
         self._host: str = host
         self._auth: RequestsAuth | None = auth
@@ -90,22 +115,89 @@ class Client:
         self._event_source_config: EventSourceConfig = (
             event_source_config or EventSourceConfig()
         )
-        self._events: sseclient.SSEClient | None = None
+        self._events: Generator[ServerSentEvent, None, None] | None = None
+        self._use_websocket = use_websocket
+        self._account_id = account_id
+        # Shared sessions seed the cached properties
+        if requests_session is not None:
+            self.requests_session = requests_session
+        if jmap_session is not None:
+            self.jmap_session = jmap_session
+        # A shared executor is shut down by its owner, not by close()
+        self._shared_executor = executor
+        if executor is not None:
+            self.executor = executor
+        self._on_session_invalidated = on_session_invalidated
+        self._closed = False
+        self._websocket_lock = threading.Lock()
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc_value: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        self.close()
 
     @property
     def events(self) -> Generator[Event, None, None]:
+        websocket = self._websocket_transport()
+        if websocket and self._websocket_capability.get("supportsPush"):
+            yield from self._websocket_events(websocket)
+        else:
+            yield from self._event_source_events()
+
+    def _websocket_events(
+        self, websocket: WebSocketTransport
+    ) -> Generator[Event, None, None]:
+        for event in websocket.events(push_state=self._last_event_id):
+            self._last_event_id = event.id
+            yield event
+
+    def _event_source_events(self) -> Generator[Event, None, None]:
         if not self._events:
-            self._events = sseclient.SSEClient(
-                self.jmap_session.event_source_url.format(
-                    **asdict(self._event_source_config)
-                ),
-                auth=self.requests_session.auth,
-                last_id=self._last_event_id,
+            self._events = iter(
+                EventSource(
+                    self.requests_session,
+                    self.jmap_session.event_source_url.format(
+                        **asdict(self._event_source_config)
+                    ),
+                    last_event_id=self._last_event_id,
+                    ping=self._event_source_config.ping,
+                    closeafter=self._event_source_config.closeafter,
+                )
             )
-        for event in self._events:
-            if event.event != "state":
-                continue
-            yield Event.load_from_sseclient_event(event)
+        try:
+            for event in self._events:
+                if event.id is not None:
+                    self._last_event_id = event.id
+                if event.event != "state":
+                    continue
+                yield Event.load_from_server_sent_event(event)
+        except Exception:
+            # Connect again when the events are requested the next time
+            self._events = None
+            raise
+
+    def close_events(self) -> None:
+        """Close the event stream connection."""
+        if self._events:
+            self._events.close()
+            self._events = None
+
+    def close(self) -> None:
+        """Close the event stream, the WebSocket and the worker threads."""
+        self._closed = True
+        self.close_events()
+        websocket = self.__dict__.pop("websocket", None)
+        if websocket:
+            websocket.close()
+        executor = self.__dict__.pop("executor", None)
+        if executor and executor is not self._shared_executor:
+            executor.shutdown(wait=False)
 
     @functools.cached_property
     def requests_session(self) -> requests.Session:
@@ -123,8 +215,65 @@ class Client:
         log.debug(f"Retrieved JMAP session with state {session.state}")
         return session
 
+    @functools.cached_property
+    def websocket(self) -> WebSocketTransport | None:
+        url = self._websocket_capability.get("url")
+        if not self._use_websocket or not url:
+            return None
+        # Authenticate the upgrade request like the HTTP requests
+        request = self.requests_session.prepare_request(requests.Request("GET", url))
+        headers = {
+            name: value
+            for name, value in request.headers.items()
+            if name in ("Authorization", "Cookie")
+        }
+        # Use the proxy and TLS settings of the HTTP requests to the same host
+        http_url = url.replace("ws", "http", 1)
+        settings = self.requests_session.merge_environment_settings(
+            http_url, {}, None, None, None
+        )
+        try:
+            return WebSocketTransport.connect(
+                url,
+                headers,
+                proxy=requests.utils.select_proxy(http_url, settings["proxies"]),
+                verify=True if settings["verify"] is None else settings["verify"],
+                cert=settings["cert"],
+            )
+        except OSError as e:
+            log.warning(f"WebSocket connection to {url} failed, using HTTP: {e}")
+            return None
+
+    @property
+    def _websocket_capability(self) -> dict[str, Any]:
+        return cast(
+            "dict[str, Any]",
+            (self.jmap_session.capabilities.extensions or {}).get(
+                constants.JMAP_URN_WEBSOCKET, {}
+            ),
+        )
+
+    def _websocket_transport(self) -> WebSocketTransport | None:
+        # Concurrent first requests must not open a connection each
+        with self._websocket_lock:
+            if self.websocket and self.websocket.closed:
+                log.debug("WebSocket connection closed, reconnecting")
+                del self.websocket
+            return self.websocket
+
+    @functools.cached_property
+    def executor(self) -> ThreadPoolExecutor:
+        if self._closed:
+            raise RuntimeError("Client has been closed")
+        return ThreadPoolExecutor(
+            max_workers=self.jmap_session.capabilities.core.max_concurrent_requests,
+            thread_name_prefix="jmaplib",
+        )
+
     @property
     def account_id(self) -> str:
+        if self._account_id:
+            return self._account_id
         primary_account_id = (
             self.jmap_session.primary_accounts.core
             or self.jmap_session.primary_accounts.mail
@@ -136,15 +285,28 @@ class Client:
 
     def upload_blob(self, file_name: str | Path) -> Blob:
         mime_type, _ = mimetypes.guess_type(file_name)
-        upload_url = self.jmap_session.upload_url.format(accountId=self.account_id)
         with open(file_name, "rb") as f:
-            r = self.requests_session.post(
-                upload_url,
-                stream=True,
-                data=f,
-                headers={"Content-Type": mime_type},
-                timeout=REQUEST_TIMEOUT,
-            )
+            return self._upload(f, mime_type)
+
+    def upload_blob_data(
+        self,
+        data: bytes | Iterable[bytes],
+        mime_type: str = "application/octet-stream",
+    ) -> Blob:
+        """Upload a blob from bytes, or stream it from an iterable of chunks."""
+        return self._upload(data, mime_type)
+
+    def _upload(
+        self, data: bytes | BinaryIO | Iterable[bytes], mime_type: str | None
+    ) -> Blob:
+        upload_url = self.jmap_session.upload_url.format(accountId=self.account_id)
+        r = self.requests_session.post(
+            upload_url,
+            stream=True,
+            data=data,
+            headers={"Content-Type": mime_type},
+            timeout=REQUEST_TIMEOUT,
+        )
         r.raise_for_status()
         return Blob.from_dict(r.json())
 
@@ -210,6 +372,26 @@ class Client:
             return None
         return r.raw.data
 
+    def iter_blob(
+        self,
+        blob_id: str,
+        mime_type: str = "application/octet-stream",
+        name: str = "",
+        chunk_size: int = DOWNLOAD_CHUNK_SIZE,
+    ) -> Generator[bytes, None, None]:
+        """Stream the content of a blob without holding it in memory."""
+        blob_url = self.jmap_session.download_url.format(
+            accountId=self.account_id,
+            blobId=blob_id,
+            name=name,
+            type=mime_type,
+        )
+        with self.requests_session.get(
+            blob_url, stream=True, timeout=REQUEST_TIMEOUT
+        ) as r:
+            r.raise_for_status()
+            yield from r.iter_content(chunk_size=chunk_size)
+
     @overload
     def request(
         self,
@@ -274,13 +456,7 @@ class Client:
                 "single_response cannot be used with multiple JMAP request methods"
             )
         api_request = APIRequest.from_calls(self.account_id, calls)
-        # Validate all requested JMAP URNs are supported by the server
-        unsupported_urns = api_request.using - self.jmap_session.capabilities.urns
-        if unsupported_urns:
-            log.warning(
-                "URNs in request are not in server capabilities: "
-                f"{', '.join(sorted(unsupported_urns))}"
-            )
+        self._validate_request(api_request)
         # Execute request
         result: Sequence[InvocationResponseOrError] | Sequence[InvocationResponse] = (
             self._api_request(api_request)
@@ -304,7 +480,71 @@ class Client:
             return result[0].response
         return result
 
+    def batch(self) -> Batch:
+        from jmaplib.batch import Batch  # noqa: PLC0415  # avoid circular import
+
+        return Batch(self)
+
+    def iter_query(
+        self,
+        query: Query,
+        page_size: int | None = None,
+        get: Get | None = None,
+        strict: bool = False,
+    ) -> Generator[Any, None, None]:
+        from jmaplib.paging import iter_query  # noqa: PLC0415  # avoid circular import
+
+        return iter_query(self, query, page_size=page_size, get=get, strict=strict)
+
+    def iter_changes(
+        self,
+        changes: Changes,
+        fetch: bool = True,
+        get: Get | None = None,
+    ) -> Generator[ChangesPage, None, str]:
+        from jmaplib.changes import (  # noqa: PLC0415  # avoid circular import
+            iter_changes,
+        )
+
+        return iter_changes(self, changes, fetch=fetch, get=get)
+
+    def _validate_request(self, api_request: APIRequest) -> None:
+        # Validate all requested JMAP URNs are supported by the server
+        unsupported_urns = api_request.using - self.jmap_session.capabilities.urns
+        if unsupported_urns:
+            log.warning(
+                "URNs in request are not in server capabilities: "
+                f"{', '.join(sorted(unsupported_urns))}"
+            )
+        # Calls may be for other accounts than the client's account
+        accounts = self.jmap_session.accounts
+        unknown_accounts = api_request.account_ids - accounts.keys()
+        if accounts and unknown_accounts:
+            log.warning(
+                "Accounts in request are not in session accounts: "
+                f"{', '.join(sorted(unknown_accounts))}"
+            )
+
     def _api_request(self, request: APIRequest) -> Sequence[InvocationResponseOrError]:
+        websocket = self._websocket_transport()
+        if websocket:
+            api_response = websocket.request(request, timeout=REQUEST_TIMEOUT)
+        else:
+            api_response = self._http_api_request(request)
+        session = self.jmap_session
+        if api_response.session_state != session.state:
+            log.debug(
+                "JMAP response session state"
+                f' "{api_response.session_state}" differs from cached state'
+                f'"{session.state}", invalidating cached state'
+            )
+            # Another thread may already have dropped the cached session
+            self.__dict__.pop("jmap_session", None)
+            if self._on_session_invalidated:
+                self._on_session_invalidated()
+        return api_response.method_responses
+
+    def _http_api_request(self, request: APIRequest) -> APIResponse:
         raw_request = request.to_json()
         log.debug(f"Sending JMAP request {raw_request}")
         r = self.requests_session.post(
@@ -315,12 +555,4 @@ class Client:
         )
         r.raise_for_status()
         log.debug(f"Received JMAP response {r.text}")
-        api_response = APIResponse.from_dict(r.json())
-        if api_response.session_state != self.jmap_session.state:
-            log.debug(
-                "JMAP response session state"
-                f' "{api_response.session_state}" differs from cached state'
-                f'"{self.jmap_session.state}", invalidating cached state'
-            )
-            del self.jmap_session
-        return api_response.method_responses
+        return APIResponse.from_dict(r.json())
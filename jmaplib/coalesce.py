@@ -0,0 +1,205 @@
+from __future__ import annotations
+
+import dataclasses
+import json
+import threading
+from concurrent.futures import Future
+from typing import TYPE_CHECKING, Any, Literal, overload
+
+from jmaplib import errors
+from jmaplib.client import ClientError
+from jmaplib.logging import log
+from jmaplib.methods import Invocation, InvocationResponseOrError
+from jmaplib.methods.base import Get
+
+if TYPE_CHECKING:
+    from collections.abc import Hashable, Sequence
+    from types import TracebackType
+
+    from typing_extensions import Self
+
+    from jmaplib.batch import Batch
+    from jmaplib.client import Client
+    from jmaplib.methods import Method, Response, ResponseOrError
+
+DEFAULT_WINDOW = 0.005
+
+
+def object_id(obj: Any) -> str | None:
+    """The ID a /get method uses to refer to a returned object."""
+    return getattr(obj, "id", None) or getattr(obj, "email_id", None)
+
+
+def slice_get_response(
+    responses: Sequence[ResponseOrError], ids: Sequence[str]
+) -> ResponseOrError:
+    """Build the response for a subset of ids from merged /get responses."""
+    for response in responses:
+        if isinstance(response, errors.Error):
+            return response
+    first = responses[0]
+    if not hasattr(first, "data"):
+        return first
+    objects = {
+        object_id(obj): obj
+        for response in responses
+        for obj in getattr(response, "data", [])
+    }
+    changes: dict[str, Any] = {"data": [objects[i] for i in ids if i in objects]}
+    if hasattr(first, "not_found"):
+        changes["not_found"] = [i for i in ids if i not in objects]
+    return dataclasses.replace(first, **changes)
+
+
+@dataclasses.dataclass
+class _PendingGet:
+    method: Get
+    callers: list[tuple[list[str], Future[ResponseOrError]]] = dataclasses.field(
+        default_factory=list
+    )
+
+
+class RequestCoalescer:
+    """Merges concurrent /get calls into as few API requests as possible.
+
+    Calls submitted within ``window`` seconds of each other that only differ
+    in their ``ids`` are combined into one invocation (split to the server's
+    maxObjectsInGet), all invocations are sent together, and each caller
+    receives a response containing only the objects it asked for.
+    Any other method call is passed through to the client unchanged.
+    """
+
+    def __init__(self, client: Client, window: float = DEFAULT_WINDOW) -> None:
+        self._client = client
+        self._window = window
+        self._lock = threading.Lock()
+        self._pending: dict[Hashable, _PendingGet] = {}
+        self._timer: threading.Timer | None = None
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc_value: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        self.close()
+
+    @overload
+    def request(
+        self, call: Method, raise_errors: Literal[False] = False
+    ) -> ResponseOrError: ...  # pragma: no cover
+
+    @overload
+    def request(
+        self, call: Method, raise_errors: Literal[True]
+    ) -> Response: ...  # pragma: no cover
+
+    def request(
+        self, call: Method, raise_errors: bool = False
+    ) -> ResponseOrError | Response:
+        response = self.submit(call).result()
+        if raise_errors and isinstance(response, errors.Error):
+            raise ClientError(
+                "Errors found in method responses",
+                result=[InvocationResponseOrError(id="single", response=response)],
+            )
+        return response
+
+    def submit(self, call: Method) -> Future[ResponseOrError]:
+        key = self.coalesce_key(call)
+        if key is None:
+            return self._client.executor.submit(
+                self._client.request, call, single_response=True
+            )
+        assert isinstance(call, Get)  # noqa: S101  # ensured by coalesce_key
+        assert isinstance(call.ids, list)  # noqa: S101  # ensured by coalesce_key
+        future: Future[ResponseOrError] = Future()
+        with self._lock:
+            pending = self._pending.setdefault(key, _PendingGet(method=call))
+            pending.callers.append((list(call.ids), future))
+            if self._timer is None:
+                self._timer = threading.Timer(self._window, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+        return future
+
+    def coalesce_key(self, call: Method) -> Hashable | None:
+        if not isinstance(call, Get) or not isinstance(call.ids, list):
+            return None
+        try:
+            arguments = json.dumps(
+                dataclasses.replace(call, ids=None).to_dict(), sort_keys=True
+            )
+        except (TypeError, ValueError):
+            # Calls with result references can't be merged
+            return None
+        return (call.jmap_method_name, call.account_id, arguments)
+
+    def flush(self) -> None:
+        """Send all pending calls now."""
+        with self._lock:
+            pending = list(self._pending.values())
+            self._pending.clear()
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        if not pending:
+            return
+        batch = self._client.batch()
+        group_ids = [
+            self._add_group(batch, n, group) for n, group in enumerate(pending)
+        ]
+        log.debug(
+            f"Coalescing {sum(len(g.callers) for g in pending)} calls"
+            f" into {len(batch)} method calls"
+        )
+        try:
+            results = batch.submit().result()
+        except Exception as e:  # noqa: BLE001  # errors are passed to the callers
+            for group in pending:
+                for _, future in group.callers:
+                    future.set_exception(e)
+            return
+        responses = {r.id: r.response for r in results}
+        for group, invocation_ids in zip(pending, group_ids):
+            self._resolve_group(
+                group, [responses[i] for i in invocation_ids if i in responses]
+            )
+
+    def _add_group(self, batch: Batch, n: int, group: _PendingGet) -> list[str]:
+        max_objects = self._client.jmap_session.capabilities.core.max_objects_in_get
+        merged_ids = list(dict.fromkeys(i for ids, _ in group.callers for i in ids))
+        invocation_ids = []
+        for start in range(0, max(len(merged_ids), 1), max_objects):
+            invocation_id = f"{n}.{start}.{group.method.jmap_method_name}"
+            batch.add(
+                Invocation(
+                    id=invocation_id,
+                    method=dataclasses.replace(
+                        group.method, ids=merged_ids[start : start + max_objects]
+                    ),
+                )
+            )
+            invocation_ids.append(invocation_id)
+        return invocation_ids
+
+    @staticmethod
+    def _resolve_group(
+        group: _PendingGet, responses: Sequence[ResponseOrError]
+    ) -> None:
+        for ids, future in group.callers:
+            if responses:
+                future.set_result(slice_get_response(responses, ids))
+            else:
+                future.set_exception(
+                    ClientError(
+                        f"No response received for {group.method.jmap_method_name}",
+                        result=[],
+                    )
+                )
+
+    def close(self) -> None:
+        self.flush()
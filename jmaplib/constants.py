@@ -1,3 +1,4 @@
 JMAP_URN_CORE = "urn:ietf:params:jmap:core"
 JMAP_URN_MAIL = "urn:ietf:params:jmap:mail"
 JMAP_URN_SUBMISSION = "urn:ietf:params:jmap:submission"
+JMAP_URN_WEBSOCKET = "urn:ietf:params:jmap:websocket"
@@ -0,0 +1,152 @@
+from __future__ import annotations
+
+import dataclasses
+import queue
+import threading
+import time
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, cast
+
+from jmaplib.logging import log
+from jmaplib.models import Event, StateChange, TypeState
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable, Iterator
+
+_END = object()
+
+
+@dataclass
+class DebounceStats:
+    received: int = 0
+    emitted: int = 0
+    merged: int = 0
+    dropped: int = 0
+
+
+def merge_state_changes(state_change: StateChange, other: StateChange) -> StateChange:
+    """Return a StateChange with the latest states of both, preferring other."""
+    changed = dict(state_change.changed)
+    for account_id, type_state in other.changed.items():
+        updates = {
+            f.name: getattr(type_state, f.name)
+            for f in dataclasses.fields(type_state)
+            if getattr(type_state, f.name) is not None
+        }
+        changed[account_id] = dataclasses.replace(
+            changed.get(account_id, TypeState()), **updates
+        )
+    return StateChange(changed=changed, type=other.type or state_change.type)
+
+
+def new_states(state_change: StateChange, known: StateChange) -> StateChange:
+    """Return only the states of state_change that differ from known."""
+    changed = {}
+    for account_id, type_state in state_change.changed.items():
+        known_state = known.changed.get(account_id, TypeState())
+        updates = {
+            f.name: getattr(type_state, f.name)
+            for f in dataclasses.fields(type_state)
+            if getattr(type_state, f.name) not in (None, getattr(known_state, f.name))
+        }
+        if updates:
+            changed[account_id] = TypeState(**updates)
+    return StateChange(changed=changed, type=state_change.type)
+
+
+class EventDebouncer:
+    """Merges bursts of push events into single StateChange objects.
+
+    Events are read from the source in a background thread. A StateChange is
+    emitted once no new event arrived for ``window`` seconds, but no later
+    than ``max_latency`` seconds after the first event it contains. Emitted
+    StateChange objects hold the latest state of every account and type that
+    changed. Events that only repeat known states are dropped.
+    """
+
+    def __init__(
+        self,
+        events: Iterable[Event | StateChange],
+        window: float = 0.1,
+        max_latency: float = 1.0,
+    ) -> None:
+        self.window = window
+        self.max_latency = max_latency
+        self.stats = DebounceStats()
+        self._events = events
+        self._queue: queue.Queue[Any] = queue.Queue()
+        self._known = StateChange(changed={})
+        self._error: Exception | None = None
+
+    def __iter__(self) -> Iterator[StateChange]:
+        threading.Thread(
+            target=self._read, name="jmaplib-debounce", daemon=True
+        ).start()
+        while True:
+            pending = self._next()
+            if pending is None:
+                return
+            yield pending
+
+    def add(self, event: Event | StateChange) -> StateChange | None:
+        """Count an event, returning its states that aren't known yet."""
+        state_change = event.data if isinstance(event, Event) else event
+        self.stats.received += 1
+        changes = new_states(state_change, self._known)
+        if not changes.changed:
+            self.stats.dropped += 1
+            return None
+        self._known = merge_state_changes(self._known, changes)
+        return changes
+
+    def _next(self) -> StateChange | None:
+        pending: StateChange | None = None
+        deadline = first_deadline = 0.0
+        while not self._error:
+            timeout = None if pending is None else max(deadline - time.monotonic(), 0)
+            event = self._receive(timeout)
+            if event is None:
+                break
+            changes = self.add(event)
+            now = time.monotonic()
+            if changes is not None:
+                if pending is None:
+                    pending = changes
+                    first_deadline = now + self.max_latency
+                else:
+                    pending = merge_state_changes(pending, changes)
+                    self.stats.merged += 1
+                deadline = min(now + self.window, first_deadline)
+            # A backlog of queued events must not delay the pending states
+            if pending is not None and now >= first_deadline:
+                break
+        if pending is None:
+            if self._error:
+                raise self._error
+            return None
+        self.stats.emitted += 1
+        log.debug(f"Emitting merged state change {pending}")
+        return pending
+
+    def _receive(self, timeout: float | None) -> Event | StateChange | None:
+        """Return the next event, or None if the window ended or there are none."""
+        try:
+            item = self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+        if item is _END:
+            self._queue.put(_END)
+            return None
+        if isinstance(item, Exception):
+            # Raised once the pending states have been emitted
+            self._error = item
+            return None
+        return cast("Event | StateChange", item)
+
+    def _read(self) -> None:
+        try:
+            for event in self._events:
+                self._queue.put(event)
+        except Exception as e:  # noqa: BLE001  # raised in the consuming thread
+            self._queue.put(e)
+        self._queue.put(_END)
@@ -0,0 +1,180 @@
+from __future__ import annotations
+
+import collections
+from typing import TYPE_CHECKING, Callable
+
+from jmaplib.changes import CannotCalculateChangesError, ChangesWalker
+from jmaplib.client import ClientError
+from jmaplib.logging import log
+from jmaplib.methods import (
+    EmailSubmissionChanges,
+    EmailSubmissionGet,
+    EmailSubmissionGetResponse,
+)
+from jmaplib.models import Delivered, DeliveryStatus, Displayed, Event
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+
+    from jmaplib.client import Client
+    from jmaplib.models import EmailSubmission, StateChange
+
+# Called with the submission, the recipient address and its new status
+DeliveryCallback = Callable[["EmailSubmission", str, DeliveryStatus], None]
+
+
+class DeliveryTracker:
+    """Follows the delivery status of sent emails with EmailSubmission/changes.
+
+    Starting from ``state`` (or the current state), ``update()`` fetches only
+    the submissions changed since the last update and keeps them indexed by
+    id, email id and thread id. Callbacks registered with ``on_delivered()``
+    are called when the ``delivered`` status of a recipient changes from the
+    last one seen (``queued`` for new submissions), and callbacks registered
+    with ``on_displayed()`` when a recipient's ``displayed`` status becomes
+    ``yes``.
+
+    With ``handle()`` or ``run()``, updates are triggered by push events
+    with a new EmailSubmission state, and also by any EmailDelivery state
+    change if ``on_email_delivery`` is set, for servers that only announce
+    deliveries. If the changes can't be calculated, all tracked submissions
+    are fetched again.
+    """
+
+    def __init__(
+        self,
+        client: Client,
+        state: str | None = None,
+        on_email_delivery: bool = False,
+    ) -> None:
+        self.client = client
+        self.state = state
+        self.on_email_delivery = on_email_delivery
+        self.submissions: dict[str, EmailSubmission] = {}
+        self.by_email_id: dict[str, set[str]] = collections.defaultdict(set)
+        self.by_thread_id: dict[str, set[str]] = collections.defaultdict(set)
+        self._delivered_callbacks: list[DeliveryCallback] = []
+        self._displayed_callbacks: list[DeliveryCallback] = []
+
+    def on_delivered(self, callback: DeliveryCallback) -> None:
+        self._delivered_callbacks.append(callback)
+
+    def on_displayed(self, callback: DeliveryCallback) -> None:
+        self._displayed_callbacks.append(callback)
+
+    def for_email(self, email_id: str) -> list[EmailSubmission]:
+        return [self.submissions[i] for i in sorted(self.by_email_id.get(email_id, ()))]
+
+    def for_thread(self, thread_id: str) -> list[EmailSubmission]:
+        return [
+            self.submissions[i] for i in sorted(self.by_thread_id.get(thread_id, ()))
+        ]
+
+    def run(self, events: Iterable[Event | StateChange] | None = None) -> None:
+        """Update on events until the event stream ends."""
+        for event in events if events is not None else self.client.events:
+            self.handle(event)
+
+    def handle(self, event: Event | StateChange) -> None:
+        state_change = event.data if isinstance(event, Event) else event
+        type_state = state_change.changed.get(self.client.account_id)
+        if type_state is None:
+            return
+        if (
+            type_state.email_submission is not None
+            and type_state.email_submission != self.state
+        ) or (self.on_email_delivery and type_state.email_delivery is not None):
+            self.update()
+
+    def update(self) -> None:
+        """Fetch the submissions changed since the last update."""
+        if self.state is None:
+            self.state = self._get([]).state
+            return
+        walker = ChangesWalker(
+            self.client, EmailSubmissionChanges(since_state=self.state)
+        )
+        try:
+            for page in walker:
+                for submission in page.created + page.updated:
+                    self.add(submission)
+                for submission_id in page.destroyed:
+                    self.remove(submission_id)
+                self.state = page.new_state
+        except CannotCalculateChangesError:
+            log.debug(
+                f'Cannot calculate EmailSubmission changes since "{self.state}",'
+                f" fetching {len(self.submissions)} tracked submissions"
+            )
+            self._reload()
+
+    def add(self, submission: EmailSubmission) -> None:
+        """Track a submission, calling callbacks for changed statuses."""
+        if not submission.id:
+            raise ValueError("Tracked submissions need an id")
+        previous = self.submissions.get(submission.id)
+        self.remove(submission.id)
+        self.submissions[submission.id] = submission
+        if submission.email_id:
+            self.by_email_id[submission.email_id].add(submission.id)
+        if submission.thread_id:
+            self.by_thread_id[submission.thread_id].add(submission.id)
+        self._notify(submission, previous)
+
+    def _notify(
+        self, submission: EmailSubmission, previous: EmailSubmission | None
+    ) -> None:
+        previous_statuses = (previous.delivery_status if previous else None) or {}
+        for recipient, status in (submission.delivery_status or {}).items():
+            old = previous_statuses.get(recipient)
+            if status.delivered != (old.delivered if old else Delivered.QUEUED):
+                for callback in self._delivered_callbacks:
+                    callback(submission, recipient, status)
+            if status.displayed == Displayed.YES and (
+                old is None or old.displayed != Displayed.YES
+            ):
+                for callback in self._displayed_callbacks:
+                    callback(submission, recipient, status)
+
+    def remove(self, submission_id: str) -> None:
+        submission = self.submissions.pop(submission_id, None)
+        if submission is None:
+            return
+        for index, key in (
+            (self.by_email_id, submission.email_id),
+            (self.by_thread_id, submission.thread_id),
+        ):
+            if key and key in index:
+                index[key].discard(submission_id)
+                if not index[key]:
+                    del index[key]
+
+    def _reload(self) -> None:
+        submission_ids = list(self.submissions)
+        chunk_size = self.client.jmap_session.capabilities.core.max_objects_in_get
+        batch = self.client.batch()
+        futures = [
+            batch.add(
+                EmailSubmissionGet(ids=submission_ids[i : i + chunk_size]),
+                EmailSubmissionGetResponse,
+            )
+            for i in range(0, len(submission_ids), chunk_size)
+        ]
+        batch.execute()
+        state: str | None = None
+        for future in futures:
+            response = future.result()
+            state = state or response.state
+            for submission_id in response.not_found or []:
+                self.remove(submission_id)
+            for submission in response.data:
+                self.add(submission)
+        self.state = state or self._get([]).state
+
+    def _get(self, ids: list[str]) -> EmailSubmissionGetResponse:
+        response = self.client.request(
+            EmailSubmissionGet(ids=ids), raise_errors=True, single_response=True
+        )
+        if not isinstance(response, EmailSubmissionGetResponse):
+            raise ClientError("Unexpected response for EmailSubmission", result=[])
+        return response
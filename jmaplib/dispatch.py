@@ -0,0 +1,191 @@
+from __future__ import annotations
+
+import dataclasses
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Callable
+
+from jmaplib.debounce import merge_state_changes
+from jmaplib.logging import log
+from jmaplib.models import Event, StateChange, TypeState
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+    from types import TracebackType
+
+    from typing_extensions import Self
+
+    from jmaplib.client import Client
+
+DEFAULT_MAX_WORKERS = 4
+
+# TypeState fields of the data type names used in push events
+TYPE_FIELDS = {
+    data_type: field.name
+    for field in dataclasses.fields(TypeState)
+    for data_type in TypeState(**{field.name: ""}).to_dict()
+}
+
+SubscriberCallback = Callable[[StateChange], None]
+
+
+@dataclass
+class SubscriptionStats:
+    delivered: int = 0
+    merged: int = 0
+    failed: int = 0
+
+
+class Subscription:
+    """A subscriber's filter and its StateChange waiting to be delivered.
+
+    At most one StateChange is pending per subscription. Changes arriving
+    while the subscriber is still busy are merged into it, so a slow
+    subscriber receives fewer, merged notifications with the latest states
+    instead of holding up the event stream or other subscribers.
+    """
+
+    def __init__(
+        self,
+        dispatcher: EventDispatcher,
+        callback: SubscriberCallback,
+        account_id: str | None = None,
+        types: Iterable[str] | None = None,
+    ) -> None:
+        self.callback = callback
+        self.account_id = account_id
+        self.fields: frozenset[str] | None = None
+        if types is not None:
+            unknown = set(types) - set(TYPE_FIELDS)
+            if unknown:
+                raise ValueError(f"Unknown data types: {', '.join(sorted(unknown))}")
+            self.fields = frozenset(TYPE_FIELDS[t] for t in types)
+        self.stats = SubscriptionStats()
+        self._dispatcher = dispatcher
+        self._lock = threading.Lock()
+        self._pending: StateChange | None = None
+        self._running = False
+        self.active = True
+
+    def cancel(self) -> None:
+        self._dispatcher.unsubscribe(self)
+
+    def matches(self, state_change: StateChange) -> StateChange | None:
+        """Return the part of state_change the subscriber is interested in."""
+        changed = {}
+        for account_id, type_state in state_change.changed.items():
+            if self.account_id is not None and account_id != self.account_id:
+                continue
+            states = {
+                f.name: getattr(type_state, f.name)
+                for f in dataclasses.fields(type_state)
+                if getattr(type_state, f.name) is not None
+                and (self.fields is None or f.name in self.fields)
+            }
+            if states:
+                changed[account_id] = TypeState(**states)
+        if not changed:
+            return None
+        return StateChange(changed=changed, type=state_change.type)
+
+    def put(self, state_change: StateChange) -> bool:
+        """Queue state_change, returning if a delivery must be scheduled."""
+        with self._lock:
+            if self._pending is None:
+                self._pending = state_change
+            else:
+                self._pending = merge_state_changes(self._pending, state_change)
+                self.stats.merged += 1
+            if self._running:
+                return False
+            self._running = True
+            return True
+
+    def deliver(self) -> None:
+        """Call the callback until no StateChange is pending."""
+        while True:
+            with self._lock:
+                state_change, self._pending = self._pending, None
+                if state_change is None or not self.active:
+                    self._running = False
+                    return
+            try:
+                self.callback(state_change)
+            except Exception as e:  # noqa: BLE001  # must not stop other deliveries
+                self.stats.failed += 1
+                log.warning(f"Event subscriber {self.callback!r} failed: {e}")
+            else:
+                self.stats.delivered += 1
+
+
+class EventDispatcher:
+    """Fans out the events of one event stream to many subscribers.
+
+    Subscribers register a callback for an account and a set of data types
+    (``Email``, ``Mailbox``, ...), both optional, and are called with a
+    StateChange holding only the matching states. Callbacks run on a
+    bounded pool of ``max_workers`` threads, one delivery at a time per
+    subscriber. The stream is never blocked by subscribers: changes for a
+    busy subscriber are merged into its pending StateChange.
+    """
+
+    def __init__(
+        self, client: Client | None = None, max_workers: int = DEFAULT_MAX_WORKERS
+    ) -> None:
+        self.client = client
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="jmaplib-dispatch"
+        )
+        self._lock = threading.Lock()
+        self._subscriptions: list[Subscription] = []
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc_value: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        self.close()
+
+    def subscribe(
+        self,
+        callback: SubscriberCallback,
+        account_id: str | None = None,
+        types: Iterable[str] | None = None,
+    ) -> Subscription:
+        subscription = Subscription(self, callback, account_id, types)
+        with self._lock:
+            self._subscriptions.append(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        subscription.active = False
+        with self._lock:
+            if subscription in self._subscriptions:
+                self._subscriptions.remove(subscription)
+
+    def run(self, events: Iterable[Event | StateChange] | None = None) -> None:
+        """Dispatch events until the event stream ends."""
+        if events is None:
+            if self.client is None:
+                raise ValueError("Either a client or events are required")
+            events = self.client.events
+        for event in events:
+            self.dispatch(event)
+
+    def dispatch(self, event: Event | StateChange) -> None:
+        state_change = event.data if isinstance(event, Event) else event
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+        for subscription in subscriptions:
+            matched = subscription.matches(state_change)
+            if matched is not None and subscription.put(matched):
+                self._executor.submit(subscription.deliver)
+
+    def close(self, wait: bool = True) -> None:
+        """Stop the worker threads, waiting for running deliveries by default."""
+        self._executor.shutdown(wait=wait)
@@ -54,6 +54,11 @@ class AccountReadOnly(Error):
     _type = "accountReadOnly"
 
 
+@dataclass
+class AnchorNotFound(Error):
+    _type = "anchorNotFound"
+
+
 @dataclass
 class CannotCalculateChanges(Error):
     _type = "cannotCalculateChanges"
@@ -97,6 +102,11 @@ class ServerUnavailable(Error):
     _type = "serverUnavailable"
 
 
+@dataclass
+class TooManyChanges(Error):
+    _type = "tooManyChanges"
+
+
 @dataclass
 class UnknownMethod(Error):
     _type = "unknownMethod"
@@ -0,0 +1,388 @@
+from __future__ import annotations
+
+import collections
+import contextlib
+import json
+import os
+import re
+import tempfile
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import TYPE_CHECKING, Literal, cast
+
+import requests
+
+from jmaplib.changes import CannotCalculateChangesError, ChangesWalker
+from jmaplib.client import ClientError
+from jmaplib.importer import MAILDIR_KEYWORDS
+from jmaplib.logging import log
+from jmaplib.methods import (
+    EmailChanges,
+    EmailGet,
+    EmailGetResponse,
+    EmailQuery,
+    MailboxGet,
+    MailboxGetResponse,
+)
+from jmaplib.models import Comparator, EmailQueryFilterCondition
+from jmaplib.paging import iter_query_pages
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable, Iterator
+
+    from jmaplib.client import Client
+    from jmaplib.models import Email, Mailbox
+
+EXPORT_PROPERTIES = ["id", "blobId", "size", "mailboxIds", "keywords", "receivedAt"]
+
+# JMAP keywords mapped to Maildir info flags, which must be sorted in file names
+MAILDIR_FLAGS = {keyword: flag for flag, keyword in MAILDIR_KEYWORDS.items()}
+
+_FROM_LINE = re.compile(rb"^>*From ")
+
+ExportFormat = Literal["mbox", "maildir"]
+
+
+class ExportSizeError(ValueError):
+    """A downloaded message doesn't have the size announced by the server."""
+
+
+@dataclass
+class ExportStats:
+    exported: int = 0
+    failed: int = 0
+    removed: int = 0
+    bytes: int = 0
+    started: float = field(default_factory=time.monotonic)
+
+    @property
+    def messages_per_second(self) -> float:
+        elapsed = time.monotonic() - self.started
+        return self.exported / elapsed if elapsed > 0 else 0.0
+
+
+def _safe_name(name: str) -> str:
+    """A mailbox name usable as a single path component."""
+    for sep in (os.sep, os.altsep):
+        if sep:
+            name = name.replace(sep, "_")
+    return "_" * len(name) if name in (".", "..") else name
+
+
+def _check_size(email: Email, size: int) -> None:
+    if email.size is not None and size != email.size:
+        raise ExportSizeError(
+            f"Email {email.id} has {size} bytes instead of {email.size}"
+        )
+
+
+class MboxWriter:
+    """Appends messages to an mboxrd file, converting them to LF line endings."""
+
+    def __init__(self, path: Path, truncate: bool = False) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self.temp_dir = path.parent
+        self._file = path.open("wb" if truncate else "ab")
+
+    def add(self, email: Email, message_path: Path) -> None:
+        received_at = time.asctime(
+            email.received_at.utctimetuple() if email.received_at else time.gmtime(0)
+        )
+        self._file.write(f"From MAILER-DAEMON {received_at}\n".encode())
+        with message_path.open("rb") as message:
+            for line in message:
+                content = line.rstrip(b"\r\n")
+                if _FROM_LINE.match(content):
+                    content = b">" + content
+                self._file.write(content + b"\n")
+        self._file.write(b"\n")
+        message_path.unlink()
+
+    def remove(self, email_id: str) -> bool:
+        # Messages can't be removed from an mbox file without rewriting it
+        return False
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class MaildirWriter:
+    """Moves messages into a Maildir, named by their id and keywords."""
+
+    def __init__(self, path: Path, truncate: bool = False) -> None:
+        for subdir in ("cur", "new", "tmp"):
+            (path / subdir).mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self.temp_dir = path / "tmp"
+        if truncate:
+            for message_path in (path / "cur").iterdir():
+                message_path.unlink()
+
+    def add(self, email: Email, message_path: Path) -> None:
+        flags = "".join(
+            sorted(MAILDIR_FLAGS[k] for k in email.keywords or {} if k in MAILDIR_FLAGS)
+        )
+        target = self.path / "cur" / f"{email.id}:2,{flags}"
+        os.replace(message_path, target)
+        if email.received_at:
+            timestamp = email.received_at.timestamp()
+            os.utime(target, (timestamp, timestamp))
+
+    def remove(self, email_id: str) -> bool:
+        removed = False
+        for message_path in (self.path / "cur").glob(f"{email_id}:2,*"):
+            message_path.unlink()
+            removed = True
+        return removed
+
+    def close(self) -> None:
+        pass
+
+
+class EmailExporter:
+    """Exports the emails of an account to one mbox file or Maildir per mailbox.
+
+    Mailboxes are written to ``path`` following their hierarchy, and emails
+    in the order of their ``receivedAt`` date, as returned by Email/query.
+    The raw messages are downloaded by up to ``workers`` threads at a time
+    into temporary files next to the output, so whole messages are never
+    held in memory, and are written in order as soon as they are complete.
+    Messages whose size doesn't match ``Email.size`` are skipped.
+
+    The Email state of the export is saved in ``state_path``. If it exists,
+    only the changes since that state are exported: created emails are
+    appended, and in Maildirs, updated emails are replaced and destroyed
+    emails are removed. If the changes can't be calculated, the account is
+    exported again. Emails changed while the whole account is exported are
+    caught up with the changes since the state of the first query.
+    """
+
+    def __init__(
+        self,
+        client: Client,
+        path: str | Path,
+        format: ExportFormat = "mbox",  # noqa: A002  # mirrors the CLI option
+        state_path: str | Path | None = None,
+        workers: int | None = None,
+        page_size: int | None = None,
+    ) -> None:
+        self.client = client
+        self.path = Path(path)
+        self.format = format
+        self.state_path = Path(state_path) if state_path else None
+        self.workers = (
+            workers or client.jmap_session.capabilities.core.max_concurrent_requests
+        )
+        self.page_size = page_size
+        self.stats = ExportStats()
+        self._mailboxes: dict[str, Mailbox] = {}
+        self._writers: dict[str, MboxWriter | MaildirWriter] = {}
+        self._exported: set[str] = set()
+
+    def run(self) -> ExportStats:
+        self.path.mkdir(parents=True, exist_ok=True)
+        self._mailboxes = self._load_mailboxes()
+        state = self._load_state()
+        try:
+            if state is None:
+                state = self._export_all()
+            else:
+                try:
+                    state = self._export_changes(state)
+                except CannotCalculateChangesError:
+                    log.debug(f"Cannot export changes since {state}, exporting all")
+                    self._close_writers()
+                    state = self._export_all()
+        finally:
+            self._close_writers()
+        self._save_state(state)
+        return self.stats
+
+    def mailbox_path(self, mailbox: Mailbox) -> Path:
+        """The relative output path of a mailbox, following its parents."""
+        names = []
+        current: Mailbox | None = mailbox
+        while current is not None:
+            names.append(_safe_name(current.name or current.id or ""))
+            parent_id = current.parent_id
+            current = self._mailboxes.get(parent_id) if parent_id else None
+        path = Path(*reversed(names))
+        return path.with_name(f"{path.name}.mbox") if self.format == "mbox" else path
+
+    def _export_all(self) -> str:
+        states: list[str] = []
+        mailbox_ids = sorted(
+            self._mailboxes, key=lambda i: self.mailbox_path(self._mailboxes[i])
+        )
+        for mailbox_id in mailbox_ids:
+            self._writer(mailbox_id, truncate=True)
+            self._export(self._query_mailbox(mailbox_id, states))
+        if not states:
+            return self._current_state()
+        if any(state != states[0] for state in states):
+            # Emails changed while exporting, so catch up with the changes
+            # since the first query without exporting any email twice
+            log.debug(f"Email state changed from {states[0]} while exporting")
+            return self._export_changes(states[0])
+        return states[0]
+
+    def _query_mailbox(
+        self, mailbox_id: str, states: list[str]
+    ) -> Iterator[tuple[str, Email]]:
+        """Yield the emails of a mailbox, collecting the Email state of each page."""
+        pages = iter_query_pages(
+            self.client,
+            EmailQuery(
+                filter=EmailQueryFilterCondition(in_mailbox=mailbox_id),
+                sort=[Comparator(property="receivedAt")],
+            ),
+            page_size=self.page_size,
+            get=EmailGet(ids=None, properties=EXPORT_PROPERTIES),
+        )
+        for page in pages:
+            if page.state:
+                states.append(page.state)
+            for email in page.objects:
+                yield mailbox_id, email
+
+    def _export_changes(self, state: str) -> str:
+        walker = ChangesWalker(
+            self.client,
+            EmailChanges(since_state=state, max_changes=self.page_size),
+            get=EmailGet(ids=None, properties=EXPORT_PROPERTIES),
+        )
+        for page in walker:
+            exported = [e for e in page.created if e.id in self._exported]
+            changed = [e for e in page.created if e.id not in self._exported]
+            if self.format == "maildir":
+                # Emails exported in this run are replaced like updated ones
+                for email in exported + page.updated:
+                    self._remove(cast("str", email.id))
+                for email_id in page.destroyed:
+                    self._remove(email_id)
+                changed += exported + page.updated
+            self._export(
+                sorted(
+                    (
+                        (mailbox_id, email)
+                        for email in changed
+                        for mailbox_id in email.mailbox_ids or {}
+                        if mailbox_id in self._mailboxes
+                    ),
+                    key=lambda item: (
+                        self.mailbox_path(self._mailboxes[item[0]]),
+                        item[1].received_at.timestamp() if item[1].received_at else 0,
+                        item[1].id,
+                    ),
+                )
+            )
+        return walker.state
+
+    def _export(self, emails: Iterable[tuple[str, Email]]) -> None:
+        """Download emails concurrently and write them in the given order."""
+        pending: collections.deque[tuple[str, Email, Future[Path]]] = (
+            collections.deque()
+        )
+        with ThreadPoolExecutor(
+            max_workers=self.workers, thread_name_prefix="jmaplib-export"
+        ) as downloads:
+            for mailbox_id, email in emails:
+                temp_dir = self._writer(mailbox_id).temp_dir
+                pending.append(
+                    (
+                        mailbox_id,
+                        email,
+                        downloads.submit(self._download, email, temp_dir),
+                    )
+                )
+                if len(pending) >= self.workers * 2:
+                    self._write(*pending.popleft())
+            while pending:
+                self._write(*pending.popleft())
+
+    def _download(self, email: Email, temp_dir: Path) -> Path:
+        fd, name = tempfile.mkstemp(dir=temp_dir, prefix=".export-")
+        size = 0
+        try:
+            with os.fdopen(fd, "wb") as f:
+                for chunk in self.client.iter_blob(
+                    cast("str", email.blob_id), mime_type="message/rfc822"
+                ):
+                    f.write(chunk)
+                    size += len(chunk)
+            _check_size(email, size)
+        except BaseException:
+            os.unlink(name)
+            raise
+        return Path(name)
+
+    def _write(self, mailbox_id: str, email: Email, download: Future[Path]) -> None:
+        try:
+            message_path = download.result()
+        except (requests.RequestException, ExportSizeError) as e:
+            log.warning(f"Exporting email {email.id} failed: {e}")
+            self.stats.failed += 1
+            return
+        size = message_path.stat().st_size
+        self._writer(mailbox_id).add(email, message_path)
+        self._exported.add(cast("str", email.id))
+        self.stats.exported += 1
+        self.stats.bytes += size
+
+    def _remove(self, email_id: str) -> None:
+        for mailbox_id in self._mailboxes:
+            if self._writer(mailbox_id).remove(email_id):
+                self.stats.removed += 1
+
+    def _writer(
+        self, mailbox_id: str, truncate: bool = False
+    ) -> MboxWriter | MaildirWriter:
+        writer = self._writers.get(mailbox_id)
+        if writer is None:
+            path = self.path / self.mailbox_path(self._mailboxes[mailbox_id])
+            if not path.resolve().is_relative_to(self.path.resolve()):
+                raise ValueError(f"Mailbox path {path} is outside of {self.path}")
+            writer = (
+                MboxWriter(path, truncate=truncate)
+                if self.format == "mbox"
+                else MaildirWriter(path, truncate=truncate)
+            )
+            self._writers[mailbox_id] = writer
+        return writer
+
+    def _close_writers(self) -> None:
+        writers, self._writers = self._writers, {}
+        for writer in writers.values():
+            writer.close()
+
+    def _load_mailboxes(self) -> dict[str, Mailbox]:
+        response = self.client.request(
+            MailboxGet(ids=None), raise_errors=True, single_response=True
+        )
+        if not isinstance(response, MailboxGetResponse):
+            raise ClientError("Unexpected response for mailboxes", result=[])
+        return {m.id: m for m in response.data if m.id}
+
+    def _current_state(self) -> str:
+        response = self.client.request(
+            EmailGet(ids=[], properties=["id"]), raise_errors=True, single_response=True
+        )
+        if not isinstance(response, EmailGetResponse) or response.state is None:
+            raise ClientError("Unexpected response for Email state", result=[])
+        return response.state
+
+    def _load_state(self) -> str | None:
+        if self.state_path is None or not self.state_path.exists():
+            return None
+        return cast("str", json.loads(self.state_path.read_text())["Email"])
+
+    def _save_state(self, state: str) -> None:
+        if self.state_path is None:
+            return
+        temp_path = self.state_path.with_name(f"{self.state_path.name}.tmp")
+        temp_path.write_text(json.dumps({"Email": state}))
+        with contextlib.suppress(FileNotFoundError):
+            os.replace(temp_path, self.state_path)
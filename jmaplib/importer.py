@@ -0,0 +1,328 @@
+from __future__ import annotations
+
+import email.parser
+import email.policy
+import itertools
+import mailbox
+import os
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from pathlib import Path
+from typing import TYPE_CHECKING, Callable, cast
+
+import requests
+
+from jmaplib import errors
+from jmaplib.logging import log
+from jmaplib.methods import EmailImport, EmailImportResponse
+from jmaplib.models import EmailImport as EmailImportModel
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable, Iterator
+
+    from jmaplib.client import Client
+
+# Maildir info flags and mbox status letters mapped to JMAP keywords
+MAILDIR_KEYWORDS = {
+    "D": "$draft",
+    "F": "$flagged",
+    "R": "$answered",
+    "S": "$seen",
+}
+# "D" in an mbox X-Status header marks a deleted message, which has no keyword
+MBOX_KEYWORDS = {
+    "A": "$answered",
+    "F": "$flagged",
+    "R": "$seen",
+    "T": "$draft",
+}
+
+ProgressCallback = Callable[["ImportStats"], None]
+
+
+@dataclass
+class SourceMessage:
+    key: str
+    data: bytes
+    flags: str = ""
+
+
+@dataclass
+class ParsedMessage:
+    key: str
+    data: bytes
+    received_at: datetime | None
+    keywords: dict[str, bool] | None
+
+
+@dataclass
+class ImportStats:
+    imported: int = 0
+    failed: int = 0
+    skipped: int = 0
+    bytes: int = 0
+    started: float = field(default_factory=time.monotonic)
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+    @property
+    def messages_per_second(self) -> float:
+        elapsed = self.elapsed
+        return self.imported / elapsed if elapsed > 0 else 0.0
+
+
+def iter_messages(path: str | Path) -> Iterator[SourceMessage]:
+    """Yield the raw messages of an mbox file or a Maildir directory.
+
+    The keys include the path of the mbox file or Maildir, so checkpoints
+    can be shared by imports of several sources.
+    """
+    path = Path(path).resolve()
+    if path.is_dir():
+        yield from _iter_maildir(path)
+        return
+    mbox = mailbox.mbox(path, create=False)
+    for index, key in enumerate(mbox.iterkeys()):
+        yield SourceMessage(key=f"mbox:{path}:{index}", data=mbox.get_bytes(key))
+
+
+def _iter_maildir(path: Path) -> Iterator[SourceMessage]:
+    # The flags are read from the file names, so each file is only read once
+    files = {}
+    for subdir in ("new", "cur"):
+        # Maildirs created by some tools lack an empty new/ or cur/
+        if not (path / subdir).is_dir():
+            continue
+        for name in os.listdir(path / subdir):
+            if not name.startswith("."):
+                key, _, info = name.partition(mailbox.Maildir.colon)
+                files[key] = (path / subdir / name, info)
+    for key in sorted(files):
+        file, info = files[key]
+        yield SourceMessage(
+            key=f"maildir:{path}:{key}",
+            data=file.read_bytes(),
+            flags=info[2:] if info.startswith("2,") else "",
+        )
+
+
+def _mbox_flags(headers: email.message.Message) -> str:
+    return (headers.get("Status", "") + headers.get("X-Status", "")).strip()
+
+
+def parse_message(message: SourceMessage) -> ParsedMessage:
+    """Convert a message to CRLF line endings and extract its import metadata.
+
+    Runs in worker processes, so it only uses picklable arguments. The flags
+    of mbox messages are read from their Status and X-Status headers here.
+    """
+    lines = message.data.splitlines()
+    data = b"\r\n".join(lines) + b"\r\n"
+    headers = email.parser.BytesHeaderParser(policy=email.policy.compat32).parsebytes(
+        data
+    )
+    if message.key.startswith("maildir:"):
+        keyword_map, flags = MAILDIR_KEYWORDS, message.flags
+    else:
+        keyword_map, flags = MBOX_KEYWORDS, _mbox_flags(headers)
+    keywords = {keyword_map[flag]: True for flag in flags if flag in keyword_map}
+    return ParsedMessage(
+        key=message.key,
+        data=data,
+        received_at=_received_at(headers),
+        keywords=keywords or None,
+    )
+
+
+def _received_at(headers: email.message.Message) -> datetime | None:
+    received = headers.get("Received")
+    candidates = [received.rsplit(";", 1)[-1] if received else None, headers["Date"]]
+    for value in candidates:
+        if not value:
+            continue
+        try:
+            date = parsedate_to_datetime(value.strip())
+        except (TypeError, ValueError):
+            continue
+        if date.tzinfo is None:
+            date = date.replace(tzinfo=timezone.utc)
+        return date.astimezone(timezone.utc)
+    return None
+
+
+class ImportCheckpoint:
+    """Records the keys of imported messages in a file to resume imports.
+
+    The file is appended to after every batch, so at most the messages of
+    the batch being imported are imported again after an interruption.
+    """
+
+    def __init__(self, path: str | Path) -> None:
+        self.path = Path(path)
+        self.done: set[str] = set()
+        if self.path.exists():
+            self.done = set(self.path.read_text().splitlines())
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.done
+
+    def add(self, keys: Iterable[str]) -> None:
+        keys = [k for k in keys if k not in self.done]
+        if not keys:
+            return
+        with self.path.open("a") as f:
+            f.write("".join(f"{k}\n" for k in keys))
+            f.flush()
+            os.fsync(f.fileno())
+        self.done.update(keys)
+
+
+class EmailImporter:
+    """Imports the messages of mbox files and Maildirs into a mailbox.
+
+    Messages are parsed in a pool of ``processes`` worker processes (or in
+    the calling thread with ``processes=0``), uploaded concurrently up to the
+    server's ``maxConcurrentUpload``, and imported with one Email/import call
+    per batch of up to ``maxObjectsInSet`` messages. While a batch is
+    uploaded and imported, the next one is read and parsed by the worker
+    processes. With a checkpoint, messages imported by an earlier run are
+    skipped. ``progress`` is called with the stats after every batch.
+    """
+
+    def __init__(
+        self,
+        client: Client,
+        mailbox_id: str,
+        checkpoint: ImportCheckpoint | str | Path | None = None,
+        processes: int | None = None,
+        batch_size: int | None = None,
+        progress: ProgressCallback | None = None,
+    ) -> None:
+        self.client = client
+        self.mailbox_id = mailbox_id
+        self.checkpoint = (
+            checkpoint
+            if checkpoint is None or isinstance(checkpoint, ImportCheckpoint)
+            else ImportCheckpoint(checkpoint)
+        )
+        self.processes = processes
+        self.progress = progress
+        core = client.jmap_session.capabilities.core
+        self.batch_size = min(
+            batch_size or core.max_objects_in_set, core.max_objects_in_set
+        )
+        self.max_uploads = core.max_concurrent_upload
+        self.stats = ImportStats()
+
+    def run(self, path: str | Path, limit: int | None = None) -> ImportStats:
+        messages: Iterable[SourceMessage] = iter_messages(path)
+        if limit:
+            messages = itertools.islice(messages, limit)
+        pending = self._skip_imported(messages)
+        parse_executor: Executor | None = (
+            ProcessPoolExecutor(max_workers=self.processes)
+            if self.processes != 0
+            else None
+        )
+        with ThreadPoolExecutor(
+            max_workers=self.max_uploads, thread_name_prefix="jmaplib-upload"
+        ) as uploads:
+            try:
+                batch = list(itertools.islice(pending, self.batch_size))
+                parsed = self._parse(batch, parse_executor)
+                while batch:
+                    # Read and parse the next batch while this one is uploaded
+                    batch = list(itertools.islice(pending, self.batch_size))
+                    next_parsed = self._parse(batch, parse_executor)
+                    self._import_batch(list(parsed), uploads)
+                    parsed = next_parsed
+            finally:
+                if parse_executor:
+                    parse_executor.shutdown()
+        log.debug(
+            f"Imported {self.stats.imported} messages"
+            f" ({self.stats.messages_per_second:.1f}/s),"
+            f" {self.stats.failed} failed, {self.stats.skipped} skipped"
+        )
+        return self.stats
+
+    def _skip_imported(
+        self, messages: Iterable[SourceMessage]
+    ) -> Iterator[SourceMessage]:
+        for message in messages:
+            if self.checkpoint is not None and message.key in self.checkpoint:
+                self.stats.skipped += 1
+                continue
+            yield message
+
+    @staticmethod
+    def _parse(
+        batch: list[SourceMessage], parse_executor: Executor | None
+    ) -> Iterator[ParsedMessage]:
+        # Worker processes start parsing right away, the calling thread lazily
+        if parse_executor:
+            return parse_executor.map(parse_message, batch)
+        return map(parse_message, batch)
+
+    def _upload(self, message: ParsedMessage) -> str | None:
+        try:
+            return self.client.upload_blob_data(message.data, "message/rfc822").id
+        except requests.RequestException as e:
+            log.warning(f"Uploading message {message.key} failed: {e}")
+            return None
+
+    def _import_batch(
+        self, messages: list[ParsedMessage], uploads: ThreadPoolExecutor
+    ) -> None:
+        blob_ids = list(uploads.map(self._upload, messages))
+        uploaded = {
+            str(i): (message, blob_id)
+            for i, (message, blob_id) in enumerate(zip(messages, blob_ids))
+            if blob_id is not None
+        }
+        self.stats.failed += len(messages) - len(uploaded)
+        if uploaded:
+            response = self.client.request(
+                EmailImport(
+                    emails={
+                        creation_id: EmailImportModel(
+                            blob_id=blob_id,
+                            mailbox_ids={self.mailbox_id: True},
+                            keywords=message.keywords,
+                            received_at=message.received_at,
+                        )
+                        for creation_id, (message, blob_id) in uploaded.items()
+                    }
+                ),
+                raise_errors=False,
+            )
+            self._record(uploaded, cast("EmailImportResponse | errors.Error", response))
+        if self.progress:
+            self.progress(self.stats)
+
+    def _record(
+        self,
+        uploaded: dict[str, tuple[ParsedMessage, str]],
+        response: EmailImportResponse | errors.Error,
+    ) -> None:
+        if isinstance(response, errors.Error):
+            log.warning(f"Email/import failed: {response}")
+            self.stats.failed += len(uploaded)
+            return
+        imported = []
+        for creation_id, (message, _) in uploaded.items():
+            if response.created and creation_id in response.created:
+                imported.append(message.key)
+                self.stats.bytes += len(message.data)
+            else:
+                error = (response.not_created or {}).get(creation_id)
+                log.warning(f"Importing message {message.key} failed: {error}")
+        self.stats.imported += len(imported)
+        self.stats.failed += len(uploaded) - len(imported)
+        if self.checkpoint is not None:
+            self.checkpoint.add(imported)
@@ -0,0 +1,149 @@
+from __future__ import annotations
+
+import dataclasses
+from typing import TYPE_CHECKING, cast
+
+from jmaplib import errors
+from jmaplib.client import ClientError
+from jmaplib.logging import log
+from jmaplib.methods import (
+    EmailQuery,
+    EmailQueryChanges,
+    EmailQueryChangesResponse,
+    EmailQueryResponse,
+)
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator
+
+    from jmaplib.client import Client
+
+
+class LiveQuery:
+    """Keeps the ids of an Email/query window up to date.
+
+    ``load()`` runs the query and keeps the ids of its first ``limit``
+    results, or all of them without a limit. ``refresh()`` then sends
+    Email/queryChanges with the same filter, sort and ``collapse_threads``
+    and applies the removed and added ids to the cached window, setting
+    ``upToId`` to the last id of the window so the server can leave out
+    changes after it. Ids moving up into the window when others were removed
+    are fetched with a query for the missing positions. If the changes can't
+    be calculated, the query is run again.
+    """
+
+    def __init__(
+        self, client: Client, query: EmailQuery, max_changes: int | None = None
+    ) -> None:
+        if query.position or query.anchor:
+            raise ValueError("Live queries start at the first result")
+        self.client = client
+        self.query = query
+        self.max_changes = max_changes
+        self.ids: list[str] = []
+        self.limit = query.limit
+        self.query_state: str | None = None
+        self.can_calculate_changes = False
+        self.total: int | None = None
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.ids)
+
+    def load(self) -> None:
+        response = self._query(0, self.query.limit)
+        self.ids = list(cast("list[str]", response.ids))
+        # The server may return fewer ids than asked for, or than there are
+        if response.limit is not None and (
+            self.query.limit is None or response.limit < self.query.limit
+        ):
+            self.limit = response.limit
+        self.query_state = response.query_state
+        self.can_calculate_changes = response.can_calculate_changes
+        self.total = response.total
+
+    def refresh(self) -> bool:
+        """Apply the changes since the last query, return if the ids changed."""
+        previous = self.ids
+        if self.query_state is None or not self.can_calculate_changes:
+            self.load()
+            return self.ids != previous
+        response = self.client.request(self._changes_call(self.query_state))
+        if isinstance(response, (errors.CannotCalculateChanges, errors.TooManyChanges)):
+            log.debug(
+                f'Cannot calculate Email query changes since "{self.query_state}"'
+                f' ("{response.type}"), running the query again'
+            )
+            self.load()
+            return self.ids != previous
+        if isinstance(response, errors.Error):
+            raise ClientError(
+                f'Email/queryChanges failed with "{response.type}"', result=[]
+            )
+        if not isinstance(response, EmailQueryChangesResponse):
+            raise ClientError("Unexpected response for query changes", result=[])
+        self._apply(response)
+        return self.ids != previous
+
+    def _changes_call(self, query_state: str) -> EmailQueryChanges:
+        full = self.limit is not None and len(self.ids) >= self.limit
+        return EmailQueryChanges(
+            filter=self.query.filter,
+            sort=self.query.sort,
+            collapse_threads=self.query.collapse_threads,
+            since_query_state=query_state,
+            max_changes=self.max_changes,
+            up_to_id=self.ids[-1] if full and self.ids else None,
+            calculate_total=bool(self.query.calculate_total),
+        )
+
+    def _apply(self, changes: EmailQueryChangesResponse) -> None:
+        removed = set(changes.removed)
+        ids = [i for i in self.ids if i not in removed]
+        complete = True
+        for item in sorted(changes.added, key=lambda a: a.index):
+            if self.limit is not None and item.index >= self.limit:
+                break
+            if item.index > len(ids):
+                # Ids between the window and this one are not known
+                complete = False
+                break
+            ids.insert(item.index, item.id)
+        self.ids = ids[: self.limit] if self.limit is not None else ids
+        self.query_state = changes.new_query_state
+        if changes.total is not None:
+            self.total = changes.total
+        if not complete and self.limit is None:
+            self.load()
+        elif self.limit is not None and len(self.ids) < self.limit:
+            self._fill(changes.new_query_state, self.limit)
+
+    def _fill(self, query_state: str, limit: int) -> None:
+        """Fetch the ids that moved up into the window."""
+        if self.total is not None and len(self.ids) >= self.total:
+            return
+        response = self._query(len(self.ids), limit - len(self.ids))
+        if response.query_state != query_state:
+            log.debug(
+                f'Email query state changed from "{query_state}" to'
+                f' "{response.query_state}", running the query again'
+            )
+            self.load()
+            return
+        self.ids += [i for i in cast("list[str]", response.ids) if i not in self.ids]
+        if response.total is not None:
+            self.total = response.total
+
+    def _query(self, position: int, limit: int | None) -> EmailQueryResponse:
+        response = self.client.request(
+            dataclasses.replace(self.query, position=position, limit=limit),
+            raise_errors=True,
+            single_response=True,
+        )
+        if not isinstance(response, EmailQueryResponse) or not isinstance(
+            response.ids, list
+        ):
+            raise ClientError("Unexpected response for query", result=[])
+        return response
@@ -0,0 +1,220 @@
+from __future__ import annotations
+
+import collections
+from typing import TYPE_CHECKING, cast
+
+from jmaplib import errors
+from jmaplib.client import ClientError
+from jmaplib.logging import log
+from jmaplib.methods import (
+    MailboxChanges,
+    MailboxChangesResponse,
+    MailboxGet,
+    MailboxGetResponse,
+)
+from jmaplib.models import Mailbox
+from jmaplib.ref import Ref
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator, Sequence
+
+    from jmaplib.client import Client
+    from jmaplib.methods import InvocationResponseOrError
+
+# Properties whose changes move mailboxes in the tree
+TREE_PROPERTIES = {"name", "parentId", "sortOrder"}
+
+
+def _sort_key(mailbox: Mailbox) -> tuple[int, str]:
+    return (mailbox.sort_order or 0, mailbox.name or "")
+
+
+class MailboxCache:
+    """Keeps all mailboxes of an account in memory, indexed as a tree.
+
+    ``load()`` fetches every mailbox once; lookups by id, role, name and
+    full path (names of the ancestors joined with ``separator``) and tree
+    traversal then need no requests. ``refresh()`` applies the changes since
+    the last state with one request per page of Mailbox/changes: when the
+    server reports that only some properties changed, such as the counts,
+    only those are fetched and merged into the cached mailboxes. If the
+    changes can't be calculated, all mailboxes are loaded again.
+    """
+
+    def __init__(self, client: Client, separator: str = "/") -> None:
+        self.client = client
+        self.separator = separator
+        self.state: str | None = None
+        self.mailboxes: dict[str, Mailbox] = {}
+        self._by_role: dict[str, Mailbox] = {}
+        self._by_name: dict[str, list[Mailbox]] = {}
+        self._by_path: dict[str, Mailbox] = {}
+        self._paths: dict[str, str] = {}
+        self._children: dict[str | None, list[Mailbox]] = {}
+
+    def __len__(self) -> int:
+        return len(self.mailboxes)
+
+    def __contains__(self, mailbox_id: str) -> bool:
+        return mailbox_id in self.mailboxes
+
+    def __getitem__(self, mailbox_id: str) -> Mailbox:
+        return self.mailboxes[mailbox_id]
+
+    def load(self) -> None:
+        response = self.client.request(
+            MailboxGet(ids=None), raise_errors=True, single_response=True
+        )
+        if not isinstance(response, MailboxGetResponse):
+            raise ClientError("Unexpected response for mailboxes", result=[])
+        self.mailboxes = {m.id: m for m in response.data if m.id}
+        self.state = response.state
+        self._index()
+
+    def refresh(self) -> None:
+        """Apply the changes since the last load or refresh."""
+        if self.state is None:
+            self.load()
+            return
+        has_more_changes = True
+        while has_more_changes:
+            results = cast(
+                "Sequence[InvocationResponseOrError]",
+                self.client.request(self._changes_calls(self.state)),
+            )
+            if any(
+                isinstance(r.response, errors.CannotCalculateChanges) for r in results
+            ):
+                log.debug(f'Cannot calculate Mailbox changes since "{self.state}"')
+                self.load()
+                return
+            has_more_changes = self._apply(results)
+
+    def by_role(self, role: str) -> Mailbox | None:
+        return self._by_role.get(role.lower())
+
+    def by_name(self, name: str) -> list[Mailbox]:
+        return list(self._by_name.get(name, []))
+
+    def by_path(self, path: str) -> Mailbox | None:
+        return self._by_path.get(path)
+
+    def path(self, mailbox_id: str) -> str:
+        return self._paths[mailbox_id]
+
+    def parent(self, mailbox_id: str) -> Mailbox | None:
+        parent_id = self.mailboxes[mailbox_id].parent_id
+        return self.mailboxes.get(parent_id) if parent_id else None
+
+    def children(self, mailbox_id: str | None = None) -> list[Mailbox]:
+        """The child mailboxes, or the top-level mailboxes without an id."""
+        return list(self._children.get(mailbox_id, []))
+
+    def ancestors(self, mailbox_id: str) -> list[Mailbox]:
+        """The parents of a mailbox, from the top-level mailbox down."""
+        ancestors = []
+        parent = self.parent(mailbox_id)
+        while parent is not None and parent.id:
+            ancestors.append(parent)
+            parent = self.parent(parent.id)
+        return ancestors[::-1]
+
+    def walk(self, mailbox_id: str | None = None) -> Iterator[tuple[int, Mailbox]]:
+        """Yield the depth and mailbox of all descendants, depth first."""
+        stack = [(0, m) for m in reversed(self.children(mailbox_id))]
+        while stack:
+            depth, mailbox = stack.pop()
+            yield depth, mailbox
+            stack += [(depth + 1, m) for m in reversed(self.children(mailbox.id))]
+
+    def _changes_calls(self, state: str) -> list[MailboxChanges | MailboxGet]:
+        return [
+            MailboxChanges(since_state=state),
+            MailboxGet(ids=Ref("/created", method=0)),
+            # Only the updated properties, or all of them if the server sets none
+            MailboxGet(
+                ids=Ref("/updated", method=0),
+                properties=Ref("/updatedProperties", method=0),
+            ),
+        ]
+
+    def _apply(self, results: Sequence[InvocationResponseOrError]) -> bool:
+        """Apply a page of changes and return whether there are more."""
+        for r in results:
+            if isinstance(r.response, errors.Error):
+                raise ClientError(
+                    f'Method call {r.id} failed with "{r.response.type}"',
+                    result=results,
+                )
+        changes, created, updated = (r.response for r in results)
+        if not (
+            isinstance(changes, MailboxChangesResponse)
+            and isinstance(created, MailboxGetResponse)
+            and isinstance(updated, MailboxGetResponse)
+        ):
+            raise ClientError("Unexpected response for Mailbox changes", result=results)
+        properties = changes.updated_properties
+        for mailbox in created.data + updated.data:
+            if mailbox.id:
+                self.mailboxes[mailbox.id] = (
+                    self._merge(self.mailboxes[mailbox.id], mailbox, properties)
+                    if properties is not None and mailbox.id in self.mailboxes
+                    else mailbox
+                )
+        for mailbox_id in changes.destroyed:
+            self.mailboxes.pop(mailbox_id, None)
+        if (
+            changes.created
+            or changes.destroyed
+            or properties is None
+            or TREE_PROPERTIES.intersection(properties)
+        ):
+            self._index()
+        else:
+            # Only properties such as the counts changed, the tree is the same
+            self._reindex_objects()
+        self.state = changes.new_state
+        return changes.has_more_changes
+
+    @staticmethod
+    def _merge(cached: Mailbox, update: Mailbox, properties: list[str]) -> Mailbox:
+        data = cached.to_dict()
+        changed = update.to_dict()
+        data.update({p: changed.get(p) for p in properties if p != "id"})
+        return Mailbox.from_dict(data)
+
+    def _index(self) -> None:
+        children: dict[str | None, list[Mailbox]] = collections.defaultdict(list)
+        for mailbox in self.mailboxes.values():
+            parent_id = (
+                mailbox.parent_id if mailbox.parent_id in self.mailboxes else None
+            )
+            children[parent_id].append(mailbox)
+        for siblings in children.values():
+            siblings.sort(key=_sort_key)
+        self._children = dict(children)
+        self._paths = {}
+        for _, mailbox in self.walk():
+            parent = self.parent(cast("str", mailbox.id))
+            name = mailbox.name or ""
+            self._paths[cast("str", mailbox.id)] = (
+                f"{self._paths[cast('str', parent.id)]}{self.separator}{name}"
+                if parent
+                else name
+            )
+        self._reindex_objects()
+
+    def _reindex_objects(self) -> None:
+        """Point the indexes to the current mailbox objects."""
+        self._by_role = {m.role.lower(): m for m in self.mailboxes.values() if m.role}
+        by_name: dict[str, list[Mailbox]] = collections.defaultdict(list)
+        for mailbox in self.mailboxes.values():
+            by_name[mailbox.name or ""].append(mailbox)
+        self._by_name = dict(by_name)
+        self._by_path = {
+            path: self.mailboxes[mailbox_id] for mailbox_id, path in self._paths.items()
+        }
+        self._children = {
+            parent_id: [self.mailboxes[cast("str", m.id)] for m in siblings]
+            for parent_id, siblings in self._children.items()
+        }
@@ -18,6 +18,8 @@ from jmaplib.methods.email import (
     EmailGetResponse,
     EmailImport,
     EmailImportResponse,
+    EmailParse,
+    EmailParseResponse,
     EmailQuery,
     EmailQueryChanges,
     EmailQueryChangesResponse,
@@ -79,6 +81,8 @@ __all__ = [
     "EmailImport",
     "EmailImport",
     "EmailImportResponse",
+    "EmailParse",
+    "EmailParseResponse",
     "EmailQuery",
     "EmailQueryChanges",
     "EmailQueryChangesResponse",
@@ -37,7 +37,8 @@ class Method(MethodBase):
 
 @dataclass
 class MethodWithAccount(Method):
-    account_id: str | None = field(init=False, default=None)
+    # Calls without an explicit account use the client's account
+    account_id: str | None = field(default=None, kw_only=True)
 
 
 class ResponseCollector(MethodBase):
@@ -128,7 +129,7 @@ class GetMethod:
 @dataclass
 class Get(MethodWithAccount, GetMethod):
     ids: ListOrRef[str] | None
-    properties: list[str] | None = None
+    properties: ListOrRef[str] | None = None
 
 
 @dataclass
@@ -158,6 +159,22 @@ class ImportResponse(ResponseWithAccount, ImportMethod):
     new_state: str = field(metadata=config(field_name="newState"))
 
 
+class ParseMethod:
+    method_type: str | None = "parse"
+
+
+@dataclass
+class Parse(MethodWithAccount, ParseMethod):
+    blob_ids: ListOrRef[str]
+    properties: list[str] | None = None
+
+
+@dataclass
+class ParseResponse(ResponseWithAccount, ParseMethod):
+    not_parsable: list[str] | None = None
+    not_found: list[str] | None = None
+
+
 class SetMethod:
     method_type: str | None = "set"
 
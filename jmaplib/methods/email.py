@@ -15,6 +15,8 @@ from jmaplib.methods.base import (
     GetResponse,
     Import,
     ImportResponse,
+    Parse,
+    ParseResponse,
     Query,
     QueryChanges,
     QueryChangesResponse,
@@ -82,6 +84,22 @@ class EmailImportResponse(EmailBase, ImportResponse):
     )
 
 
+@dataclass
+class EmailParse(EmailBase, Parse):
+    body_properties: list[str] | None = None
+    fetch_text_body_values: bool | None = None
+    fetch_html_body_values: bool | None = field(
+        metadata=config(field_name="fetchHTMLBodyValues"), default=None
+    )
+    fetch_all_body_values: bool | None = None
+    max_body_value_bytes: int | None = None
+
+
+@dataclass
+class EmailParseResponse(EmailBase, ParseResponse):
+    parsed: dict[str, Email] | None = None
+
+
 @dataclass
 class EmailQuery(EmailBase, Query):
     filter: EmailQueryFilter | None = None
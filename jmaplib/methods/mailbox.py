@@ -35,7 +35,8 @@ class MailboxChanges(MailboxBase, Changes):
 
 @dataclass
 class MailboxChangesResponse(MailboxBase, ChangesResponse):
-    pass
+    # Set when only these properties (e.g. counts) of updated mailboxes changed
+    updated_properties: list[str] | None = None
 
 
 @dataclass
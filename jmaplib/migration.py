@@ -0,0 +1,275 @@
+from __future__ import annotations
+
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, cast
+
+import requests
+
+from jmaplib import errors
+from jmaplib.client import ClientError
+from jmaplib.importer import ImportCheckpoint, ImportStats
+from jmaplib.logging import log
+from jmaplib.methods import (
+    EmailGet,
+    EmailImport,
+    EmailImportResponse,
+    EmailQuery,
+    MailboxGet,
+    MailboxGetResponse,
+    MailboxSet,
+    MailboxSetResponse,
+)
+from jmaplib.models import EmailImport as EmailImportModel
+from jmaplib.models import Mailbox
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable, Iterator
+    from pathlib import Path
+
+    from jmaplib.client import Client
+    from jmaplib.models import Email
+
+MIGRATION_PROPERTIES = [
+    "id",
+    "blobId",
+    "size",
+    "mailboxIds",
+    "keywords",
+    "receivedAt",
+    "messageId",
+]
+
+
+class BlobStream:
+    """Chunks of a download with a known size, uploaded without buffering.
+
+    The size lets requests send a ``Content-Length`` header instead of a
+    chunked upload, which not all servers accept.
+    """
+
+    def __init__(self, chunks: Iterable[bytes], size: int) -> None:
+        self._chunks = chunks
+        self._size = size
+
+    def __iter__(self) -> Iterator[bytes]:
+        return iter(self._chunks)
+
+    def __len__(self) -> int:
+        return self._size
+
+
+def get_mailboxes(client: Client) -> list[Mailbox]:
+    response = client.request(
+        MailboxGet(ids=None), raise_errors=True, single_response=True
+    )
+    if not isinstance(response, MailboxGetResponse):
+        raise ClientError("Unexpected response for mailboxes", result=[])
+    return response.data
+
+
+def _depth(mailbox: Mailbox, mailboxes: dict[str, Mailbox]) -> int:
+    depth = 0
+    while mailbox.parent_id and mailbox.parent_id in mailboxes:
+        mailbox = mailboxes[mailbox.parent_id]
+        depth += 1
+    return depth
+
+
+def map_mailboxes(source: Client, destination: Client) -> dict[str, str]:
+    """Map source mailbox ids to destination ids, creating missing mailboxes.
+
+    Mailboxes with a role are mapped to the destination mailbox with the
+    same role. Others are mapped by name below their mapped parent, and
+    created in the destination if there is none, one level at a time.
+    """
+    source_mailboxes = {m.id: m for m in get_mailboxes(source) if m.id}
+    destination_mailboxes = [m for m in get_mailboxes(destination) if m.id]
+    by_role = {m.role: m.id for m in destination_mailboxes if m.role}
+    by_path = {(m.parent_id, m.name): m.id for m in destination_mailboxes}
+    mapping: dict[str, str] = {}
+    levels = itertools.groupby(
+        sorted(source_mailboxes.values(), key=lambda m: _depth(m, source_mailboxes)),
+        key=lambda m: _depth(m, source_mailboxes),
+    )
+    for _, level in levels:
+        create: dict[str, Mailbox] = {}
+        for mailbox in level:
+            source_id = cast("str", mailbox.id)
+            parent_id = mapping.get(mailbox.parent_id) if mailbox.parent_id else None
+            destination_id = (mailbox.role and by_role.get(mailbox.role)) or (
+                by_path.get((parent_id, mailbox.name))
+            )
+            if destination_id:
+                mapping[source_id] = destination_id
+                continue
+            create[source_id] = Mailbox(
+                name=mailbox.name,
+                parent_id=parent_id,
+                sort_order=mailbox.sort_order,
+                is_subscribed=mailbox.is_subscribed,
+            )
+        if create:
+            mapping.update(_create_mailboxes(destination, create))
+    return mapping
+
+
+def _create_mailboxes(client: Client, create: dict[str, Mailbox]) -> dict[str, str]:
+    response = client.request(
+        MailboxSet(create=create), raise_errors=True, single_response=True
+    )
+    if not isinstance(response, MailboxSetResponse):
+        raise ClientError("Unexpected response for mailbox creation", result=[])
+    created = response.created or {}
+    if response.not_created:
+        raise ClientError(
+            f"Creating mailboxes failed: {response.not_created}", result=[]
+        )
+    mapping = {}
+    for creation_id, mailbox in created.items():
+        if mailbox is None or not mailbox.id:
+            raise ClientError(f"Mailbox {creation_id} created without id", result=[])
+        log.debug(f"Created mailbox {create[creation_id].name} as {mailbox.id}")
+        mapping[creation_id] = mailbox.id
+    return mapping
+
+
+class Migration:
+    """Copies all emails of an account to an account on another server.
+
+    The mailbox tree is mapped first (see ``map_mailboxes()``). Then emails
+    are transferred in batches of up to the destination's
+    ``maxObjectsInSet``: ``workers`` threads each stream a message from a
+    source download directly into a destination upload, and each batch is
+    imported with one Email/import call keeping the keywords and the
+    received date. Emails whose Message-ID already exists in the destination
+    are skipped. With a checkpoint, emails migrated by an earlier run are
+    skipped without any request.
+    """
+
+    def __init__(
+        self,
+        source: Client,
+        destination: Client,
+        checkpoint: ImportCheckpoint | str | Path | None = None,
+        workers: int = 4,
+        batch_size: int | None = None,
+    ) -> None:
+        self.source = source
+        self.destination = destination
+        self.checkpoint = (
+            checkpoint
+            if checkpoint is None or isinstance(checkpoint, ImportCheckpoint)
+            else ImportCheckpoint(checkpoint)
+        )
+        self.workers = workers
+        max_objects = destination.jmap_session.capabilities.core.max_objects_in_set
+        self.batch_size = min(batch_size or max_objects, max_objects)
+        self.stats = ImportStats()
+        self.mailbox_ids: dict[str, str] = {}
+        self._message_ids: set[str] = set()
+
+    def run(self) -> ImportStats:
+        self.mailbox_ids = map_mailboxes(self.source, self.destination)
+        self._message_ids = self._destination_message_ids()
+        emails = self.source.iter_query(
+            EmailQuery(),
+            get=EmailGet(ids=None, properties=MIGRATION_PROPERTIES),
+        )
+        pending = self._skip_migrated(emails)
+        with ThreadPoolExecutor(
+            max_workers=self.workers, thread_name_prefix="jmaplib-migrate"
+        ) as transfers:
+            while batch := list(itertools.islice(pending, self.batch_size)):
+                self._migrate_batch(batch, transfers)
+        log.debug(
+            f"Migrated {self.stats.imported} emails"
+            f" ({self.stats.messages_per_second:.1f}/s),"
+            f" {self.stats.failed} failed, {self.stats.skipped} skipped"
+        )
+        return self.stats
+
+    def _destination_message_ids(self) -> set[str]:
+        emails = self.destination.iter_query(
+            EmailQuery(), get=EmailGet(ids=None, properties=["id", "messageId"])
+        )
+        return {e.message_id[0] for e in emails if e.message_id}
+
+    def _skip_migrated(self, emails: Iterable[Email]) -> Iterator[Email]:
+        for email in emails:
+            message_id = email.message_id[0] if email.message_id else None
+            if (self.checkpoint is not None and email.id in self.checkpoint.done) or (
+                message_id and message_id in self._message_ids
+            ):
+                self.stats.skipped += 1
+                continue
+            yield email
+
+    def _transfer(self, email: Email) -> str | None:
+        """Stream the message from the source to the destination."""
+        chunks = self.source.iter_blob(
+            cast("str", email.blob_id), mime_type="message/rfc822"
+        )
+        data = BlobStream(chunks, email.size) if email.size else chunks
+        try:
+            return self.destination.upload_blob_data(data, "message/rfc822").id
+        except requests.RequestException as e:
+            log.warning(f"Transferring email {email.id} failed: {e}")
+            return None
+
+    def _migrate_batch(
+        self, emails: list[Email], transfers: ThreadPoolExecutor
+    ) -> None:
+        blob_ids = list(transfers.map(self._transfer, emails))
+        uploaded = {
+            str(i): (email, blob_id)
+            for i, (email, blob_id) in enumerate(zip(emails, blob_ids))
+            if blob_id is not None
+        }
+        self.stats.failed += len(emails) - len(uploaded)
+        if not uploaded:
+            return
+        response = self.destination.request(
+            EmailImport(
+                emails={
+                    creation_id: EmailImportModel(
+                        blob_id=blob_id,
+                        mailbox_ids={
+                            self.mailbox_ids[m]: True
+                            for m in email.mailbox_ids or {}
+                            if m in self.mailbox_ids
+                        },
+                        keywords=email.keywords or None,
+                        received_at=email.received_at,
+                    )
+                    for creation_id, (email, blob_id) in uploaded.items()
+                }
+            ),
+            raise_errors=False,
+        )
+        self._record(uploaded, cast("EmailImportResponse | errors.Error", response))
+
+    def _record(
+        self,
+        uploaded: dict[str, tuple[Email, str]],
+        response: EmailImportResponse | errors.Error,
+    ) -> None:
+        if isinstance(response, errors.Error):
+            log.warning(f"Email/import failed: {response}")
+            self.stats.failed += len(uploaded)
+            return
+        migrated = []
+        for creation_id, (email, _) in uploaded.items():
+            if response.created and creation_id in response.created:
+                migrated.append(cast("str", email.id))
+                self.stats.bytes += email.size or 0
+                # Only emails that arrived make later copies redundant
+                if email.message_id:
+                    self._message_ids.add(email.message_id[0])
+            else:
+                error = (response.not_created or {}).get(creation_id)
+                log.warning(f"Importing email {email.id} failed: {error}")
+        self.stats.imported += len(migrated)
+        self.stats.failed += len(uploaded) - len(migrated)
+        if self.checkpoint is not None:
+            self.checkpoint.add(migrated)
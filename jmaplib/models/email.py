@@ -104,6 +104,7 @@ class EmailQueryFilterCondition(Model):
     to: StrOrRef | None = None
     cc: StrOrRef | None = None
     bcc: StrOrRef | None = None
+    subject: StrOrRef | None = None
     body: StrOrRef | None = None
     header: ListOrRef[str] | None = None
 
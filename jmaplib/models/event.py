@@ -2,14 +2,14 @@ from __future__ import annotations
 
 import json
 from dataclasses import dataclass, field
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Any
 
 from dataclasses_json import config
 
 from jmaplib.serializer import Model
 
 if TYPE_CHECKING:
-    import sseclient
+    from jmaplib.sse import ServerSentEvent
 
 
 @dataclass
@@ -22,6 +22,9 @@ class TypeState(Model):
     email_delivery: str | None = field(
         metadata=config(field_name="EmailDelivery"), default=None
     )
+    email_submission: str | None = field(
+        metadata=config(field_name="EmailSubmission"), default=None
+    )
     thread: str | None = field(metadata=config(field_name="Thread"), default=None)
 
 
@@ -37,6 +40,12 @@ class Event(Model):
     data: StateChange
 
     @classmethod
-    def load_from_sseclient_event(cls, event: sseclient.Event) -> Event:
+    def load_from_sseclient_event(cls, event: Any) -> Event:
+        """Load an event read with sseclient, which is no longer a dependency."""
+        data = json.loads(event.data)
+        return cls.from_dict({"id": event.id, "data": data})
+
+    @classmethod
+    def load_from_server_sent_event(cls, event: ServerSentEvent) -> Event:
         data = json.loads(event.data)
         return cls.from_dict({"id": event.id, "data": data})
@@ -64,3 +64,6 @@ class SetError(Model):
     already_exists: str | None = None
     not_found: list[str] | None = None
     properties: list[str] | None = None
+    # EmailSubmission/set errors about the envelope recipients
+    invalid_recipients: list[str] | None = None
+    max_recipients: int | None = None
@@ -0,0 +1,217 @@
+from __future__ import annotations
+
+import dataclasses
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, cast
+
+from jmaplib import errors
+from jmaplib.client import ClientError
+from jmaplib.coalesce import object_id
+from jmaplib.logging import log
+from jmaplib.methods.base import GetResponseWithoutState, QueryResponse
+from jmaplib.ref import Ref
+
+if TYPE_CHECKING:
+    from collections.abc import Generator, Sequence
+    from concurrent.futures import Future
+
+    from jmaplib.client import Client
+    from jmaplib.methods import InvocationResponseOrError, Method
+    from jmaplib.methods.base import Get, Query
+
+
+class QueryChangedError(ClientError):
+    """The query results changed on the server while paging through them."""
+
+
+@dataclass
+class QueryPage:
+    position: int
+    ids: list[str]
+    query_state: str
+    total: int | None = None
+    limit: int | None = None
+    objects: list[Any] = field(default_factory=list)
+    state: str | None = None
+    not_found: list[str] = field(default_factory=list)
+
+
+@dataclass
+class _PageRequest:
+    position: int
+    anchor: str | None = None
+    anchor_offset: int | None = None
+
+
+def _check_response(
+    response: InvocationResponseOrError,
+    results: Sequence[InvocationResponseOrError],
+) -> None:
+    if isinstance(response.response, errors.Error):
+        raise ClientError(
+            f'Method call {response.id} failed with "{response.response.type}"',
+            result=results,
+        )
+
+
+class QueryPager:
+    """Pages through the results of a /query method, one API request per page.
+
+    If a /get method is given, it is sent in the same request with its ids
+    referencing the /query results. The next page is requested in the
+    background while the current page is being processed, so at most two
+    pages are held in memory.
+
+    After the first page, pages are requested relative to the last id of the
+    previous page (``anchor``), so results inserted or removed before the
+    current page don't cause ids to be skipped or repeated. If ``strict`` is
+    set, a change of the ``queryState`` while paging raises
+    ``QueryChangedError`` instead.
+    """
+
+    def __init__(
+        self,
+        client: Client,
+        query: Query,
+        page_size: int | None = None,
+        get: Get | None = None,
+        strict: bool = False,
+    ) -> None:
+        self._client = client
+        self._query = query
+        self._get = get
+        self._strict = strict
+        self._page_size = (
+            page_size or client.jmap_session.capabilities.core.max_objects_in_get
+        )
+        self._max_results = query.limit
+
+    def pages(self) -> Generator[QueryPage, None, None]:
+        request = _PageRequest(
+            position=self._query.position or 0,
+            anchor=self._query.anchor,
+            anchor_offset=self._query.anchor_offset,
+        )
+        page = self.fetch(request)
+        query_state = page.query_state
+        returned = 0
+        prefetch: Future[QueryPage] | None = None
+        try:
+            while True:
+                if self._max_results is not None:
+                    page.ids = page.ids[: self._max_results - returned]
+                    page.objects = page.objects[: len(page.ids)]
+                returned += len(page.ids)
+                next_request = self._next_request(page, returned)
+                prefetch = (
+                    self._client.executor.submit(self.fetch, next_request)
+                    if next_request
+                    else None
+                )
+                if page.ids:
+                    yield page
+                if not prefetch:
+                    return
+                page = prefetch.result()
+                prefetch = None
+                if page.query_state != query_state:
+                    self._query_state_changed(query_state, page)
+                    query_state = page.query_state
+        finally:
+            if prefetch:
+                prefetch.cancel()
+
+    def items(self) -> Generator[Any, None, None]:
+        for page in self.pages():
+            yield from page.objects if self._get else page.ids
+
+    def fetch(self, request: _PageRequest) -> QueryPage:
+        """Send the query (and get) method calls for one page."""
+        try:
+            return self._fetch(request)
+        except ClientError as e:
+            if not request.anchor or not any(
+                isinstance(r.response, errors.AnchorNotFound) for r in e.result
+            ):
+                raise
+        # The last id of the previous page was removed on the server, so
+        # continue from its last known position instead
+        log.debug(f'Query anchor "{request.anchor}" not found, using position')
+        return self._fetch(_PageRequest(position=request.position))
+
+    def _fetch(self, request: _PageRequest) -> QueryPage:
+        query = dataclasses.replace(
+            self._query,
+            position=None if request.anchor else request.position,
+            anchor=request.anchor,
+            anchor_offset=request.anchor_offset if request.anchor else None,
+            limit=self._page_size,
+        )
+        calls: list[Method] = [query]
+        if self._get:
+            calls.append(dataclasses.replace(self._get, ids=Ref("/ids")))
+        results = cast(
+            "Sequence[InvocationResponseOrError]", self._client.request(calls)
+        )
+        for r in results:
+            _check_response(r, results)
+        query_response = results[0].response
+        if not isinstance(query_response, QueryResponse) or not isinstance(
+            query_response.ids, list
+        ):
+            raise ClientError("Unexpected response for query", result=results)
+        page = QueryPage(
+            position=query_response.position,
+            ids=query_response.ids,
+            query_state=query_response.query_state,
+            total=query_response.total,
+            limit=query_response.limit,
+        )
+        if self._get and len(results) > 1:
+            get_response = results[1].response
+            if not isinstance(get_response, GetResponseWithoutState):
+                raise ClientError("Unexpected response for get", result=results)
+            objects = {object_id(o): o for o in getattr(get_response, "data", [])}
+            page.objects = [objects[i] for i in page.ids if i in objects]
+            page.not_found = [i for i in page.ids if i not in objects]
+            page.state = getattr(get_response, "state", None)
+        return page
+
+    def _next_request(self, page: QueryPage, returned: int) -> _PageRequest | None:
+        if not page.ids or len(page.ids) < (page.limit or self._page_size):
+            return None
+        if self._max_results is not None and returned >= self._max_results:
+            return None
+        position = page.position + len(page.ids)
+        if page.total is not None and position >= page.total:
+            return None
+        return _PageRequest(position=position, anchor=page.ids[-1], anchor_offset=1)
+
+    def _query_state_changed(self, query_state: str, page: QueryPage) -> None:
+        message = (
+            f'Query state changed from "{query_state}" to "{page.query_state}"'
+            " while paging"
+        )
+        if self._strict:
+            raise QueryChangedError(message, result=[])
+        log.debug(message)
+
+
+def iter_query_pages(
+    client: Client,
+    query: Query,
+    page_size: int | None = None,
+    get: Get | None = None,
+    strict: bool = False,
+) -> Generator[QueryPage, None, None]:
+    return QueryPager(client, query, page_size, get, strict).pages()
+
+
+def iter_query(
+    client: Client,
+    query: Query,
+    page_size: int | None = None,
+    get: Get | None = None,
+    strict: bool = False,
+) -> Generator[Any, None, None]:
+    return QueryPager(client, query, page_size, get, strict).items()
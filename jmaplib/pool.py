@@ -0,0 +1,194 @@
+from __future__ import annotations
+
+import collections
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Any
+
+import requests
+import requests.adapters
+
+from jmaplib.auth import BearerAuth
+from jmaplib.client import Client
+from jmaplib.logging import log
+
+if TYPE_CHECKING:
+    from collections.abc import Hashable
+    from types import TracebackType
+
+    from typing_extensions import Self
+
+    from jmaplib.client import RequestsAuth
+    from jmaplib.session import Session
+
+DEFAULT_MAX_CLIENTS = 1000
+DEFAULT_POOL_CONNECTIONS = 10
+DEFAULT_POOL_MAXSIZE = 32
+
+
+def credential_key(auth: RequestsAuth | None) -> Hashable:
+    """A key identifying the credentials of auth, used to share sessions."""
+    if auth is None or isinstance(auth, tuple):
+        return auth
+    if isinstance(auth, requests.auth.HTTPBasicAuth):
+        return (auth.username, auth.password)
+    if isinstance(auth, BearerAuth):
+        return ("Bearer", auth.api_token)
+    # Other authentication objects are only shared with themselves
+    return ("id", id(auth))
+
+
+class ClientPool:
+    """Creates clients for many accounts, sharing their resources.
+
+    All clients share the HTTP connection pool of each host, keeping up to
+    ``pool_connections`` host pools of ``pool_maxsize``. Clients using the
+    same credentials share a ``requests.Session`` and the JMAP session
+    resource, which is only fetched once per credentials, and a worker
+    thread pool sized by the session's ``maxConcurrentRequests``; each client
+    then sends its requests for its own ``account_id``. When a client sees the
+    session state change, new clients fetch the session resource again. The
+    least recently used clients beyond ``max_clients`` are closed and dropped
+    from the pool.
+
+    Pooled clients send their requests over HTTP unless ``use_websocket=True``
+    is passed, as every client would otherwise open its own WebSocket.
+    """
+
+    def __init__(
+        self,
+        max_clients: int = DEFAULT_MAX_CLIENTS,
+        pool_connections: int = DEFAULT_POOL_CONNECTIONS,
+        pool_maxsize: int = DEFAULT_POOL_MAXSIZE,
+        **client_kwargs: Any,
+    ) -> None:
+        self.max_clients = max_clients
+        self._client_kwargs = {"use_websocket": False, **client_kwargs}
+        self._lock = threading.RLock()
+        # Connection pools are kept per host by the adapter's pool manager
+        self._adapter = requests.adapters.HTTPAdapter(
+            pool_connections=pool_connections, pool_maxsize=pool_maxsize
+        )
+        self._requests_sessions: dict[tuple[str, Hashable], requests.Session] = {}
+        self._jmap_sessions: dict[tuple[str, Hashable], Session] = {}
+        self._executors: dict[tuple[str, Hashable], ThreadPoolExecutor] = {}
+        self._clients: collections.OrderedDict[
+            tuple[str, Hashable, str | None], Client
+        ] = collections.OrderedDict()
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc_value: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return len(self._clients)
+
+    def client(
+        self, host: str, auth: RequestsAuth | None, account_id: str | None = None
+    ) -> Client:
+        """Return the pooled client for the account, creating it if needed.
+
+        Without an ``account_id``, the client uses the primary account.
+        """
+        credentials = (host, credential_key(auth))
+        key = (*credentials, account_id)
+        with self._lock:
+            client = self._clients.get(key)
+            if client is not None:
+                self._clients.move_to_end(key)
+                return client
+            requests_session = self._requests_session(credentials, auth)
+            jmap_session = self._jmap_sessions.get(credentials)
+        if jmap_session is None:
+            # Fetch the session resource without holding the lock
+            jmap_session = Client(
+                host, auth=auth, requests_session=requests_session
+            ).jmap_session
+        with self._lock:
+            client = self._clients.get(key)
+            if client is None:
+                jmap_session = self._jmap_sessions.setdefault(credentials, jmap_session)
+                client = Client(
+                    host,
+                    auth=auth,
+                    account_id=account_id,
+                    requests_session=requests_session,
+                    jmap_session=jmap_session,
+                    executor=self._executor(credentials, jmap_session),
+                    on_session_invalidated=functools.partial(
+                        self._session_invalidated, credentials, jmap_session
+                    ),
+                    **self._client_kwargs,
+                )
+                self._clients[key] = client
+                self._evict()
+            self._clients.move_to_end(key)
+        return client
+
+    def invalidate(self, host: str, auth: RequestsAuth | None) -> None:
+        """Forget the cached JMAP session of the credentials."""
+        with self._lock:
+            self._jmap_sessions.pop((host, credential_key(auth)), None)
+
+    def _session_invalidated(
+        self, credentials: tuple[str, Hashable], jmap_session: Session
+    ) -> None:
+        # New clients fetch the session again, unless it was already replaced
+        with self._lock:
+            if self._jmap_sessions.get(credentials) is jmap_session:
+                log.debug(f"Dropping pooled JMAP session for {credentials[0]}")
+                del self._jmap_sessions[credentials]
+
+    def close(self) -> None:
+        with self._lock:
+            clients = list(self._clients.values())
+            self._clients.clear()
+            requests_sessions = list(self._requests_sessions.values())
+            self._requests_sessions.clear()
+            self._jmap_sessions.clear()
+            executors = list(self._executors.values())
+            self._executors.clear()
+        for client in clients:
+            client.close()
+        for executor in executors:
+            executor.shutdown(wait=False)
+        for requests_session in requests_sessions:
+            requests_session.close()
+        self._adapter.close()
+
+    def _requests_session(
+        self, credentials: tuple[str, Hashable], auth: RequestsAuth | None
+    ) -> requests.Session:
+        requests_session = self._requests_sessions.get(credentials)
+        if requests_session is None:
+            requests_session = requests.Session()
+            requests_session.auth = auth
+            requests_session.mount("https://", self._adapter)
+            self._requests_sessions[credentials] = requests_session
+        return requests_session
+
+    def _executor(
+        self, credentials: tuple[str, Hashable], jmap_session: Session
+    ) -> ThreadPoolExecutor:
+        executor = self._executors.get(credentials)
+        if executor is None:
+            executor = ThreadPoolExecutor(
+                max_workers=jmap_session.capabilities.core.max_concurrent_requests,
+                thread_name_prefix="jmaplib",
+            )
+            self._executors[credentials] = executor
+        return executor
+
+    def _evict(self) -> None:
+        while len(self._clients) > self.max_clients:
+            key, client = self._clients.popitem(last=False)
+            log.debug(f"Closing least recently used client for account {key[2]}")
+            client.close()
@@ -0,0 +1,103 @@
+from __future__ import annotations
+
+import collections
+from typing import TYPE_CHECKING, Callable, Optional
+
+from jmaplib.changes import CannotCalculateChangesError, ChangesWalker
+from jmaplib.logging import log
+from jmaplib.methods import EmailChanges, MailboxChanges, ThreadChanges
+from jmaplib.models import Event, StateChange
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+
+    from jmaplib.changes import ChangesPage
+    from jmaplib.client import Client
+    from jmaplib.methods.base import Changes
+    from jmaplib.models import TypeState
+
+# Called with the account id, the type name and a page of changes, or None if
+# the changes can't be calculated and cached objects of the type must be reloaded
+ChangesCallback = Callable[[str, str, Optional["ChangesPage"]], None]
+
+# TypeState fields of the types with a /changes method
+CHANGES_METHODS: dict[str, tuple[str, type[Changes]]] = {
+    "Email": ("email", EmailChanges),
+    "Mailbox": ("mailbox", MailboxChanges),
+    "Thread": ("thread", ThreadChanges),
+}
+
+
+class PushUpdater:
+    """Fetches the changes announced by push events for registered callbacks.
+
+    For each changed type of an event, the new state is compared to the last
+    known state, and only types with a different state and at least one
+    registered callback are fetched with /changes and /get. The first state
+    seen for a type becomes its known state without fetching anything, unless
+    it was set with ``set_state()`` before.
+
+    Only changes of the client's account are fetched.
+    """
+
+    def __init__(self, client: Client, fetch: bool = True) -> None:
+        self.client = client
+        self.fetch = fetch
+        self.states: dict[str, dict[str, str]] = collections.defaultdict(dict)
+        self._callbacks: dict[str, list[ChangesCallback]] = collections.defaultdict(
+            list
+        )
+
+    def register(self, type_name: str, callback: ChangesCallback) -> None:
+        if type_name not in CHANGES_METHODS:
+            raise ValueError(f"Changes of {type_name} objects are not supported")
+        self._callbacks[type_name].append(callback)
+
+    def set_state(self, account_id: str, type_name: str, state: str) -> None:
+        self.states[account_id][type_name] = state
+
+    def run(self, events: Iterable[Event | StateChange] | None = None) -> None:
+        """Handle events until the event stream ends."""
+        for event in events if events is not None else self.client.events:
+            self.handle(event)
+
+    def handle(self, event: Event | StateChange) -> None:
+        state_change = event.data if isinstance(event, Event) else event
+        for account_id, type_state in state_change.changed.items():
+            if account_id != self.client.account_id:
+                continue
+            for type_name, new_state in self._changed_types(account_id, type_state):
+                self._update(account_id, type_name, new_state)
+
+    def _changed_types(
+        self, account_id: str, type_state: TypeState
+    ) -> list[tuple[str, str]]:
+        changed = []
+        known = self.states[account_id]
+        for type_name, (field_name, _) in CHANGES_METHODS.items():
+            new_state = getattr(type_state, field_name)
+            if new_state is None or known.get(type_name) == new_state:
+                continue
+            if type_name not in known or not self._callbacks[type_name]:
+                known[type_name] = new_state
+                continue
+            changed.append((type_name, new_state))
+        return changed
+
+    def _update(self, account_id: str, type_name: str, new_state: str) -> None:
+        known = self.states[account_id]
+        changes = CHANGES_METHODS[type_name][1](since_state=known[type_name])
+        walker = ChangesWalker(self.client, changes, fetch=self.fetch)
+        try:
+            for page in walker:
+                for callback in self._callbacks[type_name]:
+                    callback(account_id, type_name, page)
+                known[type_name] = page.new_state
+        except CannotCalculateChangesError:
+            log.debug(
+                f"Cannot calculate {type_name} changes of account {account_id}"
+                f' since "{known[type_name]}"'
+            )
+            for callback in self._callbacks[type_name]:
+                callback(account_id, type_name, None)
+            known[type_name] = new_state
@@ -0,0 +1,264 @@
+from __future__ import annotations
+
+import collections
+import dataclasses
+import itertools
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, cast
+
+import requests
+
+from jmaplib import errors
+from jmaplib.client import ClientError
+from jmaplib.logging import log
+from jmaplib.methods import (
+    EmailSet,
+    EmailSetResponse,
+    EmailSubmissionSet,
+    EmailSubmissionSetResponse,
+)
+from jmaplib.models import Email, EmailSubmission
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable, Sequence
+    from concurrent.futures import Future
+
+    from jmaplib.client import Client
+    from jmaplib.methods import InvocationResponseOrError
+    from jmaplib.models import Envelope, SetError
+
+
+class TokenBucket:
+    """Limits a rate of operations, allowing bursts of up to ``capacity``.
+
+    Tokens are added at ``rate`` per second. Taking more tokens than are
+    available blocks until the deficit has been refilled, so requests
+    larger than the capacity are also paced at the rate.
+    """
+
+    def __init__(self, rate: float, capacity: float | None = None) -> None:
+        if rate <= 0:
+            raise ValueError("Token bucket rate must be positive")
+        self.rate = rate
+        self.capacity = capacity or rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: float = 1) -> float:
+        """Take tokens, waiting for them if needed. Return the time waited."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self.capacity, self._tokens + (now - self._updated) * self.rate
+            )
+            self._updated = now
+            self._tokens -= tokens
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if wait:
+            log.debug(f"Rate limited, waiting {wait:.2f} seconds for {tokens} tokens")
+            time.sleep(wait)
+        return wait
+
+
+@dataclass
+class OutgoingEmail:
+    email: Email
+    # Without an envelope, the server builds it from the message headers
+    envelope: Envelope | None = None
+
+
+@dataclass
+class SendResult:
+    """The results of a bulk send, keyed by the position of each email.
+
+    ``sent`` maps emails to their EmailSubmission id. ``not_created`` holds
+    the errors of emails whose draft or submission couldn't be created.
+    ``not_moved`` holds the errors of sent emails that couldn't be moved
+    from Drafts to Sent (or destroyed without a Sent mailbox).
+
+    ``errors`` holds the method errors and the exceptions of the requests
+    that failed, keyed by chunk number: chunk ``n`` holds the emails from
+    position ``n * chunk_size``, and its emails are not in ``sent``. After a
+    transport error, the emails of the chunk may or may not have been sent.
+    """
+
+    sent: dict[int, str] = field(default_factory=dict)
+    not_created: dict[int, SetError] = field(default_factory=dict)
+    not_moved: dict[int, SetError] = field(default_factory=dict)
+    errors: dict[int, errors.Error | Exception] = field(default_factory=dict)
+
+    @property
+    def invalid_recipients(self) -> dict[int, list[str]]:
+        """The recipient addresses rejected by the server, per email."""
+        return {
+            index: error.invalid_recipients
+            for index, error in self.not_created.items()
+            if error.invalid_recipients
+        }
+
+
+class EmailSender:
+    """Creates and sends emails in bulk with as few API requests as possible.
+
+    Each API request creates a chunk of up to ``maxObjectsInSet`` drafts in
+    ``drafts_mailbox_id`` with one Email/set call, and sends them with one
+    EmailSubmission/set call referencing the drafts by creation id. Sent
+    emails are moved from Drafts to ``sent_mailbox_id`` by the same call,
+    or destroyed without a Sent mailbox. Up to ``maxConcurrentRequests``
+    requests are sent at a time, and with a ``rate_limit`` every email
+    takes a token from the bucket before its request is sent.
+    """
+
+    def __init__(
+        self,
+        client: Client,
+        identity_id: str,
+        drafts_mailbox_id: str,
+        sent_mailbox_id: str | None = None,
+        rate_limit: TokenBucket | None = None,
+        chunk_size: int | None = None,
+    ) -> None:
+        self.client = client
+        self.identity_id = identity_id
+        self.drafts_mailbox_id = drafts_mailbox_id
+        self.sent_mailbox_id = sent_mailbox_id
+        self.rate_limit = rate_limit
+        core = client.jmap_session.capabilities.core
+        self.chunk_size = min(
+            chunk_size or core.max_objects_in_set, core.max_objects_in_set
+        )
+        self.max_requests = core.max_concurrent_requests
+
+    def send(self, emails: Iterable[Email | OutgoingEmail]) -> SendResult:
+        messages = (
+            (i, e if isinstance(e, OutgoingEmail) else OutgoingEmail(e))
+            for i, e in enumerate(emails)
+        )
+        result = SendResult()
+        pending: collections.deque[
+            tuple[int, Future[Sequence[InvocationResponseOrError]]]
+        ] = collections.deque()
+        try:
+            for number in itertools.count():
+                chunk = list(itertools.islice(messages, self.chunk_size))
+                if not chunk:
+                    break
+                if self.rate_limit:
+                    self.rate_limit.acquire(len(chunk))
+                pending.append(
+                    (
+                        number,
+                        self.client.executor.submit(self._send, self._calls(chunk)),
+                    )
+                )
+                if len(pending) >= self.max_requests:
+                    self._record(result, *pending.popleft())
+            while pending:
+                self._record(result, *pending.popleft())
+        finally:
+            for _, future in pending:
+                future.cancel()
+        log.debug(
+            f"Sent {len(result.sent)} emails, {len(result.not_created)} not sent,"
+            f" {len(result.not_moved)} not moved, {len(result.errors)} chunks failed"
+        )
+        return result
+
+    def _calls(
+        self, chunk: list[tuple[int, OutgoingEmail]]
+    ) -> list[EmailSet | EmailSubmissionSet]:
+        drafts = {
+            f"draft{i}": dataclasses.replace(
+                message.email,
+                mailbox_ids={self.drafts_mailbox_id: True},
+                keywords={**(message.email.keywords or {}), "$draft": True},
+            )
+            for i, message in chunk
+        }
+        submissions = {
+            f"send{i}": EmailSubmission(
+                email_id=f"#draft{i}",
+                identity_id=self.identity_id,
+                envelope=message.envelope,
+            )
+            for i, message in chunk
+        }
+        on_success: dict[str, Any] = {}
+        if self.sent_mailbox_id:
+            on_success["on_success_update_email"] = {
+                f"#{creation_id}": {
+                    "keywords/$draft": None,
+                    f"mailboxIds/{self.drafts_mailbox_id}": None,
+                    f"mailboxIds/{self.sent_mailbox_id}": True,
+                }
+                for creation_id in submissions
+            }
+        else:
+            on_success["on_success_destroy_email"] = [
+                f"#{creation_id}" for creation_id in submissions
+            ]
+        return [
+            EmailSet(create=drafts),
+            EmailSubmissionSet(create=submissions, **on_success),
+        ]
+
+    def _send(
+        self, calls: list[EmailSet | EmailSubmissionSet]
+    ) -> Sequence[InvocationResponseOrError]:
+        return cast(
+            "Sequence[InvocationResponseOrError]", self.client.request(list(calls))
+        )
+
+    def _record(
+        self,
+        result: SendResult,
+        number: int,
+        future: Future[Sequence[InvocationResponseOrError]],
+    ) -> None:
+        try:
+            responses = future.result()
+        except (requests.RequestException, ClientError) as e:
+            log.warning(f"Sending chunk {number} failed: {e}")
+            result.errors[number] = e
+            return
+        # Positions of the created drafts, by email id
+        positions: dict[str, int] = {}
+        for invocation in responses:
+            response = invocation.response
+            if isinstance(response, errors.Error):
+                log.warning(f"Sending chunk {number} failed with {response.type}")
+                result.errors[number] = response
+            elif isinstance(response, EmailSubmissionSetResponse):
+                _record_submissions(result, response)
+            elif isinstance(response, EmailSetResponse):
+                _record_emails(result, response, positions)
+
+
+def _record_emails(
+    result: SendResult, response: EmailSetResponse, positions: dict[str, int]
+) -> None:
+    for creation_id, email in (response.created or {}).items():
+        if email is not None and email.id:
+            positions[email.id] = int(creation_id[5:])
+    # Drafts that failed take precedence over their submission errors
+    for creation_id, error in (response.not_created or {}).items():
+        result.not_created[int(creation_id[5:])] = error
+    # Sent emails that the implicit Email/set call couldn't move or destroy
+    not_moved = {**(response.not_updated or {}), **(response.not_destroyed or {})}
+    for email_id, error in not_moved.items():
+        if email_id in positions:
+            result.not_moved[positions[email_id]] = error
+
+
+def _record_submissions(
+    result: SendResult, response: EmailSubmissionSetResponse
+) -> None:
+    for creation_id, submission in (response.created or {}).items():
+        if submission is None or not submission.id:
+            raise ClientError(f"Submission {creation_id} created without id", result=[])
+        result.sent[int(creation_id[4:])] = submission.id
+    for creation_id, error in (response.not_created or {}).items():
+        result.not_created.setdefault(int(creation_id[4:]), error)
@@ -121,7 +121,12 @@ class Model(dataclasses_json.DataClassJsonMixin):
         method_calls_slice: list[Invocation] | None = None,
         **kwargs: Any,
     ) -> dict[str, dataclasses_json.core.Json]:
-        if account_id:
+        if account_id and not hasattr(self, "account_id"):
             self.account_id: str | None = account_id
+        data = super().to_dict(*args, **kwargs)
+        # An account set on the object takes precedence over the default one
+        # and the object is left unchanged, so it can be sent for other accounts
+        if account_id and self.account_id is None:
+            data["accountId"] = account_id
         todict = ModelToDictPostprocessor(method_calls_slice)
-        return todict.postprocess(super().to_dict(*args, **kwargs))
+        return todict.postprocess(data)
@@ -2,6 +2,7 @@ from __future__ import annotations
 
 import functools
 from dataclasses import dataclass, field
+from typing import Any
 
 from dataclasses_json import CatchAll, Undefined, config, dataclass_json
 
@@ -19,6 +20,15 @@ class Session(Model):
     state: str
     primary_accounts: SessionPrimaryAccount
     capabilities: SessionCapabilities
+    accounts: dict[str, SessionAccount] = field(default_factory=dict)
+
+
+@dataclass
+class SessionAccount(Model):
+    name: str
+    is_personal: bool = True
+    is_read_only: bool = False
+    account_capabilities: dict[str, Any] = field(default_factory=dict)
 
 
 @dataclass_json(undefined=Undefined.INCLUDE)
@@ -0,0 +1,92 @@
+from __future__ import annotations
+
+import json
+import threading
+from concurrent.futures import Future
+from typing import TYPE_CHECKING, Literal, overload
+
+from jmaplib import errors
+from jmaplib.client import ClientError
+from jmaplib.logging import log
+from jmaplib.methods import InvocationResponseOrError
+
+if TYPE_CHECKING:
+    from collections.abc import Hashable
+
+    from jmaplib.client import Client
+    from jmaplib.methods import Method, Response, ResponseOrError
+
+READ_ONLY_METHOD_TYPES = frozenset({"get", "query", "changes", "queryChanges"})
+
+
+class SingleFlight:
+    """Shares one in-flight response between concurrent identical calls.
+
+    While a read-only call (``/get``, ``/query``, ``/changes`` or
+    ``/queryChanges``) is waiting for its response, identical calls for the
+    same account from other threads wait for that response instead of sending
+    another request. All waiting callers receive the same response object.
+    Any other call is always sent.
+    """
+
+    def __init__(self, client: Client) -> None:
+        self._client = client
+        self._lock = threading.Lock()
+        self._in_flight: dict[Hashable, Future[ResponseOrError]] = {}
+
+    @overload
+    def request(
+        self, call: Method, raise_errors: Literal[False] = False
+    ) -> ResponseOrError: ...  # pragma: no cover
+
+    @overload
+    def request(
+        self, call: Method, raise_errors: Literal[True]
+    ) -> Response: ...  # pragma: no cover
+
+    def request(
+        self, call: Method, raise_errors: bool = False
+    ) -> ResponseOrError | Response:
+        response = self._request(call)
+        if raise_errors and isinstance(response, errors.Error):
+            raise ClientError(
+                "Errors found in method responses",
+                result=[InvocationResponseOrError(id="single", response=response)],
+            )
+        return response
+
+    def key(self, call: Method) -> Hashable | None:
+        method_name = call.jmap_method_name
+        if method_name.rsplit("/", 1)[-1] not in READ_ONLY_METHOD_TYPES:
+            return None
+        try:
+            arguments = call.to_dict()
+        except ValueError:
+            # Calls with result references depend on other calls
+            return None
+        account_id = arguments.pop("accountId", None) or self._client.account_id
+        return (account_id, method_name, json.dumps(arguments, sort_keys=True))
+
+    def _request(self, call: Method) -> ResponseOrError:
+        key = self.key(call)
+        if key is None:
+            return self._client.request(call, single_response=True)
+        with self._lock:
+            future = self._in_flight.get(key)
+            leader = future is None
+            if future is None:
+                future = self._in_flight[key] = Future()
+        if not leader:
+            log.debug(f"Waiting for in-flight {call.jmap_method_name} call")
+            return future.result()
+        try:
+            response = self._client.request(call, single_response=True)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(response)
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+        return response
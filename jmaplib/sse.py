@@ -0,0 +1,186 @@
+from __future__ import annotations
+
+import time
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
+
+import requests
+import urllib3.exceptions
+
+from jmaplib.logging import log
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Generator, Iterable, Iterator
+
+CONNECT_TIMEOUT = 30
+CHUNK_SIZE = 8192
+RECONNECT_DELAY = 1.0
+MAX_RECONNECT_DELAY = 60.0
+# A stream is considered dead if nothing arrived for this many ping intervals
+PING_TIMEOUT_FACTOR = 2
+
+RETRIED_STATUS_CODES = {429, 500, 502, 503, 504}
+
+# Errors of a dropped stream, also raised by urllib3 when reading it directly
+STREAM_ERRORS = (
+    requests.RequestException,
+    urllib3.exceptions.ProtocolError,
+    urllib3.exceptions.ReadTimeoutError,
+)
+
+
+@dataclass
+class ServerSentEvent:
+    event: str = "message"
+    data: str = ""
+    id: str | None = None
+    retry: int | None = None
+
+
+def iter_lines(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """Split a stream of chunks into lines without their line endings."""
+    buffer = b""
+    for chunk in chunks:
+        buffer += chunk
+        if b"\n" not in chunk:
+            continue
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            yield line[:-1] if line.endswith(b"\r") else line
+    if buffer:
+        yield buffer
+
+
+def parse_events(
+    lines: Iterable[bytes], on_retry: Callable[[int], None] | None = None
+) -> Iterator[ServerSentEvent]:
+    """Parse lines of an event stream into events.
+
+    Fields are only decoded for events with data, so comment lines and other
+    keepalives are skipped without any decoding. ``on_retry`` is called with
+    the reconnection time of every ``retry`` field, also in events without
+    data.
+    """
+    data: list[bytes] = []
+    fields: dict[bytes, bytes] = {}
+    for line in lines:
+        if not line:
+            if data:
+                yield _make_event(data, fields)
+            data, fields = [], {}
+            continue
+        if line.startswith(b":"):
+            continue
+        name, _, value = line.partition(b":")
+        if value.startswith(b" "):
+            value = value[1:]
+        if name == b"data":
+            data.append(value)
+        else:
+            fields[name] = value
+            if name == b"retry" and value.isdigit() and on_retry:
+                on_retry(int(value))
+
+
+def _make_event(data: list[bytes], fields: dict[bytes, bytes]) -> ServerSentEvent:
+    event_id = fields.get(b"id")
+    retry = fields.get(b"retry", b"")
+    return ServerSentEvent(
+        event=fields.get(b"event", b"").decode() or "message",
+        data=b"\n".join(data).decode(),
+        id=(
+            event_id.decode()
+            if event_id is not None and b"\0" not in event_id
+            else None
+        ),
+        retry=int(retry) if retry.isdigit() else None,
+    )
+
+
+class EventSource:
+    """Reads a server-sent event stream, reconnecting when it ends or fails.
+
+    Requests are sent with the given requests session, so its connection
+    pool and authentication are reused. After a reconnect, the stream is
+    resumed with the ``Last-Event-ID`` of the last event that had an id.
+
+    If ``ping`` is set, the server sends a keepalive at least every ``ping``
+    seconds, so a stream without any data for ``PING_TIMEOUT_FACTOR`` times
+    that long is considered dead and reconnected. Streams closed by the
+    server after each state event (``closeafter=state``) are reconnected
+    immediately; other failures are retried with exponential backoff.
+    Responses with client error status codes are raised.
+    """
+
+    def __init__(
+        self,
+        session: requests.Session,
+        url: str,
+        last_event_id: str | None = None,
+        ping: int = 0,
+        closeafter: str = "no",
+    ) -> None:
+        self.session = session
+        self.url = url
+        self.last_event_id = last_event_id
+        self.read_timeout = ping * PING_TIMEOUT_FACTOR if ping else None
+        self.closeafter = closeafter
+        self.reconnect_delay = RECONNECT_DELAY
+        self._delay = self.reconnect_delay
+
+    def __iter__(self) -> Generator[ServerSentEvent, None, None]:
+        while True:
+            try:
+                received = yield from self._read()
+            except requests.HTTPError as e:
+                if e.response is None or (
+                    e.response.status_code not in RETRIED_STATUS_CODES
+                ):
+                    raise
+                log.debug(f"Event stream failed: {e}")
+                received = False
+            except STREAM_ERRORS as e:
+                log.debug(f"Event stream failed: {e}")
+                received = False
+            if received and self.closeafter == "state":
+                continue
+            log.debug(f"Reconnecting event stream in {self._delay} seconds")
+            time.sleep(self._delay)
+            self._delay = min(self._delay * 2, MAX_RECONNECT_DELAY)
+
+    def _set_retry(self, retry: int) -> None:
+        self.reconnect_delay = retry / 1000
+
+    def _read(self) -> Generator[ServerSentEvent, None, bool]:
+        """Yield the events of one connection, return if any were received."""
+        headers = {"Accept": "text/event-stream", "Cache-Control": "no-cache"}
+        if self.last_event_id:
+            headers["Last-Event-ID"] = self.last_event_id
+        received = False
+        with self.session.get(
+            self.url,
+            headers=headers,
+            stream=True,
+            timeout=(CONNECT_TIMEOUT, self.read_timeout),
+        ) as response:
+            response.raise_for_status()
+            lines = iter_lines(_iter_chunks(response))
+            for event in parse_events(lines, on_retry=self._set_retry):
+                if event.id is not None:
+                    self.last_event_id = event.id
+                if not received:
+                    received = True
+                    self._delay = self.reconnect_delay
+                yield event
+        return received
+
+
+def _iter_chunks(response: requests.Response) -> Iterator[bytes]:
+    raw = response.raw
+    if getattr(raw, "chunked", False) or not hasattr(raw, "read1"):
+        # Chunked responses are read one transfer chunk at a time
+        yield from response.iter_content(chunk_size=None)
+        return
+    # Like iter_content, decode gzip or br content encodings
+    while chunk := raw.read1(CHUNK_SIZE, decode_content=True):
+        yield chunk
@@ -0,0 +1,12 @@
+from jmaplib.sync.engine import SyncEngine
+from jmaplib.sync.fulltext import FullTextIndex
+from jmaplib.sync.query import EmailQueryEngine, UnsupportedQueryError
+from jmaplib.sync.store import MailStore
+
+__all__ = [
+    "EmailQueryEngine",
+    "FullTextIndex",
+    "MailStore",
+    "SyncEngine",
+    "UnsupportedQueryError",
+]
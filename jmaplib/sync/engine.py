@@ -0,0 +1,226 @@
+from __future__ import annotations
+
+import dataclasses
+from typing import TYPE_CHECKING
+
+from jmaplib.changes import CannotCalculateChangesError, iter_changes
+from jmaplib.client import ClientError
+from jmaplib.logging import log
+from jmaplib.methods import (
+    EmailChanges,
+    EmailGet,
+    EmailGetResponse,
+    EmailQuery,
+    MailboxChanges,
+    MailboxGet,
+    MailboxQuery,
+    ThreadChanges,
+    ThreadGet,
+    ThreadGetResponse,
+)
+from jmaplib.methods.base import GetResponse
+from jmaplib.paging import iter_query_pages
+from jmaplib.sync.fulltext import PROPERTIES as TEXT_PROPERTIES
+
+if TYPE_CHECKING:
+    from jmaplib.changes import ChangesPage
+    from jmaplib.client import Client
+    from jmaplib.methods.base import Changes, Get
+    from jmaplib.sync.fulltext import FullTextIndex
+    from jmaplib.sync.store import MailStore
+
+# Emails are synced before threads, whose ids are taken from the emails
+SYNC_TYPES = ("Mailbox", "Email", "Thread")
+
+EMAIL_PROPERTIES = [
+    "id",
+    "blobId",
+    "threadId",
+    "mailboxIds",
+    "keywords",
+    "size",
+    "receivedAt",
+    "messageId",
+    "inReplyTo",
+    "references",
+    "from",
+    "to",
+    "cc",
+    "bcc",
+    "replyTo",
+    "subject",
+    "sentAt",
+    "hasAttachment",
+    "preview",
+]
+
+CHANGES_METHODS: dict[str, type[Changes]] = {
+    "Email": EmailChanges,
+    "Mailbox": MailboxChanges,
+    "Thread": ThreadChanges,
+}
+
+
+class SyncEngine:
+    """Keeps a MailStore in sync with the account of a client.
+
+    Types without a stored state are loaded completely, Mailbox and Email via
+    paged /query and /get requests and Thread for the thread ids of the
+    stored emails. Afterwards, ``sync()`` only applies /changes since the
+    stored states. If the server can't calculate changes for a type, only
+    that type is loaded again.
+
+    With a FullTextIndex, the text of new emails is fetched and indexed, and
+    destroyed emails are removed from the index.
+    """
+
+    def __init__(
+        self,
+        client: Client,
+        store: MailStore,
+        email_properties: list[str] | None = None,
+        page_size: int | None = None,
+        fulltext: FullTextIndex | None = None,
+    ) -> None:
+        self.client = client
+        self.store = store
+        self.email_properties = email_properties or EMAIL_PROPERTIES
+        self.page_size = page_size
+        self.fulltext = fulltext
+
+    @property
+    def account_id(self) -> str:
+        return self.client.account_id
+
+    def sync(self) -> None:
+        for type_name in SYNC_TYPES:
+            self.sync_type(type_name)
+
+    def sync_type(self, type_name: str) -> None:
+        state = self.store.get_state(self.account_id, type_name)
+        if state is None:
+            self.resync(type_name)
+        else:
+            try:
+                self._apply_changes(type_name, state)
+            except CannotCalculateChangesError:
+                log.debug(f'Cannot calculate {type_name} changes since "{state}"')
+                self.resync(type_name)
+        if type_name == "Email":
+            self.update_fulltext()
+
+    def update_fulltext(self) -> None:
+        """Index the stored emails missing from the full text index."""
+        if self.fulltext is None:
+            return
+        stored = set(self.store.ids(self.account_id, "Email"))
+        indexed = set(self.fulltext.ids(self.account_id))
+        self.fulltext.remove(self.account_id, indexed - stored)
+        self._index(self.account_id, sorted(stored - indexed))
+
+    def resync(self, type_name: str) -> None:
+        """Load all objects of one type, replacing the stored ones."""
+        log.debug(f"Loading all {type_name} objects of account {self.account_id}")
+        stale = set(self.store.ids(self.account_id, type_name))
+        if type_name == "Thread":
+            state = self._load_threads(stale)
+        else:
+            state = self._load_query(type_name, stale)
+        if state is None:
+            # Nothing was loaded, but the state is needed to sync changes
+            state = self._current_state(type_name)
+        with self.store.transaction():
+            self.store.delete(self.account_id, type_name, stale)
+            self.store.set_state(self.account_id, type_name, state)
+
+    def _get(self, type_name: str) -> Get:
+        if type_name == "Email":
+            return EmailGet(ids=None, properties=self.email_properties)
+        if type_name == "Mailbox":
+            return MailboxGet(ids=None)
+        return ThreadGet(ids=None)
+
+    def _current_state(self, type_name: str) -> str:
+        get = dataclasses.replace(self._get(type_name), ids=[])
+        response = self.client.request(get, raise_errors=True, single_response=True)
+        if not isinstance(response, GetResponse) or response.state is None:
+            raise ClientError(f"Unexpected response for {type_name} state", result=[])
+        return response.state
+
+    def _apply_changes(self, type_name: str, state: str) -> None:
+        changes = CHANGES_METHODS[type_name](since_state=state)
+        for page in iter_changes(self.client, changes, get=self._get(type_name)):
+            self.apply(self.account_id, type_name, page)
+
+    def apply(self, account_id: str, type_name: str, page: ChangesPage | None) -> None:
+        """Store a page of changes, or load the type again if it is None.
+
+        This can be registered as a ``PushUpdater`` callback.
+        """
+        if page is None:
+            self.resync(type_name)
+            return
+        with self.store.transaction():
+            self.store.put(account_id, page.created + page.updated)
+            self.store.delete(account_id, type_name, page.destroyed)
+            self.store.set_state(account_id, type_name, page.new_state)
+        if self.fulltext is not None and type_name == "Email":
+            self.fulltext.remove(account_id, page.destroyed)
+            self._index(account_id, [str(e.id) for e in page.created])
+
+    def _load_query(self, type_name: str, stale: set[str]) -> str | None:
+        query = EmailQuery() if type_name == "Email" else MailboxQuery()
+        state = None
+        for page in iter_query_pages(
+            self.client, query, page_size=self.page_size, get=self._get(type_name)
+        ):
+            # Changes are replayed from the state of the first page, so
+            # objects modified while loading are updated by the next sync
+            state = state or page.state
+            self.store.put(self.account_id, page.objects)
+            stale.difference_update(page.ids)
+        return state
+
+    def _load_threads(self, stale: set[str]) -> str | None:
+        thread_ids = self.store.thread_ids(self.account_id)
+        chunk_size = (
+            self.page_size
+            or self.client.jmap_session.capabilities.core.max_objects_in_get
+        )
+        batch = self.client.batch()
+        futures = [
+            batch.add(ThreadGet(ids=thread_ids[i : i + chunk_size]), ThreadGetResponse)
+            for i in range(0, len(thread_ids), chunk_size)
+        ]
+        batch.execute()
+        state: str | None = None
+        for future in futures:
+            response = future.result()
+            state = state or response.state
+            self.store.put(self.account_id, response.data)
+            stale.difference_update(t.id for t in response.data)
+        return state
+
+    def _index(self, account_id: str, email_ids: list[str]) -> None:
+        if self.fulltext is None or not email_ids:
+            return
+        chunk_size = (
+            self.page_size
+            or self.client.jmap_session.capabilities.core.max_objects_in_get
+        )
+        batch = self.client.batch()
+        futures = [
+            batch.add(
+                EmailGet(
+                    ids=email_ids[i : i + chunk_size],
+                    properties=TEXT_PROPERTIES,
+                    fetch_text_body_values=True,
+                    max_body_value_bytes=self.fulltext.max_body_value_bytes,
+                ),
+                EmailGetResponse,
+            )
+            for i in range(0, len(email_ids), chunk_size)
+        ]
+        batch.execute()
+        for future in futures:
+            self.fulltext.add(account_id, future.result().data)
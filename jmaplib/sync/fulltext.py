@@ -0,0 +1,216 @@
+from __future__ import annotations
+
+import html
+import re
+import sqlite3
+from typing import TYPE_CHECKING, Any
+
+from jmaplib.models import SearchSnippet
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+
+    from jmaplib.models import Email, EmailAddress
+    from jmaplib.sync.store import MailStore
+
+# Email properties to fetch for indexing, with the text body values
+PROPERTIES = [
+    "id",
+    "subject",
+    "from",
+    "to",
+    "cc",
+    "bcc",
+    "preview",
+    "textBody",
+    "bodyValues",
+]
+
+MAX_BODY_VALUE_BYTES = 64 * 1024
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS email_text_row (
+        id INTEGER PRIMARY KEY,
+        account_id TEXT NOT NULL,
+        email_id TEXT NOT NULL,
+        UNIQUE (account_id, email_id)
+    );
+    CREATE VIRTUAL TABLE IF NOT EXISTS email_text USING fts5(
+        subject, addresses, preview, body,
+        tokenize = 'unicode61 remove_diacritics 2'
+    );
+"""
+
+# Email/query filter conditions answered by the index, and their columns
+CONDITION_COLUMNS = {"text": None, "body": "body"}
+
+# Highlights are marked with control characters before the text is escaped
+_START, _END = "\x02", "\x03"
+
+_TOKEN = re.compile(r"\w+")
+
+
+def match_query(text: str, column: str | None = None) -> str:
+    """Build an FTS5 query matching all words, the last one as a prefix."""
+    words = _TOKEN.findall(text)
+    terms = [f'"{w}"' for w in words[:-1]] + [f'"{w}"*' for w in words[-1:]]
+    query = " ".join(terms) or '""'
+    return f"{{{column}}} : ({query})" if column else query
+
+
+def _addresses(email: Email) -> str:
+    addresses: list[EmailAddress] = [
+        *(email.mail_from or []),
+        *(email.to or []),
+        *(email.cc or []),
+        *(email.bcc or []),
+    ]
+    return " ".join(" ".join(filter(None, (a.name, a.email))) for a in addresses)
+
+
+def _body(email: Email) -> str:
+    values = email.body_values or {}
+    part_ids = [p.part_id for p in email.text_body or [] if p.part_id in values]
+    return "\n".join(values[i].value or "" for i in part_ids or list(values))
+
+
+def _highlight(text: str | None) -> str | None:
+    """Escape a highlighted text as HTML, or None if nothing matched."""
+    if not text or _START not in text:
+        return None
+    return html.escape(text).replace(_START, "<mark>").replace(_END, "</mark>").strip()
+
+
+class FullTextIndex:
+    """Optional SQLite FTS5 index of the emails of a MailStore.
+
+    The subject, the names and addresses of the senders and recipients, the
+    preview and the text body values of emails are indexed in tables added to
+    the store's database, so SQLite must be built with FTS5. ``search()``
+    returns the ids of the emails matching all words of a text, the last
+    word as a prefix for search-as-you-type, best matches first, and
+    ``snippets()`` highlights the matches like SearchSnippet/get.
+
+    The SyncEngine adds new emails, with up to ``max_body_value_bytes`` of
+    each body value, and removes destroyed ones when it is given an index.
+    The content of an email can't change, so updated emails are not indexed
+    again.
+    """
+
+    def __init__(
+        self, store: MailStore, max_body_value_bytes: int = MAX_BODY_VALUE_BYTES
+    ) -> None:
+        self.store = store
+        self.max_body_value_bytes = max_body_value_bytes
+        try:
+            with store.transaction() as db:
+                db.executescript(SCHEMA)
+        except sqlite3.OperationalError as e:
+            raise RuntimeError(f"Full text index not available: {e}") from e
+
+    def add(self, account_id: str, emails: Iterable[Email]) -> None:
+        with self.store.transaction() as db:
+            for email in emails:
+                self._remove(db, account_id, str(email.id))
+                row = db.execute(
+                    "INSERT INTO email_text_row (account_id, email_id) VALUES (?, ?)",
+                    (account_id, email.id),
+                ).lastrowid
+                db.execute(
+                    "INSERT INTO email_text (rowid, subject, addresses, preview, body)"
+                    " VALUES (?, ?, ?, ?, ?)",
+                    (
+                        row,
+                        email.subject or "",
+                        _addresses(email),
+                        email.preview or "",
+                        _body(email),
+                    ),
+                )
+
+    def remove(self, account_id: str, email_ids: Iterable[str]) -> None:
+        with self.store.transaction() as db:
+            for email_id in email_ids:
+                self._remove(db, account_id, email_id)
+
+    def ids(self, account_id: str) -> list[str]:
+        with self.store.transaction() as db:
+            rows = db.execute(
+                "SELECT email_id FROM email_text_row WHERE account_id = ?",
+                (account_id,),
+            ).fetchall()
+        return [r[0] for r in rows]
+
+    def search(
+        self,
+        account_id: str,
+        text: str,
+        column: str | None = None,
+        limit: int | None = None,
+    ) -> list[str]:
+        """Return the ids of matching emails, searching all or one column."""
+        with self.store.transaction() as db:
+            rows = db.execute(
+                "SELECT email_text_row.email_id FROM email_text"
+                " JOIN email_text_row ON email_text_row.id = email_text.rowid"
+                " WHERE email_text MATCH ? AND email_text_row.account_id = ?"
+                " ORDER BY rank LIMIT ?",
+                (
+                    match_query(text, column),
+                    account_id,
+                    -1 if limit is None else limit,
+                ),
+            ).fetchall()
+        return [r[0] for r in rows]
+
+    def condition(
+        self, account_id: str, name: str, value: str
+    ) -> tuple[str, list[Any]]:
+        """SQL for a text or body filter condition of a local Email query."""
+        return (
+            "email.id IN (SELECT email_text_row.email_id FROM email_text"
+            " JOIN email_text_row ON email_text_row.id = email_text.rowid"
+            " WHERE email_text MATCH ? AND email_text_row.account_id = ?)",
+            [match_query(value, CONDITION_COLUMNS[name]), account_id],
+        )
+
+    def snippets(
+        self, account_id: str, text: str, email_ids: Iterable[str]
+    ) -> list[SearchSnippet]:
+        """Highlight the matches in the subject and body of emails.
+
+        As with SearchSnippet/get, the subject and preview are HTML with
+        ``<mark>`` elements around the matches, or None without matches.
+        """
+        ids = list(email_ids)
+        sql = (
+            "SELECT email_text_row.email_id,"  # noqa: S608  # placeholders only
+            f" highlight(email_text, 0, '{_START}', '{_END}'),"
+            f" snippet(email_text, 3, '{_START}', '{_END}', '...', 32)"
+            " FROM email_text"
+            " JOIN email_text_row ON email_text_row.id = email_text.rowid"
+            " WHERE email_text MATCH ? AND email_text_row.account_id = ?"
+            f" AND email_text_row.email_id IN ({', '.join('?' * len(ids))})"
+        )
+        with self.store.transaction() as db:
+            rows = db.execute(sql, (match_query(text), account_id, *ids)).fetchall()
+        found = {r[0]: r for r in rows}
+        return [
+            SearchSnippet(
+                email_id=i,
+                subject=_highlight(found[i][1]) if i in found else None,
+                preview=_highlight(found[i][2]) if i in found else None,
+            )
+            for i in ids
+        ]
+
+    @staticmethod
+    def _remove(db: sqlite3.Connection, account_id: str, email_id: str) -> None:
+        row = db.execute(
+            "SELECT id FROM email_text_row WHERE account_id = ? AND email_id = ?",
+            (account_id, email_id),
+        ).fetchone()
+        if row is None:
+            return
+        db.execute("DELETE FROM email_text WHERE rowid = ?", row)
+        db.execute("DELETE FROM email_text_row WHERE id = ?", row)
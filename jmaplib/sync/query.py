@@ -0,0 +1,284 @@
+from __future__ import annotations
+
+import dataclasses
+import functools
+from typing import TYPE_CHECKING, Any, Callable
+
+from jmaplib.client import ClientError
+from jmaplib.logging import log
+from jmaplib.methods import EmailQueryResponse
+from jmaplib.models import (
+    EmailQueryFilterCondition,
+    EmailQueryFilterOperator,
+    Operator,
+)
+from jmaplib.sync.fulltext import CONDITION_COLUMNS
+from jmaplib.sync.store import timestamp
+
+if TYPE_CHECKING:
+    from jmaplib.client import Client
+    from jmaplib.methods import EmailQuery
+    from jmaplib.models import Comparator, EmailQueryFilter
+    from jmaplib.sync.fulltext import FullTextIndex
+    from jmaplib.sync.store import MailStore
+
+Clause = tuple[str, list[Any]]
+
+
+class UnsupportedQueryError(ValueError):
+    """A filter or sort can't be evaluated with the stored emails."""
+
+
+def _escape_like(value: str) -> str:
+    return "%{}%".format(
+        value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    )
+
+
+def _address(property_name: str) -> Callable[[str], Clause]:
+    def _clause(value: str) -> Clause:
+        return (
+            f"EXISTS (SELECT 1 FROM json_each(email.data, '$.{property_name}')"  # noqa: S608  # fixed address properties
+            " WHERE json_extract(value, '$.name') LIKE ? ESCAPE '\\'"
+            " OR json_extract(value, '$.email') LIKE ? ESCAPE '\\')",
+            [_escape_like(value)] * 2,
+        )
+
+    return _clause
+
+
+def _first_address(property_name: str) -> str:
+    return (
+        f"lower(coalesce(json_extract(email.data, '$.{property_name}[0].name'),"
+        f" json_extract(email.data, '$.{property_name}[0].email')))"
+    )
+
+
+_IN_MAILBOX = (
+    "EXISTS (SELECT 1 FROM email_mailbox WHERE email_mailbox.account_id ="
+    " email.account_id AND email_mailbox.email_id = email.id"
+)
+_HAS_KEYWORD = (
+    "EXISTS (SELECT 1 FROM email_keyword WHERE email_keyword.account_id ="
+    " email.account_id AND email_keyword.email_id = {}.id"
+    " AND email_keyword.keyword = ?)"
+)
+_THREAD_EMAILS = (
+    "SELECT 1 FROM email AS thread_email WHERE thread_email.account_id ="
+    " email.account_id AND thread_email.thread_id = email.thread_id"
+)
+_SOME_IN_THREAD = f"EXISTS ({_THREAD_EMAILS} AND {_HAS_KEYWORD.format('thread_email')})"
+
+# SQL for the supported filter conditions, by field of EmailQueryFilterCondition
+CONDITIONS: dict[str, Callable[[Any], Clause]] = {
+    "in_mailbox": lambda v: (f"{_IN_MAILBOX} AND email_mailbox.mailbox_id = ?)", [v]),
+    "in_mailbox_other_than": lambda v: (
+        f"{_IN_MAILBOX} AND email_mailbox.mailbox_id NOT IN"
+        f" ({', '.join('?' * len(v))}))",
+        list(v),
+    ),
+    "before": lambda v: ("email.received_at < ?", [timestamp(v)]),
+    "after": lambda v: ("email.received_at >= ?", [timestamp(v)]),
+    "min_size": lambda v: ("email.size >= ?", [v]),
+    "max_size": lambda v: ("email.size < ?", [v]),
+    "all_in_thread_have_keyword": lambda v: (
+        f"NOT EXISTS ({_THREAD_EMAILS}"
+        f" AND NOT {_HAS_KEYWORD.format('thread_email')})",
+        [v.lower()],
+    ),
+    "some_in_thread_have_keyword": lambda v: (_SOME_IN_THREAD, [v.lower()]),
+    "none_in_thread_have_keyword": lambda v: (f"NOT {_SOME_IN_THREAD}", [v.lower()]),
+    "has_keyword": lambda v: (_HAS_KEYWORD.format("email"), [v.lower()]),
+    "not_keyword": lambda v: (f"NOT {_HAS_KEYWORD.format('email')}", [v.lower()]),
+    "has_attachment": lambda v: ("coalesce(email.has_attachment, 0) = ?", [v]),
+    "mail_from": _address("from"),
+    "to": _address("to"),
+    "cc": _address("cc"),
+    "bcc": _address("bcc"),
+    "subject": lambda v: (
+        "email.subject LIKE ? ESCAPE '\\'",
+        [_escape_like(v)],
+    ),
+}
+
+# SQL expressions for the supported Comparator properties
+SORT_PROPERTIES = {
+    "receivedAt": "email.received_at",
+    "sentAt": "email.sent_at",
+    "size": "email.size",
+    "subject": "email.subject COLLATE NOCASE",
+    "from": _first_address("from"),
+    "to": _first_address("to"),
+}
+
+DEFAULT_SORT = "email.received_at DESC, email.id"
+
+
+class EmailQueryEngine:
+    """Answers Email/query calls with the emails of a MailStore.
+
+    Filter conditions are translated to SQL over the indexed columns of the
+    stored emails and their mailbox and keyword tables, following the
+    semantics of RFC 8621: text conditions match substrings of address
+    names, addresses and the subject case-insensitively, ``before`` and
+    ``maxSize`` are exclusive and ``NOT`` matches emails matching none of
+    its conditions. Emails are sorted by the supported comparators and then
+    by id, or newest first without a sort, and ``collapseThreads`` keeps the
+    first email of each thread.
+
+    The response has the stored Email state as its query state. Filters that
+    need data the store doesn't have, such as ``header``, or ``text`` and
+    ``body`` without a FullTextIndex, and other sort properties raise
+    UnsupportedQueryError, or are sent to the server if there is a client.
+    """
+
+    def __init__(
+        self,
+        store: MailStore,
+        account_id: str,
+        client: Client | None = None,
+        fulltext: FullTextIndex | None = None,
+    ) -> None:
+        self.store = store
+        self.account_id = account_id
+        self.client = client
+        self.fulltext = fulltext
+
+    def supports(self, query: EmailQuery) -> bool:
+        try:
+            self._where(query.filter)
+            self._order(query.sort)
+        except UnsupportedQueryError:
+            return False
+        return True
+
+    def query(self, query: EmailQuery) -> EmailQueryResponse:
+        try:
+            where, params = self._where(query.filter)
+            order = self._order(query.sort)
+        except UnsupportedQueryError as e:
+            if self.client is None:
+                raise
+            log.debug(f"Sending Email query to the server: {e}")
+            return self._server_query(self.client, query)
+        sql = self._select(where, order, bool(query.collapse_threads))
+        params = [self.account_id, *params]
+        position = query.position or 0
+        total = None
+        if query.anchor is not None or position < 0:
+            ids = self._ids(sql, params)
+            total = len(ids)
+            position = self._start(query, ids)
+            ids = ids[position:]
+            if query.limit is not None:
+                ids = ids[: query.limit]
+        else:
+            ids = self._ids(
+                f"{sql} LIMIT ? OFFSET ?",
+                [*params, -1 if query.limit is None else query.limit, position],
+            )
+            if query.calculate_total:
+                total = self._count(sql, params)
+        return EmailQueryResponse(
+            account_id=self.account_id,
+            query_state=self.store.get_state(self.account_id, "Email") or "",
+            can_calculate_changes=False,
+            position=position,
+            ids=ids,
+            total=total if query.calculate_total else None,
+        )
+
+    def _where(self, query_filter: EmailQueryFilter | None) -> Clause:
+        if query_filter is None:
+            return "1", []
+        if isinstance(query_filter, EmailQueryFilterOperator):
+            return self._operator(query_filter)
+        if not isinstance(query_filter, EmailQueryFilterCondition):
+            raise UnsupportedQueryError(f"Unknown filter {query_filter!r}")
+        clauses, params = [], []
+        for field in dataclasses.fields(query_filter):
+            value = getattr(query_filter, field.name)
+            if value is not None:
+                clause, clause_params = self._condition(field.name, value)
+                clauses.append(clause)
+                params += clause_params
+        return " AND ".join(f"({c})" for c in clauses) or "1", params
+
+    def _condition(self, name: str, value: Any) -> Clause:
+        handler: Callable[[Any], Clause]
+        if name in CONDITION_COLUMNS and self.fulltext is not None:
+            handler = functools.partial(self.fulltext.condition, self.account_id, name)
+        elif name in CONDITIONS:
+            handler = CONDITIONS[name]
+        else:
+            raise UnsupportedQueryError(f'Unsupported filter "{name}"')
+        if not isinstance(value, (str, int, list)) and name not in ("before", "after"):
+            raise UnsupportedQueryError(f'Unsupported value for "{name}"')
+        return handler(value)
+
+    def _operator(self, operator: EmailQueryFilterOperator) -> Clause:
+        clauses, params = [], []
+        for condition in operator.conditions:
+            clause, clause_params = self._where(condition)
+            clauses.append(f"({clause})")
+            params += clause_params
+        if operator.operator == Operator.AND:
+            return " AND ".join(clauses) or "1", params
+        any_clause = " OR ".join(clauses) or "0"
+        if operator.operator == Operator.NOT:
+            return f"NOT ({any_clause})", params
+        return any_clause, params
+
+    def _order(self, sort: list[Comparator] | None) -> str:
+        if not sort:
+            return DEFAULT_SORT
+        columns = []
+        for comparator in sort:
+            column = SORT_PROPERTIES.get(comparator.property)
+            if column is None:
+                raise UnsupportedQueryError(
+                    f'Unsupported sort property "{comparator.property}"'
+                )
+            columns.append(f"{column} {'ASC' if comparator.is_ascending else 'DESC'}")
+        return ", ".join([*columns, "email.id"])
+
+    @staticmethod
+    def _select(where: str, order: str, collapse_threads: bool) -> str:
+        if not collapse_threads:
+            return (
+                f"SELECT email.id FROM email WHERE email.account_id = ?"  # noqa: S608  # built from CONDITIONS and SORT_PROPERTIES
+                f" AND ({where}) ORDER BY {order}"
+            )
+        # Number the matching emails of each thread in sort order
+        return (
+            "WITH matches AS (SELECT email.id,"  # noqa: S608  # built from CONDITIONS and SORT_PROPERTIES
+            " ROW_NUMBER() OVER (PARTITION BY coalesce(email.thread_id, email.id)"
+            f" ORDER BY {order}) AS thread_position,"
+            f" ROW_NUMBER() OVER (ORDER BY {order}) AS position"
+            f" FROM email WHERE email.account_id = ? AND ({where}))"
+            " SELECT id FROM matches WHERE thread_position = 1 ORDER BY position"
+        )
+
+    @staticmethod
+    def _start(query: EmailQuery, ids: list[str]) -> int:
+        if query.anchor is None:
+            return max(len(ids) + (query.position or 0), 0)
+        if query.anchor not in ids:
+            raise ClientError(f'Anchor "{query.anchor}" not found', result=[])
+        return max(ids.index(query.anchor) + (query.anchor_offset or 0), 0)
+
+    def _ids(self, sql: str, params: list[Any]) -> list[str]:
+        with self.store.transaction() as db:
+            return [r[0] for r in db.execute(sql, params).fetchall()]
+
+    def _count(self, sql: str, params: list[Any]) -> int:
+        count_sql = f"SELECT COUNT(*) FROM ({sql})"  # noqa: S608  # built from CONDITIONS and SORT_PROPERTIES
+        with self.store.transaction() as db:
+            return int(db.execute(count_sql, params).fetchone()[0])
+
+    @staticmethod
+    def _server_query(client: Client, query: EmailQuery) -> EmailQueryResponse:
+        response = client.request(query, raise_errors=True, single_response=True)
+        if not isinstance(response, EmailQueryResponse):
+            raise ClientError("Unexpected response for Email query", result=[])
+        return response
@@ -0,0 +1,346 @@
+from __future__ import annotations
+
+import contextlib
+import json
+import sqlite3
+import threading
+from datetime import timezone
+from typing import TYPE_CHECKING, Any, Union, cast
+
+from jmaplib.models import Email, Mailbox, Thread
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable, Iterator
+    from datetime import datetime
+    from pathlib import Path
+    from types import TracebackType
+
+    from typing_extensions import Self
+
+StoredObject = Union[Mailbox, Thread, Email]
+
+MIGRATIONS: list[str] = [
+    """
+    CREATE TABLE state (
+        account_id TEXT NOT NULL,
+        type TEXT NOT NULL,
+        state TEXT NOT NULL,
+        PRIMARY KEY (account_id, type)
+    );
+    CREATE TABLE mailbox (
+        account_id TEXT NOT NULL,
+        id TEXT NOT NULL,
+        data TEXT NOT NULL,
+        PRIMARY KEY (account_id, id)
+    );
+    CREATE TABLE thread (
+        account_id TEXT NOT NULL,
+        id TEXT NOT NULL,
+        data TEXT NOT NULL,
+        PRIMARY KEY (account_id, id)
+    );
+    CREATE TABLE email (
+        account_id TEXT NOT NULL,
+        id TEXT NOT NULL,
+        thread_id TEXT,
+        received_at TEXT,
+        data TEXT NOT NULL,
+        PRIMARY KEY (account_id, id)
+    );
+    CREATE INDEX email_thread ON email (account_id, thread_id);
+    CREATE INDEX email_received_at ON email (account_id, received_at);
+    CREATE TABLE email_mailbox (
+        account_id TEXT NOT NULL,
+        email_id TEXT NOT NULL,
+        mailbox_id TEXT NOT NULL,
+        PRIMARY KEY (account_id, mailbox_id, email_id)
+    );
+    CREATE INDEX email_mailbox_email ON email_mailbox (account_id, email_id);
+    """,
+    # Columns and keywords for local queries, filled from the stored emails
+    """
+    ALTER TABLE email ADD COLUMN size INTEGER;
+    ALTER TABLE email ADD COLUMN sent_at TEXT;
+    ALTER TABLE email ADD COLUMN subject TEXT;
+    ALTER TABLE email ADD COLUMN has_attachment INTEGER;
+    UPDATE email SET
+        received_at = strftime(
+            '%Y-%m-%dT%H:%M:%S+00:00', json_extract(data, '$.receivedAt')
+        ),
+        size = json_extract(data, '$.size'),
+        sent_at = strftime('%Y-%m-%dT%H:%M:%S+00:00', json_extract(data, '$.sentAt')),
+        subject = json_extract(data, '$.subject'),
+        has_attachment = json_extract(data, '$.hasAttachment');
+    CREATE INDEX email_size ON email (account_id, size);
+    CREATE INDEX email_sent_at ON email (account_id, sent_at);
+    CREATE TABLE email_keyword (
+        account_id TEXT NOT NULL,
+        email_id TEXT NOT NULL,
+        keyword TEXT NOT NULL,
+        PRIMARY KEY (account_id, keyword, email_id)
+    );
+    CREATE INDEX email_keyword_email ON email_keyword (account_id, email_id);
+    INSERT INTO email_keyword (account_id, email_id, keyword)
+        SELECT email.account_id, email.id, lower(keyword.key)
+        FROM email, json_each(email.data, '$.keywords') AS keyword
+        WHERE keyword.value;
+    """,
+]
+
+MODELS: dict[str, type[StoredObject]] = {
+    "Mailbox": Mailbox,
+    "Thread": Thread,
+    "Email": Email,
+}
+
+
+def timestamp(value: datetime) -> str:
+    """Format a date as stored, in UTC so that it sorts as text."""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S+00:00")
+
+
+def type_name(obj: StoredObject) -> str:
+    for name, model in MODELS.items():
+        if isinstance(obj, model):
+            return name
+    raise TypeError(f"Unsupported object type {type(obj).__name__}")
+
+
+class MailStore:
+    """Local SQLite replica of Mailbox, Thread and Email objects.
+
+    Objects are stored as their JSON representation per account, along with
+    the state string of each type they are current with. The schema version
+    is kept in ``PRAGMA user_version`` and outstanding migrations are applied
+    when the store is opened.
+    """
+
+    def __init__(self, path: str | Path = ":memory:") -> None:
+        self._db = sqlite3.connect(str(path), check_same_thread=False)
+        self._lock = threading.RLock()
+        self._depth = 0
+        self._migrate()
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc_value: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        self.close()
+
+    @property
+    def schema_version(self) -> int:
+        return int(self._db.execute("PRAGMA user_version").fetchone()[0])
+
+    def close(self) -> None:
+        self._db.close()
+
+    @contextlib.contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """Group writes, committing when the outermost transaction ends."""
+        with self._lock:
+            self._depth += 1
+            try:
+                yield self._db
+            except BaseException:
+                if self._depth == 1:
+                    self._db.rollback()
+                raise
+            else:
+                if self._depth == 1:
+                    self._db.commit()
+            finally:
+                self._depth -= 1
+
+    def get_state(self, account_id: str, type_name: str) -> str | None:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT state FROM state WHERE account_id = ? AND type = ?",
+                (account_id, type_name),
+            ).fetchone()
+        return row[0] if row else None
+
+    def set_state(self, account_id: str, type_name: str, state: str) -> None:
+        with self.transaction() as db:
+            db.execute(
+                "INSERT OR REPLACE INTO state (account_id, type, state)"
+                " VALUES (?, ?, ?)",
+                (account_id, type_name, state),
+            )
+
+    def put(self, account_id: str, objects: Iterable[StoredObject]) -> None:
+        with self.transaction() as db:
+            for obj in objects:
+                name = type_name(obj)
+                data = json.dumps(obj.to_dict())
+                if isinstance(obj, Email):
+                    self._put_email(db, account_id, obj, data)
+                    continue
+                db.execute(
+                    f"INSERT OR REPLACE INTO {name.lower()} (account_id, id, data)"  # noqa: S608  # table from MODELS
+                    " VALUES (?, ?, ?)",
+                    (account_id, obj.id, data),
+                )
+
+    def delete(self, account_id: str, type_name: str, ids: Iterable[str]) -> None:
+        table = self._table(type_name)
+        with self.transaction() as db:
+            for id_ in ids:
+                db.execute(
+                    f"DELETE FROM {table} WHERE account_id = ? AND id = ?",  # noqa: S608  # table from MODELS
+                    (account_id, id_),
+                )
+                if table == "email":
+                    self._delete_email_index(db, account_id, id_)
+
+    def clear(self, account_id: str, type_name: str) -> None:
+        """Remove all objects and the state of one type."""
+        self.delete(account_id, type_name, self.ids(account_id, type_name))
+        with self.transaction() as db:
+            db.execute(
+                "DELETE FROM state WHERE account_id = ? AND type = ?",
+                (account_id, type_name),
+            )
+
+    def ids(self, account_id: str, type_name: str) -> list[str]:
+        table = self._table(type_name)
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT id FROM {table} WHERE account_id = ?",  # noqa: S608  # table from MODELS
+                (account_id,),
+            ).fetchall()
+        return [r[0] for r in rows]
+
+    def thread_ids(self, account_id: str) -> list[str]:
+        """Return the ids of all threads referenced by stored emails."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT DISTINCT thread_id FROM email"
+                " WHERE account_id = ? AND thread_id IS NOT NULL",
+                (account_id,),
+            ).fetchall()
+        return [r[0] for r in rows]
+
+    def mailbox(self, account_id: str, id_: str) -> Mailbox | None:
+        return self._get(Mailbox, "mailbox", account_id, id_)
+
+    def thread(self, account_id: str, id_: str) -> Thread | None:
+        return self._get(Thread, "thread", account_id, id_)
+
+    def email(self, account_id: str, id_: str) -> Email | None:
+        return self._get(Email, "email", account_id, id_)
+
+    def mailboxes(self, account_id: str) -> list[Mailbox]:
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT data FROM mailbox WHERE account_id = ? ORDER BY id",
+                (account_id,),
+            ).fetchall()
+        return [Mailbox.from_dict(json.loads(r[0])) for r in rows]
+
+    def emails(
+        self,
+        account_id: str,
+        mailbox_id: str | None = None,
+        thread_id: str | None = None,
+    ) -> list[Email]:
+        """Return stored emails, newest first."""
+        sql = "SELECT email.data FROM email"
+        params: list[Any] = []
+        if mailbox_id:
+            sql += (
+                " JOIN email_mailbox ON email_mailbox.account_id = email.account_id"
+                " AND email_mailbox.email_id = email.id"
+                " AND email_mailbox.mailbox_id = ?"
+            )
+            params.append(mailbox_id)
+        sql += " WHERE email.account_id = ?"
+        params.append(account_id)
+        if thread_id:
+            sql += " AND email.thread_id = ?"
+            params.append(thread_id)
+        sql += " ORDER BY email.received_at DESC, email.id"
+        with self._lock:
+            rows = self._db.execute(sql, params).fetchall()
+        return [Email.from_dict(json.loads(r[0])) for r in rows]
+
+    def _get(
+        self, model: type[Any], table: str, account_id: str, id_: str
+    ) -> Any | None:
+        with self._lock:
+            row = self._db.execute(
+                f"SELECT data FROM {table} WHERE account_id = ? AND id = ?",  # noqa: S608  # table from MODELS
+                (account_id, id_),
+            ).fetchone()
+        return model.from_dict(json.loads(row[0])) if row else None
+
+    def _put_email(
+        self, db: sqlite3.Connection, account_id: str, email: Email, data: str
+    ) -> None:
+        db.execute(
+            "INSERT OR REPLACE INTO email"
+            " (account_id, id, thread_id, received_at, size, sent_at, subject,"
+            " has_attachment, data) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                account_id,
+                email.id,
+                email.thread_id,
+                timestamp(email.received_at) if email.received_at else None,
+                email.size,
+                timestamp(email.sent_at) if email.sent_at else None,
+                email.subject,
+                email.has_attachment,
+                data,
+            ),
+        )
+        self._delete_email_index(db, account_id, cast("str", email.id))
+        db.executemany(
+            "INSERT INTO email_mailbox (account_id, email_id, mailbox_id)"
+            " VALUES (?, ?, ?)",
+            [
+                (account_id, email.id, mailbox_id)
+                for mailbox_id, member in (email.mailbox_ids or {}).items()
+                if member
+            ],
+        )
+        db.executemany(
+            "INSERT INTO email_keyword (account_id, email_id, keyword)"
+            " VALUES (?, ?, ?)",
+            [
+                (account_id, email.id, keyword.lower())
+                for keyword, value in (email.keywords or {}).items()
+                if value
+            ],
+        )
+
+    @staticmethod
+    def _delete_email_index(
+        db: sqlite3.Connection, account_id: str, email_id: str
+    ) -> None:
+        for table in ("email_mailbox", "email_keyword"):
+            db.execute(
+                f"DELETE FROM {table} WHERE account_id = ? AND email_id = ?",  # noqa: S608  # fixed table names
+                (account_id, email_id),
+            )
+
+    def _table(self, type_name: str) -> str:
+        if type_name not in MODELS:
+            raise ValueError(f"Unsupported object type {type_name}")
+        return type_name.lower()
+
+    def _migrate(self) -> None:
+        version = self.schema_version
+        if version > len(MIGRATIONS):
+            raise ValueError(
+                f"Store schema version {version} is newer than supported"
+                f" version {len(MIGRATIONS)}"
+            )
+        for i, script in enumerate(MIGRATIONS[version:], start=version + 1):
+            with self.transaction() as db:
+                db.executescript(f"BEGIN; {script}; PRAGMA user_version = {i};")
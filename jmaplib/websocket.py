@@ -0,0 +1,416 @@
+from __future__ import annotations
+
+import base64
+import concurrent.futures
+import contextlib
+import hashlib
+import itertools
+import json
+import os
+import queue
+import socket
+import ssl
+import struct
+import threading
+from concurrent.futures import Future
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
+from urllib.parse import unquote, urlsplit
+
+from jmaplib.api import APIResponse
+from jmaplib.logging import log
+from jmaplib.models import Event, StateChange
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator
+    from types import TracebackType
+
+    from typing_extensions import Self
+
+    from jmaplib.api import APIRequest
+
+WEBSOCKET_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+SUBPROTOCOL = "jmap"
+CONNECT_TIMEOUT = 30
+
+OPCODE_CONTINUATION = 0x0
+OPCODE_TEXT = 0x1
+OPCODE_BINARY = 0x2
+OPCODE_CLOSE = 0x8
+OPCODE_PING = 0x9
+OPCODE_PONG = 0xA
+
+
+class WebSocketError(ConnectionError):
+    pass
+
+
+def mask_payload(key: bytes, payload: bytes) -> bytes:
+    n = len(payload)
+    mask = (key * (n // 4 + 1))[:n]
+    return (int.from_bytes(payload, "big") ^ int.from_bytes(mask, "big")).to_bytes(
+        n, "big"
+    )
+
+
+def encode_frame(opcode: int, payload: bytes, mask: bool = True) -> bytes:
+    length = len(payload)
+    header = bytes([0x80 | opcode])
+    mask_bit = 0x80 if mask else 0
+    if length < 126:  # noqa: PLR2004  # RFC 6455 payload length encoding
+        header += bytes([mask_bit | length])
+    elif length < 1 << 16:
+        header += bytes([mask_bit | 126]) + struct.pack("!H", length)
+    else:
+        header += bytes([mask_bit | 127]) + struct.pack("!Q", length)
+    if not mask:
+        return header + payload
+    key = os.urandom(4)
+    return header + key + mask_payload(key, payload)
+
+
+def ssl_context(
+    verify: bool | str = True, cert: str | tuple[str, str] | None = None
+) -> ssl.SSLContext:
+    """Create a TLS context from ``requests`` style verify and cert settings."""
+    if isinstance(verify, str):
+        if Path(verify).is_dir():
+            context = ssl.create_default_context(capath=verify)
+        else:
+            context = ssl.create_default_context(cafile=verify)
+    else:
+        context = ssl.create_default_context()
+        if not verify:
+            context.check_hostname = False
+            context.verify_mode = ssl.CERT_NONE
+    if isinstance(cert, str):
+        context.load_cert_chain(cert)
+    elif cert:
+        context.load_cert_chain(*cert)
+    return context
+
+
+def open_tunnel(proxy: str, host: str, port: int, timeout: float) -> socket.socket:
+    """Connect to host and port through the CONNECT method of an HTTP proxy."""
+    parts = urlsplit(proxy if "://" in proxy else f"http://{proxy}")
+    if parts.scheme != "http":
+        raise WebSocketError(f'Unsupported proxy scheme "{parts.scheme}"')
+    target = f"{host}:{port}"
+    request = f"CONNECT {target} HTTP/1.1\r\nHost: {target}\r\n"
+    if parts.username:
+        credentials = f"{unquote(parts.username)}:{unquote(parts.password or '')}"
+        token = base64.b64encode(credentials.encode()).decode()
+        request += f"Proxy-Authorization: Basic {token}\r\n"
+    sock = socket.create_connection((parts.hostname, parts.port or 80), timeout=timeout)
+    try:
+        sock.sendall(f"{request}\r\n".encode())
+        _read_tunnel_response(sock)
+    except BaseException:
+        sock.close()
+        raise
+    return sock
+
+
+def _read_tunnel_response(sock: socket.socket) -> None:
+    response = b""
+    while b"\r\n\r\n" not in response:
+        data = sock.recv(4096)
+        if not data:
+            raise WebSocketError("Proxy closed the connection")
+        response += data
+    status_line = response.split(b"\r\n", 1)[0].decode("latin-1")
+    if status_line.split(" ", 2)[1:2] != ["200"]:
+        raise WebSocketError(f"Proxy tunnel failed: {status_line}")
+
+
+class WebSocketConnection:
+    """Minimal RFC 6455 connection exchanging text messages.
+
+    Frames are masked as required for clients, unless ``mask`` is disabled.
+    """
+
+    def __init__(self, sock: socket.socket, mask: bool = True) -> None:
+        self._sock = sock
+        self._mask = mask
+        self._file = sock.makefile("rb")
+        self._send_lock = threading.Lock()
+        self.closed = False
+
+    @classmethod
+    def connect(
+        cls,
+        url: str,
+        headers: dict[str, str] | None = None,
+        subprotocol: str = SUBPROTOCOL,
+        timeout: float = CONNECT_TIMEOUT,
+        proxy: str | None = None,
+        verify: bool | str = True,
+        cert: str | tuple[str, str] | None = None,
+    ) -> WebSocketConnection:
+        """Open a connection, tunnelled through the HTTP ``proxy`` if given.
+
+        ``verify`` and ``cert`` configure TLS like the ``requests`` options.
+        """
+        parts = urlsplit(url)
+        hostname = parts.hostname or ""
+        secure = parts.scheme == "wss"
+        port = parts.port or (443 if secure else 80)
+        if proxy:
+            sock = open_tunnel(proxy, hostname, port, timeout)
+        else:
+            sock = socket.create_connection((hostname, port), timeout=timeout)
+        if secure:
+            try:
+                sock = ssl_context(verify, cert).wrap_socket(
+                    sock, server_hostname=hostname
+                )
+            except BaseException:
+                sock.close()
+                raise
+        connection = cls(sock)
+        try:
+            connection._handshake(parts.netloc, parts.path or "/", headers, subprotocol)
+        except BaseException:
+            connection.close()
+            raise
+        # Reads block until a message arrives
+        sock.settimeout(None)
+        return connection
+
+    def send_text(self, text: str) -> None:
+        self._send(OPCODE_TEXT, text.encode())
+
+    def recv_text(self) -> str | None:
+        """Return the next text message, or None once the connection is closed."""
+        message = b""
+        while True:
+            fin, opcode, payload = self._recv_frame()
+            if opcode == OPCODE_PING:
+                self._send(OPCODE_PONG, payload)
+            elif opcode == OPCODE_CLOSE:
+                self.close()
+                return None
+            elif opcode in (OPCODE_TEXT, OPCODE_BINARY, OPCODE_CONTINUATION):
+                message += payload
+                if fin:
+                    return message.decode()
+
+    def close(self) -> None:
+        if not self.closed:
+            self.closed = True
+            with contextlib.suppress(OSError):
+                self._send(OPCODE_CLOSE, struct.pack("!H", 1000))
+        # Shutting down wakes up a thread blocked reading from the socket
+        with contextlib.suppress(OSError):
+            self._sock.shutdown(socket.SHUT_RDWR)
+        self._file.close()
+        self._sock.close()
+
+    def _send(self, opcode: int, payload: bytes) -> None:
+        with self._send_lock:
+            self._sock.sendall(encode_frame(opcode, payload, mask=self._mask))
+
+    def _read(self, n: int) -> bytes:
+        data = self._file.read(n)
+        if len(data) < n:
+            raise WebSocketError("WebSocket connection closed unexpectedly")
+        return data
+
+    def _recv_frame(self) -> tuple[bool, int, bytes]:
+        first, second = self._read(2)
+        length = second & 0x7F
+        if length == 126:  # noqa: PLR2004  # RFC 6455 payload length encoding
+            length = struct.unpack("!H", self._read(2))[0]
+        elif length == 127:  # noqa: PLR2004  # RFC 6455 payload length encoding
+            length = struct.unpack("!Q", self._read(8))[0]
+        key = self._read(4) if second & 0x80 else None
+        payload = self._read(length)
+        if key:
+            payload = mask_payload(key, payload)
+        return bool(first & 0x80), first & 0x0F, payload
+
+    def _handshake(
+        self,
+        host: str,
+        path: str,
+        headers: dict[str, str] | None,
+        subprotocol: str,
+    ) -> None:
+        key = base64.b64encode(os.urandom(16)).decode()
+        request_headers = {
+            "Host": host,
+            "Upgrade": "websocket",
+            "Connection": "Upgrade",
+            "Sec-WebSocket-Key": key,
+            "Sec-WebSocket-Version": "13",
+            "Sec-WebSocket-Protocol": subprotocol,
+            **(headers or {}),
+        }
+        request = f"GET {path} HTTP/1.1\r\n" + "".join(
+            f"{name}: {value}\r\n" for name, value in request_headers.items()
+        )
+        self._sock.sendall(f"{request}\r\n".encode())
+        status_line = self._file.readline().decode("latin-1")
+        response_headers = {}
+        while line := self._file.readline().decode("latin-1").strip():
+            name, _, value = line.partition(":")
+            response_headers[name.strip().lower()] = value.strip()
+        if status_line.split(" ", 2)[1:2] != ["101"]:
+            raise WebSocketError(f"WebSocket upgrade failed: {status_line.strip()}")
+        digest = hashlib.sha1(
+            (key + WEBSOCKET_GUID).encode(), usedforsecurity=False
+        ).digest()
+        accept = base64.b64encode(digest).decode()
+        if response_headers.get("sec-websocket-accept") != accept:
+            raise WebSocketError("Invalid Sec-WebSocket-Accept header")
+        if response_headers.get("sec-websocket-protocol") != subprotocol:
+            raise WebSocketError(f'Server did not accept subprotocol "{subprotocol}"')
+
+
+class WebSocketTransport:
+    """Sends JMAP requests and receives push notifications over a WebSocket.
+
+    Requests are sent as RFC 8887 ``Request`` messages with a unique id, so
+    any number of threads can have requests in flight on the single
+    connection. A background thread reads all messages and resolves the
+    request futures, or queues ``StateChange`` messages once push has been
+    enabled with ``events()``.
+    """
+
+    def __init__(self, connection: WebSocketConnection) -> None:
+        self._connection = connection
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        self._pending: dict[str, Future[APIResponse]] = {}
+        self._push: queue.Queue[Event | Exception] = queue.Queue()
+        self._reader = threading.Thread(
+            target=self._read, name="jmaplib-websocket", daemon=True
+        )
+        self._reader.start()
+
+    @classmethod
+    def connect(
+        cls,
+        url: str,
+        headers: dict[str, str] | None = None,
+        proxy: str | None = None,
+        verify: bool | str = True,
+        cert: str | tuple[str, str] | None = None,
+    ) -> Self:
+        return cls(
+            WebSocketConnection.connect(
+                url, headers, proxy=proxy, verify=verify, cert=cert
+            )
+        )
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc_value: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        self.close()
+
+    @property
+    def closed(self) -> bool:
+        return self._connection.closed
+
+    def submit(self, request: APIRequest) -> Future[APIResponse]:
+        request_id = f"r{next(self._ids)}"
+        future: Future[APIResponse] = Future()
+        with self._lock:
+            if self.closed:
+                raise WebSocketError("WebSocket connection is closed")
+            self._pending[request_id] = future
+        message: dict[str, Any] = {"@type": "Request", "id": request_id}
+        message.update(request.to_dict(encode_json=True))
+        raw_message = json.dumps(message)
+        log.debug(f"Sending JMAP WebSocket request {raw_message}")
+        try:
+            self._connection.send_text(raw_message)
+        except OSError as e:
+            with self._lock:
+                self._pending.pop(request_id, None)
+            self.close()
+            raise WebSocketError(f"Sending WebSocket request failed: {e}") from e
+        return future
+
+    def request(self, request: APIRequest, timeout: float | None = None) -> APIResponse:
+        future = self.submit(request)
+        try:
+            return future.result(timeout=timeout)
+        except concurrent.futures.TimeoutError:
+            # Drop the request so a late response is ignored
+            with self._lock:
+                self._pending = {
+                    i: f for i, f in self._pending.items() if f is not future
+                }
+            raise
+
+    def events(
+        self, push_state: str | None = None, data_types: list[str] | None = None
+    ) -> Iterator[Event]:
+        """Enable push notifications and yield the received state changes.
+
+        The id of the events is the ``pushState`` to resume from.
+        """
+        message: dict[str, Any] = {"@type": "WebSocketPushEnable"}
+        if data_types is not None:
+            message["dataTypes"] = data_types
+        if push_state:
+            message["pushState"] = push_state
+        self._connection.send_text(json.dumps(message))
+        while True:
+            item = self._push.get()
+            if isinstance(item, Exception):
+                raise item
+            yield item
+
+    def close(self) -> None:
+        self._connection.close()
+
+    def _read(self) -> None:
+        error: Exception = WebSocketError("WebSocket connection closed")
+        try:
+            while (text := self._connection.recv_text()) is not None:
+                log.debug(f"Received JMAP WebSocket message {text}")
+                self._dispatch(json.loads(text))
+        except Exception as e:  # noqa: BLE001  # passed to the waiting threads
+            if not self.closed:
+                error = e
+        self._connection.close()
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        for future in pending.values():
+            future.set_exception(error)
+        self._push.put(error)
+
+    def _dispatch(self, message: dict[str, Any]) -> None:
+        message_type = message.get("@type")
+        if message_type == "StateChange":
+            event = Event(
+                id=message.get("pushState"), data=StateChange.from_dict(message)
+            )
+            self._push.put(event)
+            return
+        with self._lock:
+            future = self._pending.pop(message.get("requestId", ""), None)
+        if not future:
+            log.debug(f"Ignoring unexpected JMAP WebSocket message {message_type}")
+        elif message_type == "Response":
+            try:
+                response = APIResponse.from_dict(message)
+            except Exception as e:  # noqa: BLE001  # passed to the waiting thread
+                future.set_exception(e)
+            else:
+                future.set_result(response)
+        else:
+            future.set_exception(
+                WebSocketError(
+                    f'JMAP request failed with "{message.get("type")}":'
+                    f" {message.get('detail')}"
+                )
+            )
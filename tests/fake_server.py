@@ -0,0 +1,273 @@
+from __future__ import annotations
+
+import json
+import threading
+from typing import Any, Callable
+
+import responses
+
+Handler = Callable[[dict[str, Any]], dict[str, Any]]
+
+
+class MethodError(Exception):
+    def __init__(self, error_type: str, **kwargs: Any) -> None:
+        super().__init__(error_type)
+        self.response = {"type": error_type, **kwargs}
+
+
+def resolve_pointer(value: Any, path: str) -> Any:
+    for i, part in enumerate(path.strip("/").split("/")):
+        if part == "*":
+            rest = "/".join(path.strip("/").split("/")[i + 1 :])
+            items = [resolve_pointer(v, rest) if rest else v for v in value]
+            return [
+                x
+                for item in items
+                for x in (item if isinstance(item, list) else [item])
+            ]
+        value = value[int(part)] if isinstance(value, list) else value[part]
+    return value
+
+
+class FakeJMAPServer:
+    """Minimal JMAP API endpoint dispatching method calls to handlers."""
+
+    def __init__(
+        self,
+        http_responses: responses.RequestsMock | None = None,
+        url: str = "https://jmap-api.localhost/api",
+    ) -> None:
+        self.handlers: dict[str, Handler] = {}
+        self.method_calls: list[tuple[str, dict[str, Any]]] = []
+        self.api_requests = 0
+        self.lock = threading.Lock()
+        if http_responses is not None:
+            http_responses.add_callback(
+                method=responses.POST,
+                url=url,
+                callback=self._callback,
+            )
+
+    def on(self, method_name: str, handler: Handler) -> None:
+        self.handlers[method_name] = handler
+
+    def calls(self, method_name: str) -> list[dict[str, Any]]:
+        return [args for name, args in self.method_calls if name == method_name]
+
+    def _resolve(
+        self, arguments: dict[str, Any], previous: dict[str, list[Any]]
+    ) -> dict[str, Any]:
+        resolved = {}
+        for key, value in arguments.items():
+            if key.startswith("#"):
+                result = previous[value["resultOf"]]
+                if result[0] != value["name"]:
+                    raise MethodError("invalidResultReference")
+                resolved[key[1:]] = resolve_pointer(result[1], value["path"])
+            else:
+                resolved[key] = value
+        return resolved
+
+    def handle_request(self, body: dict[str, Any]) -> dict[str, Any]:
+        method_responses = []
+        previous: dict[str, list[Any]] = {}
+        with self.lock:
+            self.api_requests += 1
+        for name, arguments, call_id in body["methodCalls"]:
+            try:
+                resolved = self._resolve(arguments, previous)
+                with self.lock:
+                    self.method_calls.append((name, resolved))
+                response = [name, self.handlers[name](resolved), call_id]
+            except MethodError as e:
+                response = ["error", e.response, call_id]
+            previous[call_id] = response
+            method_responses.append(response)
+        return {
+            "methodResponses": method_responses,
+            "sessionState": "test;session;state",
+        }
+
+    def _callback(self, request: Any) -> tuple[int, dict[str, str], str]:
+        return 200, {}, json.dumps(self.handle_request(json.loads(request.body)))
+
+
+class FakeMailAccount:
+    """In-memory mail account served through a FakeJMAPServer.
+
+    Every modification is appended to the history of its type, and the state
+    of a type is the length of its history. States before ``min_state``
+    can't be used to calculate changes.
+    """
+
+    TYPES = ("Mailbox", "Email", "Thread", "EmailSubmission")
+
+    def __init__(self, server: FakeJMAPServer) -> None:
+        self.objects: dict[str, dict[str, dict[str, Any]]] = {t: {} for t in self.TYPES}
+        self.history: dict[str, list[tuple[str, str]]] = {t: [] for t in self.TYPES}
+        self.min_state: dict[str, int] = dict.fromkeys(self.TYPES, 0)
+        # Properties reported by the next Mailbox/changes responses
+        self.updated_properties: list[str] | None = None
+        # Query results by filter and state, to calculate query changes
+        self.query_results: dict[tuple[str, str], list[str]] = {}
+        for type_name in self.TYPES:
+            server.on(f"{type_name}/get", self._get_handler(type_name))
+            server.on(f"{type_name}/changes", self._changes_handler(type_name))
+        server.on("Mailbox/query", self._query_handler("Mailbox"))
+        server.on("Email/query", self._query_handler("Email"))
+        server.on("Email/queryChanges", self._query_changes_handler("Email"))
+
+    def state(self, type_name: str) -> str:
+        return str(len(self.history[type_name]))
+
+    def set(self, type_name: str, obj: dict[str, Any]) -> None:
+        kind = "updated" if obj["id"] in self.objects[type_name] else "created"
+        self.objects[type_name][obj["id"]] = obj
+        self.history[type_name].append((obj["id"], kind))
+
+    def destroy(self, type_name: str, id_: str) -> None:
+        del self.objects[type_name][id_]
+        self.history[type_name].append((id_, "destroyed"))
+
+    def add_mailbox(self, id_: str, name: str, **kwargs: Any) -> None:
+        self.set("Mailbox", {"id": id_, "name": name, **kwargs})
+
+    def add_email(
+        self, id_: str, mailbox_id: str, thread_id: str | None = None, **kwargs: Any
+    ) -> None:
+        thread_id = thread_id or f"T{id_}"
+        self.set(
+            "Email",
+            {
+                "id": id_,
+                "threadId": thread_id,
+                "mailboxIds": {mailbox_id: True},
+                "receivedAt": f"2024-01-01T00:00:{len(self.objects['Email']):02}Z",
+                **kwargs,
+            },
+        )
+        thread = self.objects["Thread"].get(
+            thread_id, {"id": thread_id, "emailIds": []}
+        )
+        self.set("Thread", {**thread, "emailIds": [*thread["emailIds"], id_]})
+
+    def _get_handler(self, type_name: str) -> Handler:
+        def _get(arguments: dict[str, Any]) -> dict[str, Any]:
+            objects = self.objects[type_name]
+            ids = arguments.get("ids")
+            if ids is None:
+                ids = list(objects)
+            properties = arguments.get("properties")
+            return {
+                "accountId": arguments["accountId"],
+                "state": self.state(type_name),
+                "list": [
+                    {
+                        k: v
+                        for k, v in objects[i].items()
+                        if not properties or k in properties or k == "id"
+                    }
+                    for i in ids
+                    if i in objects
+                ],
+                "notFound": [i for i in ids if i not in objects],
+            }
+
+        return _get
+
+    def _query_ids(self, type_name: str, arguments: dict[str, Any]) -> list[str]:
+        in_mailbox = (arguments.get("filter") or {}).get("inMailbox")
+        ids = sorted(
+            id_
+            for id_, obj in self.objects[type_name].items()
+            if not in_mailbox or in_mailbox in obj.get("mailboxIds", {})
+        )
+        key = json.dumps(arguments.get("filter"), sort_keys=True)
+        self.query_results[(key, self.state(type_name))] = ids
+        return ids
+
+    def _query_handler(self, type_name: str) -> Handler:
+        def _query(arguments: dict[str, Any]) -> dict[str, Any]:
+            ids = self._query_ids(type_name, arguments)
+            position = arguments.get("position", 0)
+            if "anchor" in arguments:
+                if arguments["anchor"] not in ids:
+                    raise MethodError("anchorNotFound")
+                position = ids.index(arguments["anchor"]) + arguments.get(
+                    "anchorOffset", 0
+                )
+            limit = arguments.get("limit", len(ids))
+            response = {
+                "accountId": arguments["accountId"],
+                "queryState": self.state(type_name),
+                "canCalculateChanges": True,
+                "position": position,
+                "ids": ids[position : position + limit],
+                "total": len(ids),
+            }
+            if "limit" in arguments:
+                response["limit"] = limit
+            return response
+
+        return _query
+
+    def _query_changes_handler(self, type_name: str) -> Handler:
+        def _query_changes(arguments: dict[str, Any]) -> dict[str, Any]:
+            key = json.dumps(arguments.get("filter"), sort_keys=True)
+            since = arguments["sinceQueryState"]
+            if int(since) < self.min_state[type_name]:
+                raise MethodError("cannotCalculateChanges")
+            old_ids = self.query_results[(key, since)]
+            ids = self._query_ids(type_name, arguments)
+            added = [
+                {"id": id_, "index": index}
+                for index, id_ in enumerate(ids)
+                if id_ not in old_ids
+            ]
+            if arguments.get("upToId") in ids:
+                last = ids.index(arguments["upToId"])
+                added = [a for a in added if a["index"] <= last]
+            removed = [id_ for id_ in old_ids if id_ not in ids]
+            max_changes = arguments.get("maxChanges")
+            if max_changes is not None and len(added) + len(removed) > max_changes:
+                raise MethodError("tooManyChanges")
+            return {
+                "accountId": arguments["accountId"],
+                "oldQueryState": since,
+                "newQueryState": self.state(type_name),
+                "removed": removed,
+                "added": added,
+                "total": len(ids) if arguments.get("calculateTotal") else None,
+            }
+
+        return _query_changes
+
+    def _changes_handler(self, type_name: str) -> Handler:
+        def _changes(arguments: dict[str, Any]) -> dict[str, Any]:
+            since = int(arguments["sinceState"])
+            if since < self.min_state[type_name]:
+                raise MethodError("cannotCalculateChanges")
+            history = self.history[type_name]
+            new_state = min(
+                since + arguments.get("maxChanges", len(history)), len(history)
+            )
+            changed: dict[str, str] = {}
+            for id_, kind in history[since:new_state]:
+                if kind == "destroyed" and changed.get(id_) == "created":
+                    del changed[id_]
+                elif changed.get(id_) != "created":
+                    changed[id_] = kind
+            response = {
+                "accountId": arguments["accountId"],
+                "oldState": str(since),
+                "newState": str(new_state),
+                "hasMoreChanges": new_state < len(history),
+                "created": [i for i, k in changed.items() if k == "created"],
+                "updated": [i for i, k in changed.items() if k == "updated"],
+                "destroyed": [i for i, k in changed.items() if k == "destroyed"],
+            }
+            if type_name == "Mailbox":
+                response["updatedProperties"] = self.updated_properties
+            return response
+
+        return _changes
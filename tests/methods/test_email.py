@@ -22,6 +22,8 @@ from jmaplib.methods import (
     EmailGetResponse,
     EmailImport,
     EmailImportResponse,
+    EmailParse,
+    EmailParseResponse,
     EmailQuery,
     EmailQueryChanges,
     EmailQueryChangesResponse,
@@ -235,6 +237,87 @@ def test_email_get(client, http_responses):
     )
 
 
+def test_email_parse(client, http_responses):
+    expected_request = {
+        "methodCalls": [
+            [
+                "Email/parse",
+                {
+                    "accountId": "u1138",
+                    "blobIds": ["B1", "B2", "B3"],
+                    "properties": ["subject", "from", "bodyValues"],
+                    "fetchTextBodyValues": True,
+                    "maxBodyValueBytes": 42,
+                },
+                "single.Email/parse",
+            ]
+        ],
+        "using": [
+            "urn:ietf:params:jmap:core",
+            "urn:ietf:params:jmap:mail",
+        ],
+    }
+    response = {
+        "methodResponses": [
+            [
+                "Email/parse",
+                {
+                    "accountId": "u1138",
+                    "parsed": {
+                        "B1": {
+                            "subject": "I'm taking a day trip to Happy Happy Village",
+                            "from": [
+                                {
+                                    "name": "Paula",
+                                    "email": "paula@twoson.example.net",
+                                }
+                            ],
+                            "bodyValues": {
+                                "1": {
+                                    "value": "See you there!",
+                                    "isEncodingProblem": False,
+                                    "isTruncated": False,
+                                }
+                            },
+                        },
+                    },
+                    "notParsable": ["B2"],
+                    "notFound": ["B3"],
+                },
+                "single.Email/parse",
+            ]
+        ]
+    }
+    expect_jmap_call(http_responses, expected_request, response)
+    assert client.request(
+        EmailParse(
+            blob_ids=["B1", "B2", "B3"],
+            properties=["subject", "from", "bodyValues"],
+            fetch_text_body_values=True,
+            max_body_value_bytes=42,
+        )
+    ) == EmailParseResponse(
+        account_id="u1138",
+        parsed={
+            "B1": Email(
+                subject="I'm taking a day trip to Happy Happy Village",
+                mail_from=[
+                    EmailAddress(name="Paula", email="paula@twoson.example.net"),
+                ],
+                body_values={
+                    "1": EmailBodyValue(
+                        value="See you there!",
+                        is_encoding_problem=False,
+                        is_truncated=False,
+                    )
+                },
+            ),
+        },
+        not_parsable=["B2"],
+        not_found=["B3"],
+    )
+
+
 def test_email_query(client, http_responses):
     expected_request = {
         "methodCalls": [
@@ -0,0 +1,111 @@
+import pytest
+
+from jmaplib.sync import MailStore, SyncEngine
+from tests.fake_server import FakeJMAPServer, FakeMailAccount
+
+
+@pytest.fixture
+def server(http_responses):
+    return FakeJMAPServer(http_responses)
+
+
+@pytest.fixture
+def account(server):
+    account = FakeMailAccount(server)
+    account.add_mailbox("MBX1", "Inbox", role="inbox")
+    account.add_mailbox("MBX2", "Archive", role="archive")
+    for i in range(5):
+        account.add_email(f"E{i}", "MBX1", subject=f"Subject {i}", size=100)
+    account.add_email("E5", "MBX2", thread_id="TE0")
+    return account
+
+
+def method_names(server, start=0):
+    return [name for name, _ in server.method_calls[start:]]
+
+
+def test_sync_initial(client, server, account):
+    store = MailStore()
+    SyncEngine(client, store, page_size=4).sync()
+    assert [m.id for m in store.mailboxes("u1138")] == ["MBX1", "MBX2"]
+    assert [e.id for e in store.emails("u1138", mailbox_id="MBX1")] == [
+        "E4",
+        "E3",
+        "E2",
+        "E1",
+        "E0",
+    ]
+    assert store.email("u1138", "E0").subject == "Subject 0"
+    assert store.thread("u1138", "TE0").email_ids == ["E0", "E5"]
+    assert store.get_state("u1138", "Mailbox") == account.state("Mailbox")
+    assert store.get_state("u1138", "Email") == account.state("Email")
+    assert store.get_state("u1138", "Thread") == account.state("Thread")
+    assert len(server.calls("Email/query")) == 2
+    assert all(
+        g["properties"] and "bodyStructure" not in g["properties"]
+        for g in server.calls("Email/get")
+    )
+
+
+def test_sync_incremental(client, server, account):
+    store = MailStore()
+    engine = SyncEngine(client, store)
+    engine.sync()
+    account.add_email("E6", "MBX2", subject="New")
+    account.destroy("Email", "E1")
+    account.add_mailbox("MBX1", "Renamed inbox", role="inbox")
+    start = len(server.method_calls)
+    engine.sync()
+    assert method_names(server, start) == [
+        "Mailbox/changes",
+        "Mailbox/get",
+        "Mailbox/get",
+        "Email/changes",
+        "Email/get",
+        "Email/get",
+        "Thread/changes",
+        "Thread/get",
+        "Thread/get",
+    ]
+    assert store.mailbox("u1138", "MBX1").name == "Renamed inbox"
+    assert store.email("u1138", "E1") is None
+    assert store.email("u1138", "E6").subject == "New"
+    assert store.thread("u1138", "TE6").email_ids == ["E6"]
+    assert store.get_state("u1138", "Email") == account.state("Email")
+
+
+def test_sync_after_restart(client, server, account, tempdir):
+    with MailStore(tempdir / "mail.db") as store:
+        SyncEngine(client, store).sync()
+    account.add_email("E6", "MBX1")
+    start = len(server.method_calls)
+    with MailStore(tempdir / "mail.db") as store:
+        SyncEngine(client, store).sync()
+        assert store.email("u1138", "E6")
+        assert len(store.ids("u1138", "Email")) == 7
+    assert "Email/query" not in method_names(server, start)
+
+
+def test_sync_cannot_calculate_changes(client, server, account):
+    store = MailStore()
+    engine = SyncEngine(client, store)
+    engine.sync()
+    account.destroy("Email", "E2")
+    account.add_email("E6", "MBX1")
+    account.min_state["Email"] = len(account.history["Email"])
+    start = len(server.method_calls)
+    engine.sync()
+    # Only emails are loaded again
+    assert method_names(server, start).count("Email/query") == 1
+    assert "Mailbox/query" not in method_names(server, start)
+    assert store.email("u1138", "E2") is None
+    assert store.email("u1138", "E6")
+    assert store.get_state("u1138", "Email") == account.state("Email")
+
+
+def test_sync_empty_account(client, server):
+    FakeMailAccount(server)
+    store = MailStore()
+    SyncEngine(client, store).sync()
+    assert store.get_state("u1138", "Email") == "0"
+    assert store.get_state("u1138", "Thread") == "0"
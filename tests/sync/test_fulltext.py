@@ -0,0 +1,129 @@
+import pytest
+
+from jmaplib import Email, EmailAddress, EmailBodyPart, EmailBodyValue, SearchSnippet
+from jmaplib.methods import EmailQuery
+from jmaplib.models import EmailQueryFilterCondition
+from jmaplib.sync import EmailQueryEngine, FullTextIndex, MailStore, SyncEngine
+from jmaplib.sync.fulltext import match_query
+from tests.fake_server import FakeJMAPServer, FakeMailAccount
+
+
+def add_email(account, id_, subject, body, **kwargs):
+    account.add_email(
+        id_,
+        "MBX1",
+        subject=subject,
+        preview=body[:20],
+        textBody=[{"partId": "1"}],
+        bodyValues={"1": {"value": body}, "2": {"value": "Not a text part"}},
+        **kwargs,
+    )
+
+
+@pytest.fixture
+def server(http_responses):
+    return FakeJMAPServer(http_responses)
+
+
+@pytest.fixture
+def account(server):
+    account = FakeMailAccount(server)
+    add_email(
+        account,
+        "E1",
+        "Lunch on Friday",
+        "Shall we try the new café near the office?",
+        **{"from": [{"name": "Paula", "email": "paula@twoson.example"}]},
+    )
+    add_email(account, "E2", "Office move", "The office moves to <Onett> in June.")
+    add_email(account, "E3", "Quarterly report", "Numbers are attached.")
+    return account
+
+
+@pytest.fixture
+def store():
+    with MailStore() as store:
+        yield store
+
+
+@pytest.fixture
+def index(store):
+    return FullTextIndex(store)
+
+
+def test_fulltext_sync(client, server, account, store, index):
+    engine = SyncEngine(client, store, fulltext=index)
+    engine.sync()
+    assert sorted(index.ids("u1138")) == ["E1", "E2", "E3"]
+    text_get = server.calls("Email/get")[-1]
+    assert text_get["fetchTextBodyValues"] is True
+    assert "bodyValues" in text_get["properties"]
+    assert index.search("u1138", "office") == ["E2", "E1"]
+    assert index.search("u1138", "cafe") == ["E1"]
+    assert index.search("u1138", "paula twoson") == ["E1"]
+    assert index.search("u1138", "quart") == ["E3"]
+    assert index.search("u1138", "text part") == []
+    assert index.search("u1138", "office", column="body", limit=1) == ["E2"]
+    assert index.search("u2000", "office") == []
+    # New emails are indexed from the changes, destroyed ones removed
+    add_email(account, "E4", "Office party", "Cake in the kitchen")
+    account.destroy("Email", "E2")
+    engine.sync()
+    assert index.search("u1138", "office") == ["E4", "E1"]
+    assert [c["ids"] for c in server.calls("Email/get")[-1:]] == [["E4"]]
+
+
+def test_fulltext_snippets(index):
+    index.add(
+        "u1138",
+        [
+            Email(
+                id="E1",
+                subject="Office <move>",
+                text_body=[EmailBodyPart(part_id="1")],
+                body_values={"1": EmailBodyValue(value="The office moves in June.")},
+            ),
+            Email(
+                id="E2",
+                subject="Lunch",
+                mail_from=[EmailAddress(email="office@onett.example")],
+            ),
+        ],
+    )
+    assert index.snippets("u1138", "offi", ["E1", "E2", "E3"]) == [
+        SearchSnippet(
+            email_id="E1",
+            subject="<mark>Office</mark> &lt;move&gt;",
+            preview="The <mark>office</mark> moves in June.",
+        ),
+        SearchSnippet(email_id="E2"),
+        SearchSnippet(email_id="E3"),
+    ]
+    index.remove("u1138", ["E1"])
+    assert index.search("u1138", "office") == ["E2"]
+
+
+def test_fulltext_query_engine(store, index):
+    store.put("u1138", [Email(id="E1", subject="Lunch"), Email(id="E2")])
+    index.add(
+        "u1138",
+        [
+            Email(id="E1", subject="Lunch"),
+            Email(
+                id="E2",
+                body_values={"1": EmailBodyValue(value="Lunch is ready")},
+            ),
+        ],
+    )
+    engine = EmailQueryEngine(store, "u1138", fulltext=index)
+    text = EmailQuery(filter=EmailQueryFilterCondition(text="lunch"))
+    body = EmailQuery(filter=EmailQueryFilterCondition(body="lunch"))
+    assert sorted(engine.query(text).ids) == ["E1", "E2"]
+    assert engine.query(body).ids == ["E2"]
+    assert not EmailQueryEngine(store, "u1138").supports(text)
+
+
+def test_match_query():
+    assert match_query('say "hi" to Ness') == '"say" "hi" "to" "Ness"*'
+    assert match_query("Lunch", column="body") == '{body} : ("Lunch"*)'
+    assert match_query(" ") == '""'
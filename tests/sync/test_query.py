@@ -0,0 +1,185 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from jmaplib import (
+    Comparator,
+    Email,
+    EmailAddress,
+    EmailQueryFilterCondition,
+    EmailQueryFilterOperator,
+    Operator,
+)
+from jmaplib.methods import EmailQuery
+from jmaplib.sync import EmailQueryEngine, MailStore, UnsupportedQueryError
+from tests.fake_server import FakeJMAPServer, FakeMailAccount
+
+
+def make_email(id_, thread_id, mailbox_id="MBX1", **kwargs):
+    return Email(
+        id=id_,
+        thread_id=thread_id,
+        mailbox_ids={mailbox_id: True},
+        received_at=datetime(2024, 1, int(id_[1:]), tzinfo=timezone.utc),
+        **kwargs,
+    )
+
+
+@pytest.fixture
+def store():
+    with MailStore() as store:
+        store.put(
+            "u1138",
+            [
+                make_email(
+                    "E1",
+                    "T1",
+                    size=1000,
+                    subject="Meeting notes",
+                    mail_from=[EmailAddress(name="Ness", email="ness@onett.example")],
+                    keywords={"$seen": True},
+                ),
+                make_email(
+                    "E2",
+                    "T1",
+                    size=5000,
+                    subject="Re: Meeting notes",
+                    mail_from=[EmailAddress(email="paula@twoson.example")],
+                    has_attachment=True,
+                    keywords={"$Seen": True, "$flagged": True},
+                ),
+                make_email(
+                    "E3",
+                    "T2",
+                    "MBX2",
+                    size=200,
+                    subject="100% off_sale",
+                    mail_from=[EmailAddress(name="Jeff", email="jeff@winters.example")],
+                    keywords={"$flagged": False},
+                ),
+                make_email(
+                    "E4",
+                    "T3",
+                    size=3000,
+                    subject="lunch",
+                    sent_at=datetime(
+                        2023, 12, 31, 23, tzinfo=timezone(timedelta(hours=-5))
+                    ),
+                ),
+            ],
+        )
+        store.set_state("u1138", "Email", "s1")
+        yield store
+
+
+@pytest.fixture
+def engine(store):
+    return EmailQueryEngine(store, "u1138")
+
+
+def ids(engine, query_filter=None, **kwargs):
+    return engine.query(EmailQuery(filter=query_filter, **kwargs)).ids
+
+
+@pytest.mark.parametrize(
+    ["condition", "expected"],
+    [
+        (EmailQueryFilterCondition(in_mailbox="MBX1"), ["E4", "E2", "E1"]),
+        (EmailQueryFilterCondition(in_mailbox_other_than=["MBX1"]), ["E3"]),
+        (
+            EmailQueryFilterCondition(
+                after=datetime(2024, 1, 2, tzinfo=timezone.utc),
+                before=datetime(2024, 1, 4, tzinfo=timezone.utc),
+            ),
+            ["E3", "E2"],
+        ),
+        (EmailQueryFilterCondition(min_size=1000, max_size=5000), ["E4", "E1"]),
+        (EmailQueryFilterCondition(has_keyword="$seen"), ["E2", "E1"]),
+        (EmailQueryFilterCondition(not_keyword="$flagged"), ["E4", "E3", "E1"]),
+        (EmailQueryFilterCondition(all_in_thread_have_keyword="$seen"), ["E2", "E1"]),
+        (
+            EmailQueryFilterCondition(some_in_thread_have_keyword="$flagged"),
+            ["E2", "E1"],
+        ),
+        (
+            EmailQueryFilterCondition(none_in_thread_have_keyword="$flagged"),
+            ["E4", "E3"],
+        ),
+        (EmailQueryFilterCondition(has_attachment=True), ["E2"]),
+        (EmailQueryFilterCondition(has_attachment=False), ["E4", "E3", "E1"]),
+        (EmailQueryFilterCondition(mail_from="NESS"), ["E1"]),
+        (EmailQueryFilterCondition(mail_from="twoson"), ["E2"]),
+        (EmailQueryFilterCondition(mail_from="email"), []),
+        (EmailQueryFilterCondition(subject="meeting"), ["E2", "E1"]),
+        (EmailQueryFilterCondition(subject="0% off_"), ["E3"]),
+        (EmailQueryFilterCondition(subject="_"), ["E3"]),
+    ],
+)
+def test_query_conditions(engine, condition, expected):
+    assert ids(engine, condition) == expected
+
+
+def test_query_operators(engine):
+    seen = EmailQueryFilterCondition(has_keyword="$seen")
+    small = EmailQueryFilterCondition(max_size=1001)
+    assert ids(engine, EmailQueryFilterOperator(Operator.AND, [seen, small])) == ["E1"]
+    assert ids(engine, EmailQueryFilterOperator(Operator.OR, [seen, small])) == [
+        "E3",
+        "E2",
+        "E1",
+    ]
+    assert ids(engine, EmailQueryFilterOperator(Operator.NOT, [seen, small])) == ["E4"]
+    assert ids(engine, EmailQueryFilterOperator(Operator.OR, [])) == []
+
+
+def test_query_sort_and_window(engine):
+    by_size = [Comparator(property="size")]
+    assert ids(engine, sort=by_size) == ["E3", "E1", "E4", "E2"]
+    assert ids(engine, sort=[Comparator(property="subject")]) == [
+        "E3",
+        "E4",
+        "E1",
+        "E2",
+    ]
+    # Emails without a from address sort last in descending order
+    assert ids(engine, sort=[Comparator(property="from", is_ascending=False)]) == [
+        "E2",
+        "E1",
+        "E3",
+        "E4",
+    ]
+    assert ids(engine, sort=[Comparator(property="sentAt", is_ascending=False)]) == [
+        "E4",
+        "E1",
+        "E2",
+        "E3",
+    ]
+    response = engine.query(
+        EmailQuery(sort=by_size, position=1, limit=2, calculate_total=True)
+    )
+    assert (response.ids, response.position, response.total) == (["E1", "E4"], 1, 4)
+    assert response.query_state == "s1"
+    assert ids(engine, sort=by_size, position=-1) == ["E2"]
+    assert ids(engine, sort=by_size, anchor="E4", anchor_offset=-1, limit=1) == ["E1"]
+    assert ids(engine, collapse_threads=True) == ["E4", "E3", "E2"]
+    assert ids(engine, sort=by_size, collapse_threads=True) == ["E3", "E1", "E4"]
+
+
+def test_query_unsupported(engine, store):
+    text = EmailQuery(filter=EmailQueryFilterCondition(text="lunch"))
+    assert not engine.supports(text)
+    assert not engine.supports(EmailQuery(sort=[Comparator(property="hasKeyword")]))
+    assert engine.supports(EmailQuery(filter=EmailQueryFilterCondition(subject="x")))
+    with pytest.raises(UnsupportedQueryError, match='"text"'):
+        engine.query(text)
+
+
+def test_query_server_fallback(client, http_responses, store):
+    server = FakeJMAPServer(http_responses)
+    account = FakeMailAccount(server)
+    account.add_email("E9", "MBX1")
+    engine = EmailQueryEngine(store, client.account_id, client)
+    body = EmailQueryFilterCondition(body="lunch")
+    assert engine.query(EmailQuery(filter=body)).ids == ["E9"]
+    assert ids(engine, EmailQueryFilterCondition(subject="lunch")) == ["E4"]
+    assert len(server.calls("Email/query")) == 1
@@ -0,0 +1,134 @@
+import sqlite3
+from datetime import datetime, timezone
+
+import pytest
+
+from jmaplib import Email, Mailbox, Thread
+from jmaplib.sync import MailStore
+from jmaplib.sync.store import MIGRATIONS
+
+
+@pytest.fixture
+def store():
+    with MailStore() as store:
+        yield store
+
+
+def make_email(id_, mailbox_id, second=0, thread_id="T1"):
+    return Email(
+        id=id_,
+        thread_id=thread_id,
+        mailbox_ids={mailbox_id: True},
+        received_at=datetime(2024, 1, 1, 0, 0, second, tzinfo=timezone.utc),
+        subject=f"Subject {id_}",
+    )
+
+
+def test_store_objects(store):
+    store.put(
+        "u1138",
+        [
+            Mailbox(id="MBX1", name="Inbox", role="inbox"),
+            Thread(id="T1", email_ids=["E1", "E2"]),
+            make_email("E1", "MBX1", second=1),
+            make_email("E2", "MBX2", second=2),
+        ],
+    )
+    assert store.mailbox("u1138", "MBX1") == Mailbox(
+        id="MBX1", name="Inbox", role="inbox"
+    )
+    assert store.mailbox("u2000", "MBX1") is None
+    assert store.thread("u1138", "T1") == Thread(id="T1", email_ids=["E1", "E2"])
+    assert store.email("u1138", "E1") == make_email("E1", "MBX1", second=1)
+    assert [e.id for e in store.emails("u1138")] == ["E2", "E1"]
+    assert [e.id for e in store.emails("u1138", mailbox_id="MBX1")] == ["E1"]
+    assert [e.id for e in store.emails("u1138", thread_id="T1")] == ["E2", "E1"]
+    assert store.thread_ids("u1138") == ["T1"]
+
+
+def test_store_update_and_delete(store):
+    store.put("u1138", [make_email("E1", "MBX1"), make_email("E2", "MBX1")])
+    store.put("u1138", [make_email("E1", "MBX2")])
+    assert [e.id for e in store.emails("u1138", mailbox_id="MBX1")] == ["E2"]
+    assert [e.id for e in store.emails("u1138", mailbox_id="MBX2")] == ["E1"]
+    store.delete("u1138", "Email", ["E1"])
+    assert store.email("u1138", "E1") is None
+    assert not store.emails("u1138", mailbox_id="MBX2")
+
+
+def test_store_state(store):
+    assert store.get_state("u1138", "Email") is None
+    store.set_state("u1138", "Email", "s1")
+    store.set_state("u1138", "Email", "s2")
+    assert store.get_state("u1138", "Email") == "s2"
+    store.put("u1138", [make_email("E1", "MBX1")])
+    store.clear("u1138", "Email")
+    assert store.get_state("u1138", "Email") is None
+    assert store.ids("u1138", "Email") == []
+
+
+def test_store_transaction_rollback(store):
+    store.set_state("u1138", "Mailbox", "s1")
+
+    def _failing_update():
+        with store.transaction():
+            store.put("u1138", [Mailbox(id="MBX1", name="Inbox")])
+            store.set_state("u1138", "Mailbox", "s2")
+            raise RuntimeError
+
+    with pytest.raises(RuntimeError):
+        _failing_update()
+    assert store.get_state("u1138", "Mailbox") == "s1"
+    assert store.mailboxes("u1138") == []
+
+
+def test_store_persistent(tempdir):
+    path = tempdir / "mail.db"
+    with MailStore(path) as store:
+        store.put("u1138", [Mailbox(id="MBX1", name="Inbox")])
+        store.set_state("u1138", "Mailbox", "s1")
+    with MailStore(path) as store:
+        assert store.schema_version == len(MIGRATIONS)
+        assert store.get_state("u1138", "Mailbox") == "s1"
+        assert store.mailboxes("u1138") == [Mailbox(id="MBX1", name="Inbox")]
+
+
+def test_store_migrate_query_columns(tempdir):
+    path = tempdir / "mail.db"
+    db = sqlite3.connect(path)
+    db.executescript(f"{MIGRATIONS[0]}; PRAGMA user_version = 1;")
+    db.execute(
+        "INSERT INTO email (account_id, id, received_at, data) VALUES (?, ?, ?, ?)",
+        (
+            "u1138",
+            "E1",
+            "2024-01-01T00:00:01+00:00",
+            '{"id": "E1", "size": 1200, "receivedAt": "2024-01-01T00:00:01Z",'
+            ' "keywords": {"$Seen": true, "$flagged": false}}',
+        ),
+    )
+    db.commit()
+    db.close()
+    with MailStore(path) as store, store.transaction() as db:
+        assert db.execute(
+            "SELECT received_at, size FROM email WHERE id = 'E1'"
+        ).fetchone() == ("2024-01-01T00:00:01+00:00", 1200)
+        assert db.execute("SELECT email_id, keyword FROM email_keyword").fetchall() == [
+            ("E1", "$seen")
+        ]
+
+
+def test_store_newer_schema(tempdir):
+    path = tempdir / "mail.db"
+    db = sqlite3.connect(path)
+    db.execute(f"PRAGMA user_version = {len(MIGRATIONS) + 1}")
+    db.close()
+    with pytest.raises(ValueError, match="newer than supported"):
+        MailStore(path)
+
+
+def test_store_unsupported_type(store):
+    with pytest.raises(TypeError):
+        store.put("u1138", [object()])
+    with pytest.raises(ValueError, match="Unsupported object type"):
+        store.ids("u1138", "Identity")
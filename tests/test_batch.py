@@ -0,0 +1,318 @@
+import json
+
+import pytest
+import responses
+
+from jmaplib import ClientError, MailboxQueryFilterCondition, Ref, ResultReference
+from jmaplib.batch import pack_invocations, uses_reference
+from jmaplib.methods import (
+    CoreEcho,
+    CoreEchoResponse,
+    Invocation,
+    MailboxGet,
+    MailboxGetResponse,
+    MailboxQuery,
+    MailboxQueryResponse,
+)
+from tests.data import make_session_response
+from tests.utils import expect_jmap_call
+
+
+@pytest.fixture
+def small_request_responses(http_responses_base):
+    session_response = make_session_response()
+    session_response["capabilities"]["urn:ietf:params:jmap:core"][
+        "maxCallsInRequest"
+    ] = 2
+    http_responses_base.add(
+        method=responses.GET,
+        url="https://jmap-example.localhost/.well-known/jmap",
+        body=json.dumps(session_response),
+    )
+    return http_responses_base
+
+
+def echo_callback(request):
+    body = json.loads(request.body)
+    return (
+        200,
+        {},
+        json.dumps(
+            {
+                "methodResponses": body["methodCalls"],
+                "sessionState": "test;session;state",
+            }
+        ),
+    )
+
+
+def test_batch_execute(client, http_responses):
+    expected_request = {
+        "methodCalls": [
+            [
+                "Mailbox/query",
+                {
+                    "accountId": "u1138",
+                    "filter": {"name": "Inbox"},
+                    "sortAsTree": False,
+                    "filterAsTree": False,
+                },
+                "0.Mailbox/query",
+            ],
+            [
+                "Mailbox/get",
+                {
+                    "accountId": "u1138",
+                    "#ids": {
+                        "name": "Mailbox/query",
+                        "path": "/ids",
+                        "resultOf": "0.Mailbox/query",
+                    },
+                },
+                "1.Mailbox/get",
+            ],
+            ["Core/echo", {"who": "Ness"}, "2.Core/echo"],
+        ],
+        "using": ["urn:ietf:params:jmap:core", "urn:ietf:params:jmap:mail"],
+    }
+    response = {
+        "methodResponses": [
+            [
+                "Mailbox/query",
+                {
+                    "accountId": "u1138",
+                    "ids": ["MBX1"],
+                    "queryState": "1000",
+                    "canCalculateChanges": True,
+                    "position": 0,
+                },
+                "0.Mailbox/query",
+            ],
+            [
+                "Mailbox/get",
+                {
+                    "accountId": "u1138",
+                    "list": [{"id": "MBX1", "name": "Inbox"}],
+                    "not_found": [],
+                    "state": "2000",
+                },
+                "1.Mailbox/get",
+            ],
+            ["Core/echo", {"who": "Ness"}, "2.Core/echo"],
+        ]
+    }
+    expect_jmap_call(http_responses, expected_request, response)
+    batch = client.batch()
+    query = batch.add(
+        MailboxQuery(filter=MailboxQueryFilterCondition(name="Inbox")),
+        MailboxQueryResponse,
+    )
+    get = batch.add(MailboxGet(ids=Ref("/ids")), MailboxGetResponse)
+    echo = batch.add(CoreEcho(data={"who": "Ness"}))
+    assert len(batch) == 3
+    assert not get.done()
+    results = batch.execute()
+    assert len(results) == 3
+    assert query.result().ids == ["MBX1"]
+    assert [m.name for m in get.result().data] == ["Inbox"]
+    assert echo.result() == CoreEchoResponse(data={"who": "Ness"})
+
+
+def test_batch_method_error(client, http_responses):
+    expected_request = {
+        "methodCalls": [
+            ["Mailbox/get", {"accountId": "u1138", "ids": ["MBX1"]}, "custom"],
+            ["Core/echo", {"who": "Paula"}, "1.Core/echo"],
+        ],
+        "using": ["urn:ietf:params:jmap:core", "urn:ietf:params:jmap:mail"],
+    }
+    response = {
+        "methodResponses": [
+            ["error", {"type": "accountNotFound"}, "custom"],
+            ["Core/echo", {"who": "Paula"}, "1.Core/echo"],
+        ]
+    }
+    expect_jmap_call(http_responses, expected_request, response)
+    batch = client.batch()
+    get = batch.add(
+        Invocation(id="custom", method=MailboxGet(ids=["MBX1"])), MailboxGetResponse
+    )
+    echo = batch.add(CoreEcho(data={"who": "Paula"}), CoreEchoResponse)
+    batch.execute()
+    with pytest.raises(ClientError) as e:
+        get.result()
+    assert str(e.value) == 'Method call custom failed with "accountNotFound"'
+    assert echo.result() == CoreEchoResponse(data={"who": "Paula"})
+
+
+def test_batch_unexpected_response_type(client, http_responses):
+    http_responses.add_callback(
+        method=responses.POST,
+        url="https://jmap-api.localhost/api",
+        callback=echo_callback,
+    )
+    batch = client.batch()
+    echo = batch.add(CoreEcho(data={"who": "Jeff"}), MailboxGetResponse)
+    batch.execute()
+    with pytest.raises(ClientError) as e:
+        echo.result()
+    assert str(e.value) == (
+        "Unexpected CoreEchoResponse for method call 0.Core/echo,"
+        " expected MailboxGetResponse"
+    )
+
+
+def test_batch_inferred_response_type(client, http_responses):
+    def callback(request):
+        body = json.loads(request.body)
+        method_responses = [["Core/echo", {}, call[2]] for call in body["methodCalls"]]
+        return (
+            200,
+            {},
+            json.dumps(
+                {
+                    "methodResponses": method_responses,
+                    "sessionState": "test;session;state",
+                }
+            ),
+        )
+
+    http_responses.add_callback(
+        method=responses.POST,
+        url="https://jmap-api.localhost/api",
+        callback=callback,
+    )
+    batch = client.batch()
+    mailboxes = batch.add(MailboxGet(ids=None))
+    echo = batch.add(CoreEcho(data={}))
+    batch.execute()
+    with pytest.raises(ClientError) as e:
+        mailboxes.result()
+    assert str(e.value) == (
+        "Unexpected CoreEchoResponse for method call 0.Mailbox/get,"
+        " expected MailboxGetResponse"
+    )
+    assert echo.result() == CoreEchoResponse(data={})
+
+
+def test_batch_packing(client, small_request_responses):
+    small_request_responses.add_callback(
+        method=responses.POST,
+        url="https://jmap-api.localhost/api",
+        callback=echo_callback,
+    )
+    batch = client.batch()
+    echoes = [batch.add(CoreEcho(data={"n": i})) for i in range(5)]
+    results = batch.execute()
+    assert len(small_request_responses.calls) == 4
+    assert [r.id for r in results] == [f"{i}.Core/echo" for i in range(5)]
+    assert [e.result().data for e in echoes] == [{"n": i} for i in range(5)]
+
+
+def test_batch_submit(client, small_request_responses):
+    small_request_responses.add_callback(
+        method=responses.POST,
+        url="https://jmap-api.localhost/api",
+        callback=echo_callback,
+    )
+    with client:
+        batch = client.batch()
+        echoes = [batch.add(CoreEcho(data={"n": i})) for i in range(5)]
+        results = batch.submit().result(timeout=5)
+        executor = client.executor
+    assert [r.id for r in results] == [f"{i}.Core/echo" for i in range(5)]
+    assert [e.result().data for e in echoes] == [{"n": i} for i in range(5)]
+    # Closing the client shuts down its worker threads
+    with pytest.raises(RuntimeError):
+        executor.submit(print)
+
+
+def test_batch_submit_http_error(client, http_responses):
+    http_responses.add(
+        method=responses.POST,
+        url="https://jmap-api.localhost/api",
+        status=500,
+    )
+    batch = client.batch()
+    echo = batch.add(CoreEcho(data={"who": "Poo"}))
+    future = batch.submit()
+    with pytest.raises(Exception) as e:
+        future.result(timeout=5)
+    assert e.value.response.status_code == 500
+    assert echo.exception() is e.value
+
+
+def test_batch_already_sent(client, http_responses):
+    http_responses.add_callback(
+        method=responses.POST,
+        url="https://jmap-api.localhost/api",
+        callback=echo_callback,
+    )
+    batch = client.batch()
+    batch.add(CoreEcho(data={}))
+    batch.execute()
+    with pytest.raises(RuntimeError):
+        batch.add(CoreEcho(data={}))
+    with pytest.raises(RuntimeError):
+        batch.execute()
+
+
+def test_batch_duplicate_id(client):
+    batch = client.batch()
+    batch.add(Invocation(id="dup", method=CoreEcho(data={})))
+    with pytest.raises(ValueError):
+        batch.add(Invocation(id="dup", method=CoreEcho(data={})))
+
+
+def test_pack_invocations():
+    invocations = [
+        Invocation(id="0", method=MailboxQuery()),
+        Invocation(id="1", method=MailboxGet(ids=Ref("/ids"))),
+        Invocation(id="2", method=CoreEcho(data={})),
+        Invocation(id="3", method=MailboxQuery()),
+        Invocation(id="4", method=MailboxGet(ids=Ref("/ids"))),
+    ]
+    assert [[i.id for i in chunk] for chunk in pack_invocations(invocations, 3)] == [
+        ["0", "1", "2"],
+        ["3", "4"],
+    ]
+    assert [[i.id for i in chunk] for chunk in pack_invocations(invocations, 2)] == [
+        ["0", "1"],
+        ["2"],
+        ["3", "4"],
+    ]
+    with pytest.raises(ValueError):
+        pack_invocations(invocations, 1)
+
+
+def test_pack_invocations_references():
+    invocations = [
+        Invocation(id="0", method=MailboxQuery()),
+        Invocation(id="1", method=CoreEcho(data={})),
+        Invocation(
+            id="2",
+            method=MailboxGet(
+                ids=ResultReference(name="Mailbox/query", path="/ids", result_of="0")
+            ),
+        ),
+        Invocation(id="3", method=MailboxQuery()),
+        Invocation(id="4", method=MailboxGet(ids=Ref("/ids", method="3"))),
+        Invocation(id="5", method=CoreEcho(data={})),
+        # Positions are resolved within the request, so call 5 is kept in between
+        Invocation(id="6", method=MailboxGet(ids=Ref("/ids", method=-3))),
+    ]
+    assert [[i.id for i in chunk] for chunk in pack_invocations(invocations, 4)] == [
+        ["0", "2", "1"],
+        ["3", "4", "5", "6"],
+    ]
+    with pytest.raises(ValueError, match="4 chained method calls starting with 3"):
+        pack_invocations(invocations, 3)
+
+
+def test_uses_reference():
+    assert uses_reference(MailboxGet(ids=Ref("/ids")))
+    assert uses_reference(
+        MailboxQuery(filter=MailboxQueryFilterCondition(parent_id=Ref("/ids/0")))
+    )
+    assert not uses_reference(MailboxGet(ids=["MBX1"]))
+    assert not uses_reference(CoreEcho(data={"a": [1, {"b": 2}]}))
@@ -0,0 +1,134 @@
+import queue
+import socket
+import threading
+
+import pytest
+
+from jmaplib import Event, StateChange, TypeState, broker
+from jmaplib.broker import BrokerRunningError, EventBroker, broker_events
+
+_END = None
+
+
+def make_event(event_id, email_state):
+    return Event(
+        id=event_id,
+        data=StateChange(changed={"u1138": TypeState(email=email_state)}),
+    )
+
+
+@pytest.fixture
+def upstream():
+    events = queue.Queue()
+
+    def _events():
+        while (event := events.get()) is not _END:
+            yield event
+
+    return events, _events()
+
+
+@pytest.fixture
+def socket_path(tmp_path):
+    return str(tmp_path / "events.sock")
+
+
+def wait_for_subscribers(event_broker, count):
+    for _ in range(500):
+        if event_broker.subscribers == count:
+            return
+        threading.Event().wait(0.01)
+    raise AssertionError(f"{event_broker.subscribers} subscribers connected")
+
+
+def test_broker_broadcast(upstream, socket_path):
+    events, stream = upstream
+    with EventBroker(socket_path, events=stream) as event_broker:
+        subscribers = [broker_events(socket_path, reconnect=False) for _ in range(2)]
+        results = [[] for _ in subscribers]
+        threads = [
+            threading.Thread(target=lambda s=s, r=r: r.extend(s))
+            for s, r in zip(subscribers, results)
+        ]
+        for thread in threads:
+            thread.start()
+        wait_for_subscribers(event_broker, 2)
+        expected = [make_event("1", "10"), make_event("2", "11")]
+        for event in expected:
+            events.put(event)
+        # The subscribers' streams end once the upstream stream ended
+        events.put(_END)
+        for thread in threads:
+            thread.join(timeout=5)
+        assert results == [expected, expected]
+
+
+def test_broker_late_subscriber(upstream, socket_path):
+    events, stream = upstream
+    with EventBroker(socket_path, events=stream) as event_broker:
+        first = broker_events(socket_path, reconnect=False)
+        events.put(make_event("1", "10"))
+        assert next(first) == make_event("1", "10")
+        # New subscribers start with the last event
+        second = broker_events(socket_path, reconnect=False)
+        assert next(second) == make_event("1", "10")
+        wait_for_subscribers(event_broker, 2)
+        events.put(make_event("2", "11"))
+        assert next(first) == next(second) == make_event("2", "11")
+
+
+def test_broker_events_reconnect(monkeypatch, upstream, socket_path):
+    events, stream = upstream
+    event_broker = EventBroker(socket_path, events=stream)
+    sleeps = []
+
+    def _sleep(delay):
+        sleeps.append(delay)
+        if len(sleeps) == 2:
+            event_broker.start()
+
+    monkeypatch.setattr(broker.time, "sleep", _sleep)
+    subscriber = broker_events(socket_path)
+    events.put(make_event("1", "10"))
+    # The broker isn't running for the first two attempts
+    assert next(subscriber) == make_event("1", "10")
+    assert sleeps == [broker.RECONNECT_DELAY, broker.RECONNECT_DELAY * 2]
+    event_broker.close()
+
+
+def test_broker_requires_events(socket_path):
+    with pytest.raises(ValueError, match="client or events"):
+        EventBroker(socket_path)
+
+
+def test_broker_single_owner(upstream, socket_path):
+    events, stream = upstream
+    with EventBroker(socket_path, events=stream):
+        subscriber = broker_events(socket_path, reconnect=False)
+        with pytest.raises(BrokerRunningError):
+            EventBroker(socket_path, events=iter([])).listen()
+        # The running broker keeps its socket and subscribers
+        events.put(make_event("1", "10"))
+        assert next(subscriber) == make_event("1", "10")
+    # Once it closed, another broker can take over
+    with EventBroker(socket_path, events=iter([])) as event_broker:
+        assert event_broker.subscribers == 0
+
+
+def test_broker_stale_socket(socket_path, tmp_path):
+    # A socket left behind by a broker that didn't close is replaced
+    stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    stale.bind(socket_path)
+    stale.close()
+    event_broker = EventBroker(socket_path, events=iter([]))
+    event_broker.listen()
+    event_broker.close()
+    # Other files are never removed
+    path = tmp_path / "events.txt"
+    path.write_text("Mr. Saturn")
+    with pytest.raises(FileExistsError):
+        EventBroker(str(path), events=iter([])).listen()
+    assert path.read_text() == "Mr. Saturn"
+    # The failed broker released the lock
+    with pytest.raises(FileExistsError):
+        EventBroker(str(path), events=iter([])).listen()
@@ -0,0 +1,144 @@
+import json
+
+import pytest
+import responses
+
+from jmaplib import ClientError, EmailQueryFilterCondition, SetError
+from jmaplib.bulk import copy_emails, parse_emails
+from jmaplib.methods import EmailParse
+from tests.fake_server import FakeJMAPServer, FakeMailAccount, MethodError
+
+
+@pytest.fixture
+def jmap(http_responses):
+    jmap = FakeJMAPServer(http_responses)
+    account = FakeMailAccount(jmap)
+    for i in range(5):
+        account.add_email(f"M{i}", "MB1" if i < 4 else "MB2")
+
+    def _copy(arguments):
+        if arguments["fromAccountId"] != "u2187":
+            raise MethodError("fromAccountNotFound")
+        created, not_created = {}, {}
+        for creation_id, email in arguments["create"].items():
+            if email["id"] == "M2":
+                not_created[creation_id] = {"type": "alreadyExists"}
+            else:
+                created[creation_id] = {"id": f"C{email['id']}"}
+        return {
+            "accountId": arguments["accountId"],
+            "fromAccountId": arguments["fromAccountId"],
+            "oldState": "1",
+            "newState": "2",
+            "created": created,
+            "notCreated": not_created or None,
+        }
+
+    jmap.on("Email/copy", _copy)
+    return jmap
+
+
+def test_copy_emails_by_filter(client, jmap):
+    result = copy_emails(
+        client,
+        "u2187",
+        EmailQueryFilterCondition(in_mailbox="MB1"),
+        mailbox_ids={"MB9": True},
+        keywords={"$seen": True},
+        chunk_size=3,
+    )
+    assert result.created == {"M0": "CM0", "M1": "CM1", "M3": "CM3"}
+    assert result.not_created == {"M2": SetError(type="alreadyExists")}
+    assert jmap.calls("Email/query")[0]["accountId"] == "u2187"
+    # Chunks are copied concurrently, so the calls may arrive in any order
+    copies = sorted(jmap.calls("Email/copy"), key=lambda c: sorted(c["create"]))
+    assert [sorted(c["create"]) for c in copies] == [["M0", "M1", "M2"], ["M3"]]
+    assert copies[0]["accountId"] == "u1138"
+    assert copies[0]["create"]["M0"] == {
+        "id": "M0",
+        "mailboxIds": {"MB9": True},
+        "keywords": {"$seen": True},
+    }
+    assert copies[0]["onSuccessDestroyOriginal"] is False
+
+
+def test_copy_emails_method_error(client, jmap):
+    with pytest.raises(ClientError):
+        copy_emails(client, "u1", ["M0"], mailbox_ids={"MB9": True})
+
+
+def test_move_emails(client, http_responses):
+    def _copy(request):
+        name, arguments, call_id = json.loads(request.body)["methodCalls"][0]
+        assert arguments["onSuccessDestroyOriginal"] is True
+        ids = [email["id"] for email in arguments["create"].values()]
+        copy_response = {
+            "accountId": "u1138",
+            "fromAccountId": "u2187",
+            "oldState": "1",
+            "newState": "2",
+            "created": {i: {"id": f"C{i}"} for i in ids},
+            "notCreated": None,
+        }
+        set_response = {
+            "accountId": "u2187",
+            "oldState": "1",
+            "newState": "2",
+            "created": None,
+            "updated": None,
+            "destroyed": [i for i in ids if i != "M1"],
+            "notDestroyed": {"M1": {"type": "forbidden"}} if "M1" in ids else None,
+        }
+        method_responses = [
+            [name, copy_response, call_id],
+            ["Email/set", set_response, call_id],
+        ]
+        return (
+            200,
+            {},
+            json.dumps(
+                {
+                    "methodResponses": method_responses,
+                    "sessionState": "test;session;state",
+                }
+            ),
+        )
+
+    http_responses.add_callback(
+        responses.POST, "https://jmap-api.localhost/api", callback=_copy
+    )
+    result = copy_emails(
+        client,
+        "u2187",
+        (f"M{i}" for i in range(3)),
+        mailbox_ids={"MB9": True},
+        on_success_destroy_original=True,
+        chunk_size=2,
+    )
+    assert result.created == {"M0": "CM0", "M1": "CM1", "M2": "CM2"}
+    assert sorted(result.destroyed) == ["M0", "M2"]
+    assert result.not_destroyed == {"M1": SetError(type="forbidden")}
+
+
+def test_parse_emails(client, jmap):
+    def _parse(arguments):
+        blob_ids = arguments["blobIds"]
+        return {
+            "accountId": arguments["accountId"],
+            "parsed": {b: {"subject": f"Message {b}"} for b in blob_ids if b != "B7"},
+            "notParsable": [b for b in blob_ids if b == "B7"],
+            "notFound": None,
+        }
+
+    jmap.on("Email/parse", _parse)
+    blob_ids = [f"B{i}" for i in range(1200)]
+    result = parse_emails(client, EmailParse(blob_ids=blob_ids, properties=["subject"]))
+    assert len(result.parsed) == 1199
+    assert result.parsed["B1199"].subject == "Message B1199"
+    assert result.not_parsable == ["B7"]
+    assert result.not_found == []
+    # 500 blobs per call, all calls in one request
+    calls = jmap.calls("Email/parse")
+    assert [len(c["blobIds"]) for c in calls] == [500, 500, 200]
+    assert {tuple(c["properties"]) for c in calls} == {("subject",)}
+    assert jmap.api_requests == 1
@@ -0,0 +1,140 @@
+import pytest
+
+from jmaplib import ClientError, Mailbox
+from jmaplib.changes import CannotCalculateChangesError, ChangesPage, iter_changes
+from jmaplib.methods import EmailChanges, EmailGet, MailboxChanges
+from tests.fake_server import FakeJMAPServer, MethodError
+
+
+class FakeChanges:
+    """Serves a linear history of changes, one id per state."""
+
+    def __init__(self, server, object_type="Email", count=10, max_changes=None):
+        self.count = count
+        self.max_changes = max_changes
+        server.on(f"{object_type}/changes", self.changes)
+        server.on(f"{object_type}/get", self.get)
+
+    def changes(self, arguments):
+        since = int(arguments["sinceState"])
+        if since < 0:
+            raise MethodError("cannotCalculateChanges")
+        max_changes = arguments.get("maxChanges") or self.count
+        if self.max_changes:
+            max_changes = min(max_changes, self.max_changes)
+        new_state = min(since + max_changes, self.count)
+        ids = [f"X{i:02}" for i in range(since, new_state)]
+        return {
+            "accountId": "u1138",
+            "oldState": str(since),
+            "newState": str(new_state),
+            "hasMoreChanges": new_state < self.count,
+            "created": [i for i in ids if int(i[1:]) % 3 == 0],
+            "updated": [i for i in ids if int(i[1:]) % 3 == 1],
+            "destroyed": [i for i in ids if int(i[1:]) % 3 == 2],
+        }
+
+    def get(self, arguments):
+        return {
+            "accountId": "u1138",
+            "list": [
+                {"id": i, "name": f"Name {i}"} for i in reversed(arguments["ids"])
+            ],
+            "notFound": [],
+            "state": "s1",
+        }
+
+
+@pytest.fixture
+def server(http_responses):
+    return FakeJMAPServer(http_responses)
+
+
+def test_iter_changes(client, server):
+    FakeChanges(server, object_type="Mailbox", count=5)
+    pages = client.iter_changes(MailboxChanges(since_state="0", max_changes=3))
+    assert list(pages) == [
+        ChangesPage(
+            old_state="0",
+            new_state="3",
+            has_more_changes=True,
+            created=[Mailbox(id="X00", name="Name X00")],
+            updated=[Mailbox(id="X01", name="Name X01")],
+            destroyed=["X02"],
+        ),
+        ChangesPage(
+            old_state="3",
+            new_state="5",
+            has_more_changes=False,
+            created=[Mailbox(id="X03", name="Name X03")],
+            updated=[Mailbox(id="X04", name="Name X04")],
+            destroyed=[],
+        ),
+    ]
+    assert server.api_requests == 2
+    assert [name for name, _ in server.method_calls[:3]] == [
+        "Mailbox/changes",
+        "Mailbox/get",
+        "Mailbox/get",
+    ]
+    assert [g["ids"] for g in server.calls("Mailbox/get")] == [
+        ["X00"],
+        ["X01"],
+        ["X03"],
+        ["X04"],
+    ]
+
+
+def test_iter_changes_final_state(client, server):
+    FakeChanges(server, count=7, max_changes=2)
+    pages = iter_changes(client, EmailChanges(since_state="1"), fetch=False)
+    final = {}
+
+    def _collect():
+        final["state"] = yield from pages
+
+    seen = list(_collect())
+    assert final["state"] == "7"
+    assert [p.new_state for p in seen] == ["3", "5", "7"]
+    assert seen[0].created == []
+    assert seen[0].updated == ["X01"]
+    assert seen[0].destroyed == ["X02"]
+    assert not server.calls("Email/get")
+
+
+def test_iter_changes_get_properties(client, server):
+    FakeChanges(server, count=2)
+    pages = list(
+        client.iter_changes(
+            EmailChanges(since_state="0"), get=EmailGet(ids=None, properties=["id"])
+        )
+    )
+    assert len(pages) == 1
+    assert all(g["properties"] == ["id"] for g in server.calls("Email/get"))
+
+
+def test_iter_changes_max_objects_in_get(client, server):
+    FakeChanges(server, count=10)
+    list(client.iter_changes(EmailChanges(since_state="0", max_changes=10000)))
+    # maxChanges is capped at maxObjectsInGet for every page
+    max_objects = client.jmap_session.capabilities.core.max_objects_in_get
+    assert {c["maxChanges"] for c in server.calls("Email/changes")} == {max_objects}
+
+
+def test_iter_changes_cannot_calculate(client, server):
+    FakeChanges(server)
+    with pytest.raises(CannotCalculateChangesError) as e:
+        list(client.iter_changes(EmailChanges(since_state="-1")))
+    assert str(e.value) == 'Cannot calculate changes since state "-1"'
+
+
+def test_iter_changes_error(client, server):
+    FakeChanges(server)
+
+    def _fail(arguments):
+        raise MethodError("forbidden")
+
+    server.on("Email/get", _fail)
+    with pytest.raises(ClientError) as e:
+        list(client.iter_changes(EmailChanges(since_state="0")))
+    assert str(e.value) == 'Method call 1.Email/get failed with "forbidden"'
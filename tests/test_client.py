@@ -374,6 +374,48 @@ def test_client_request_single_with_multiple_responses_error(
     ]
 
 
+def test_client_request_multiple_accounts(client, http_responses, caplog):
+    session_response = make_session_response()
+    session_response["accounts"] = {
+        "u1138": {"name": "ness@onett.example.net", "isPersonal": True},
+        "u2000": {"name": "shared@onett.example.net", "isPersonal": False},
+    }
+    http_responses.replace(
+        responses.GET,
+        "https://jmap-example.localhost/.well-known/jmap",
+        body=json.dumps(session_response),
+    )
+    shared_get = MailboxGet(ids=None, account_id="u2000")
+    expected_request = {
+        "methodCalls": [
+            ["Mailbox/get", {"accountId": "u1138"}, "0.Mailbox/get"],
+            ["Mailbox/get", {"accountId": "u2000"}, "1.Mailbox/get"],
+            ["Mailbox/get", {"accountId": "u3000"}, "2.Mailbox/get"],
+        ],
+        "using": ["urn:ietf:params:jmap:core", "urn:ietf:params:jmap:mail"],
+    }
+    response = {
+        "methodResponses": [
+            [
+                "Mailbox/get",
+                {"accountId": account_id, "list": [], "notFound": [], "state": "1"},
+                f"{i}.Mailbox/get",
+            ]
+            for i, account_id in enumerate(["u1138", "u2000", "u3000"])
+        ],
+    }
+    expect_jmap_call(http_responses, expected_request, response)
+    default_get = MailboxGet(ids=None)
+    results = client.request(
+        [default_get, shared_get, MailboxGet(ids=None, account_id="u3000")]
+    )
+    assert [r.response.account_id for r in results] == ["u1138", "u2000", "u3000"]
+    # The default account isn't stored in the method
+    assert default_get.account_id is None
+    assert client.jmap_session.accounts["u2000"].is_personal is False
+    assert "Accounts in request are not in session accounts: u3000" in caplog.text
+
+
 def test_client_invalid_single_response_argument(client):
     with pytest.raises(ValueError):
         client.request(
@@ -0,0 +1,140 @@
+import json
+
+import pytest
+import responses
+
+from jmaplib import ClientError, Mailbox
+from jmaplib.coalesce import RequestCoalescer, slice_get_response
+from jmaplib.errors import AccountNotFound
+from jmaplib.methods import (
+    CoreEcho,
+    CoreEchoResponse,
+    MailboxGet,
+    MailboxGetResponse,
+    ThreadGet,
+)
+from tests.data import make_session_response
+
+
+@pytest.fixture
+def mailbox_get_calls(http_responses_base):
+    session_response = make_session_response()
+    session_response["capabilities"]["urn:ietf:params:jmap:core"]["maxObjectsInGet"] = 3
+    http_responses_base.add(
+        method=responses.GET,
+        url="https://jmap-example.localhost/.well-known/jmap",
+        body=json.dumps(session_response),
+    )
+    method_calls = []
+
+    def _callback(request):
+        method_responses = []
+        for name, arguments, call_id in json.loads(request.body)["methodCalls"]:
+            method_calls.append([name, arguments, call_id])
+            if name == "Core/echo":
+                method_responses.append([name, arguments, call_id])
+                continue
+            if "MBXERR" in arguments["ids"]:
+                method_responses.append(["error", {"type": "accountNotFound"}, call_id])
+                continue
+            found = [i for i in arguments["ids"] if i != "MBX404"]
+            method_responses.append(
+                [
+                    name,
+                    {
+                        "accountId": "u1138",
+                        "list": [{"id": i, "name": f"Mailbox {i}"} for i in found],
+                        "notFound": [i for i in arguments["ids"] if i not in found],
+                        "state": "2000",
+                    },
+                    call_id,
+                ]
+            )
+        return (
+            200,
+            {},
+            json.dumps(
+                {
+                    "methodResponses": method_responses,
+                    "sessionState": "test;session;state",
+                }
+            ),
+        )
+
+    http_responses_base.add_callback(
+        method=responses.POST,
+        url="https://jmap-api.localhost/api",
+        callback=_callback,
+    )
+    return method_calls
+
+
+def test_coalesce_get_calls(client, mailbox_get_calls):
+    coalescer = RequestCoalescer(client, window=60)
+    first = coalescer.submit(MailboxGet(ids=["MBX1"]))
+    second = coalescer.submit(MailboxGet(ids=["MBX2", "MBX1", "MBX404"]))
+    third = coalescer.submit(MailboxGet(ids=["MBX3", "MBX4"]))
+    other_properties = coalescer.submit(MailboxGet(ids=["MBX1"], properties=["name"]))
+    assert not first.done()
+    coalescer.flush()
+    assert first.result() == MailboxGetResponse(
+        account_id="u1138",
+        data=[Mailbox(id="MBX1", name="Mailbox MBX1")],
+        not_found=[],
+        state="2000",
+    )
+    assert [m.id for m in second.result().data] == ["MBX2", "MBX1"]
+    assert second.result().not_found == ["MBX404"]
+    assert [m.id for m in third.result().data] == ["MBX3", "MBX4"]
+    assert [m.id for m in other_properties.result().data] == ["MBX1"]
+    assert [(c[0], c[1]["ids"]) for c in mailbox_get_calls] == [
+        ("Mailbox/get", ["MBX1", "MBX2", "MBX404"]),
+        ("Mailbox/get", ["MBX3", "MBX4"]),
+        ("Mailbox/get", ["MBX1"]),
+    ]
+    assert mailbox_get_calls[2][1]["properties"] == ["name"]
+
+
+def test_coalesce_window(client, mailbox_get_calls):
+    with RequestCoalescer(client, window=0.01) as coalescer:
+        response = coalescer.request(MailboxGet(ids=["MBX1"]), raise_errors=True)
+    assert [m.id for m in response.data] == ["MBX1"]
+
+
+def test_coalesce_passthrough(client, mailbox_get_calls):
+    coalescer = RequestCoalescer(client, window=60)
+    assert coalescer.coalesce_key(MailboxGet(ids=None)) is None
+    assert coalescer.coalesce_key(CoreEcho(data={})) is None
+    assert coalescer.request(CoreEcho(data={"who": "Ness"})) == CoreEchoResponse(
+        data={"who": "Ness"}
+    )
+
+
+def test_coalesce_error(client, mailbox_get_calls):
+    coalescer = RequestCoalescer(client, window=60)
+    first = coalescer.submit(MailboxGet(ids=["MBX1"]))
+    second = coalescer.submit(MailboxGet(ids=["MBXERR"]))
+    coalescer.flush()
+    assert first.result() == AccountNotFound()
+    assert second.result() == AccountNotFound()
+
+
+def test_coalesce_raise_errors(client, mailbox_get_calls):
+    with RequestCoalescer(client, window=0) as coalescer, pytest.raises(ClientError):
+        coalescer.request(MailboxGet(ids=["MBXERR"]), raise_errors=True)
+
+
+def test_coalesce_http_error(client, http_responses):
+    http_responses.add(
+        method=responses.POST,
+        url="https://jmap-api.localhost/api",
+        status=500,
+    )
+    coalescer = RequestCoalescer(client, window=60)
+    future = coalescer.submit(ThreadGet(ids=["T1"]))
+    coalescer.flush()
+    assert future.exception().response.status_code == 500
+
+
+def test_slice_get_response_error():
+    assert slice_get_response([AccountNotFound()], ["MBX1"]) == AccountNotFound()
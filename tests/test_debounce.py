@@ -0,0 +1,107 @@
+import time
+
+import pytest
+
+from jmaplib import Event, StateChange, TypeState
+from jmaplib.debounce import EventDebouncer, merge_state_changes
+
+
+def state_change(**accounts):
+    return StateChange(
+        changed={a: TypeState(**states) for a, states in accounts.items()},
+        type="StateChange",
+    )
+
+
+def timed_events(*items):
+    for delay, event in items:
+        time.sleep(delay)
+        yield event
+
+
+def test_debounce_burst():
+    events = [
+        state_change(u1138={"email": str(i), "thread": str(i // 2)}) for i in range(50)
+    ]
+    debouncer = EventDebouncer(events, window=0.1)
+    assert list(debouncer) == [state_change(u1138={"email": "49", "thread": "24"})]
+    assert debouncer.stats.received == 50
+    assert debouncer.stats.merged == 49
+    assert debouncer.stats.emitted == 1
+
+
+def test_debounce_accounts_and_events():
+    events = [
+        Event(id="1", data=state_change(u1138={"email": "1"})),
+        state_change(u2000={"mailbox": "5"}),
+        state_change(u1138={"mailbox": "2"}),
+    ]
+    assert list(EventDebouncer(events, window=0.1)) == [
+        state_change(u1138={"email": "1", "mailbox": "2"}, u2000={"mailbox": "5"})
+    ]
+
+
+def test_debounce_window():
+    events = timed_events(
+        (0, state_change(u1138={"email": "1"})),
+        (0.3, state_change(u1138={"email": "2"})),
+    )
+    assert list(EventDebouncer(events, window=0.1)) == [
+        state_change(u1138={"email": "1"}),
+        state_change(u1138={"email": "2"}),
+    ]
+
+
+def test_debounce_max_latency():
+    events = timed_events(
+        *[(0.02, state_change(u1138={"email": str(i)})) for i in range(20)]
+    )
+    debouncer = EventDebouncer(events, window=0.1, max_latency=0.15)
+    results = list(debouncer)
+    # The window is never reached, but latency is bounded
+    assert len(results) > 1
+    assert results[-1] == state_change(u1138={"email": "19"})
+    assert debouncer.stats.emitted == len(results)
+
+
+def test_debounce_max_latency_backlog():
+    events = [state_change(u1138={"email": str(i)}) for i in range(100)]
+    debouncer = EventDebouncer(events, window=10, max_latency=0)
+    # Queued events are not merged past the maximum latency
+    assert list(debouncer) == events
+    assert debouncer.stats.merged == 0
+
+
+def test_debounce_drops_known_states():
+    events = timed_events(
+        (0, state_change(u1138={"email": "1", "thread": "1"})),
+        (0.2, state_change(u1138={"email": "1", "thread": "1"})),
+        (0, state_change(u1138={"email": "1", "thread": "2"})),
+    )
+    debouncer = EventDebouncer(events, window=0.1)
+    assert list(debouncer) == [
+        state_change(u1138={"email": "1", "thread": "1"}),
+        state_change(u1138={"thread": "2"}),
+    ]
+    assert debouncer.stats.dropped == 1
+
+
+def test_debounce_error():
+    def _events():
+        yield state_change(u1138={"email": "1"})
+        raise ConnectionError("stream closed")
+
+    debouncer = iter(EventDebouncer(_events(), window=0.1))
+    assert next(debouncer) == state_change(u1138={"email": "1"})
+    with pytest.raises(ConnectionError):
+        next(debouncer)
+
+
+def test_merge_state_changes():
+    assert merge_state_changes(
+        state_change(u1138={"email": "1", "mailbox": "1"}),
+        state_change(u1138={"email": "2"}, u2000={"thread": "7"}),
+    ) == state_change(
+        u1138={"email": "2", "mailbox": "1"},
+        u2000={"thread": "7"},
+    )
@@ -0,0 +1,104 @@
+import pytest
+
+from jmaplib import Delivered, Displayed, StateChange, TypeState
+from jmaplib.delivery import DeliveryTracker
+from tests.fake_server import FakeJMAPServer, FakeMailAccount
+
+
+@pytest.fixture
+def server(http_responses):
+    return FakeJMAPServer(http_responses)
+
+
+@pytest.fixture
+def account(server):
+    account = FakeMailAccount(server)
+    add_submission(account, "S1", "M1", delivered="queued")
+    return account
+
+
+def add_submission(account, id_, email_id, delivered="queued", displayed="unknown"):
+    account.set(
+        "EmailSubmission",
+        {
+            "id": id_,
+            "emailId": email_id,
+            "threadId": f"T{email_id}",
+            "deliveryStatus": {
+                "paula@twoson.example.net": {
+                    "smtpReply": "250 2.0.0 OK",
+                    "delivered": delivered,
+                    "displayed": displayed,
+                }
+            },
+        },
+    )
+
+
+def state_change(**states):
+    return StateChange(changed={"u1138": TypeState(**states)}, type="StateChange")
+
+
+def test_delivery_tracker(client, server, account):
+    delivered, displayed = [], []
+    tracker = DeliveryTracker(client, state="0")
+    tracker.on_delivered(lambda s, r, status: delivered.append((s.id, status)))
+    tracker.on_displayed(lambda s, r, status: displayed.append((s.id, r)))
+    tracker.handle(state_change(email_submission=account.state("EmailSubmission")))
+    assert [s.id for s in tracker.for_email("M1")] == ["S1"]
+    assert not delivered
+    add_submission(account, "S2", "M2", delivered="yes")
+    add_submission(account, "S1", "M1", delivered="yes", displayed="yes")
+    tracker.handle(state_change(email_submission=account.state("EmailSubmission")))
+    assert [(i, s.delivered) for i, s in delivered] == [
+        ("S2", Delivered.YES),
+        ("S1", Delivered.YES),
+    ]
+    assert displayed == [("S1", "paula@twoson.example.net")]
+    assert tracker.state == "3"
+    statuses = tracker.for_thread("TM2")[0].delivery_status
+    assert statuses["paula@twoson.example.net"].displayed == Displayed.UNKNOWN
+    # Only changed submissions are fetched
+    gets = server.calls("EmailSubmission/get")
+    assert [c["ids"] for c in gets[-2:]] == [["S2"], ["S1"]]
+    # Events with a known state and other types are ignored
+    tracker.handle(state_change(email_submission="3", email="10"))
+    assert len(server.calls("EmailSubmission/changes")) == 2
+    account.destroy("EmailSubmission", "S2")
+    tracker.update()
+    assert tracker.for_email("M2") == []
+    assert "TM2" not in tracker.by_thread_id
+
+
+def test_delivery_tracker_email_delivery(client, server, account):
+    tracker = DeliveryTracker(client, on_email_delivery=True)
+    tracker.handle(state_change(email_delivery="d1"))
+    # Without a state, the tracker starts from the current state
+    assert tracker.state == "1"
+    assert tracker.submissions == {}
+    add_submission(account, "S2", "M2")
+    tracker.handle(state_change(email_delivery="d2"))
+    assert list(tracker.submissions) == ["S2"]
+
+
+def test_delivery_tracker_reload(client, server, account):
+    delivered = []
+    tracker = DeliveryTracker(client, state="0")
+    tracker.on_delivered(lambda s, r, status: delivered.append(s.id))
+    tracker.update()
+    for i in (1, 2, 3):
+        add_submission(account, f"S{i}", f"M{i}", delivered="no")
+    tracker.update()
+    assert sorted(delivered) == ["S1", "S2", "S3"]
+    account.destroy("EmailSubmission", "S2")
+    add_submission(account, "S1", "M1", delivered="yes")
+    account.min_state["EmailSubmission"] = 6
+    client.jmap_session.capabilities.core.max_objects_in_get = 2
+    tracker.update()
+    assert delivered[3:] == ["S1"]
+    # The tracked submissions are fetched in chunks of maxObjectsInGet
+    gets = server.calls("EmailSubmission/get")[-2:]
+    assert [len(c["ids"]) for c in gets] == [2, 1]
+    assert sorted(i for c in gets for i in c["ids"]) == ["S1", "S2", "S3"]
+    assert sorted(tracker.submissions) == ["S1", "S3"]
+    assert tracker.state == "6"
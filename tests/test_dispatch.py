@@ -0,0 +1,96 @@
+import threading
+
+import pytest
+
+from jmaplib import Event, StateChange, TypeState
+from jmaplib.dispatch import EventDispatcher
+
+
+def state_change(**accounts):
+    return StateChange(
+        changed={a: TypeState(**states) for a, states in accounts.items()},
+        type="StateChange",
+    )
+
+
+@pytest.fixture
+def dispatcher():
+    with EventDispatcher(max_workers=2) as dispatcher:
+        yield dispatcher
+
+
+def test_dispatch_filters(dispatcher):
+    received = {"all": [], "email": [], "u2000": []}
+    dispatcher.subscribe(received["all"].append)
+    dispatcher.subscribe(received["email"].append, account_id="u1138", types=["Email"])
+    dispatcher.subscribe(received["u2000"].append, account_id="u2000")
+    submissions = []
+    dispatcher.subscribe(submissions.append, types=["EmailSubmission"])
+    event = state_change(u1138={"email": "1", "mailbox": "2"}, u2000={"thread": "3"})
+    sent = state_change(u1138={"mailbox": "4", "email_submission": "5"})
+    dispatcher.run([Event(id="1", data=event), sent])
+    dispatcher.close()
+    assert received["all"] == [event, sent]
+    assert received["email"] == [state_change(u1138={"email": "1"})]
+    assert received["u2000"] == [state_change(u2000={"thread": "3"})]
+    assert submissions == [state_change(u1138={"email_submission": "5"})]
+
+
+def test_dispatch_slow_subscriber(dispatcher):
+    release = threading.Event()
+    slow, fast = [], []
+
+    def _slow(state_change):
+        release.wait(timeout=5)
+        slow.append(state_change)
+
+    slow_subscription = dispatcher.subscribe(_slow)
+    events = [state_change(u1138={"email": str(i)}) for i in range(10)]
+    fast_done = threading.Event()
+
+    def _fast(state_change):
+        fast.append(state_change)
+        if state_change == events[-1]:
+            fast_done.set()
+
+    dispatcher.subscribe(_fast)
+    for event in events:
+        dispatcher.dispatch(event)
+    # The fast subscriber doesn't wait for the slow one
+    assert fast_done.wait(timeout=5)
+    assert not slow
+    release.set()
+    dispatcher.close()
+    # Changes that arrived while busy are merged into one delivery
+    assert slow == [events[0], events[-1]]
+    assert slow_subscription.stats.merged == 8
+    assert slow_subscription.stats.delivered == 2
+
+
+def test_dispatch_unsubscribe_and_errors(dispatcher):
+    received = []
+
+    def _fail(state_change):
+        raise RuntimeError("broken subscriber")
+
+    failing = dispatcher.subscribe(_fail)
+    subscription = dispatcher.subscribe(received.append)
+    dispatcher.dispatch(state_change(u1138={"email": "1"}))
+    subscription.cancel()
+    dispatcher.dispatch(state_change(u1138={"email": "2"}))
+    dispatcher.close()
+    assert received == [state_change(u1138={"email": "1"})]
+    assert failing.stats.failed == 2
+
+
+def test_dispatch_unknown_type(dispatcher):
+    with pytest.raises(ValueError, match="Unknown data types: Contact"):
+        dispatcher.subscribe(print, types=["Email", "Contact"])
+
+
+def test_dispatch_requires_events():
+    with (
+        EventDispatcher() as dispatcher,
+        pytest.raises(ValueError, match="client or events"),
+    ):
+        dispatcher.run()
@@ -1,38 +1,42 @@
 from __future__ import annotations
 
+import gzip
+import io
 import json
-from typing import TYPE_CHECKING
-
-if TYPE_CHECKING:
-    from collections.abc import Iterable
-from unittest import mock
 
 import pytest
+import requests
 import responses
-import sseclient
+import urllib3
 
-from jmaplib import Client, Event, EventSourceConfig, StateChange, TypeState
+from jmaplib import Client, Event, EventSourceConfig, StateChange, TypeState, sse
+from jmaplib.sse import ServerSentEvent, iter_lines, parse_events
 from tests.data import make_session_response
 
+EVENTS_URL = "https://jmap-api.localhost/events/*/no/0"
+
 
 @pytest.fixture
-def mock_sseclient():
-    mock_client = mock.MagicMock(
-        spec=sseclient.SSEClient,
-        __iter__=lambda self: self,
-        __next__=mock.MagicMock(side_effect=[None]),
+def sleeps(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(sse.time, "sleep", sleeps.append)
+    return sleeps
+
+
+def state_event(event_id, **states):
+    lines = [f"id: {event_id}"] if event_id else []
+    lines += ["event: state", f"data: {json.dumps({'changed': {'u1138': states}})}"]
+    return "\n".join(lines) + "\n\n"
+
+
+def add_stream(http_responses, body, url=EVENTS_URL, **kwargs):
+    http_responses.add(
+        method=responses.GET,
+        url=url,
+        body=body.encode() if isinstance(body, str) else body,
+        content_type="text/event-stream",
+        **kwargs,
     )
-    with mock.patch.object(
-        sseclient,
-        "SSEClient",
-        mock_client,
-    ):
-        assert isinstance(sseclient.SSEClient, mock.MagicMock)
-        sseclient.SSEClient.return_value.__iter__.side_effect = (
-            lambda: sseclient.SSEClient.return_value
-        )
-        sseclient.SSEClient.return_value.__next__.side_effect = []
-        yield mock_client
 
 
 @pytest.mark.parametrize(
@@ -66,7 +70,6 @@ def mock_sseclient():
     ],
 )
 def test_event_source_url(
-    mock_sseclient,
     event_source_url,
     expected_call_url,
     event_source_config,
@@ -84,60 +87,35 @@ def test_event_source_url(
             url="https://jmap-example.localhost/.well-known/jmap",
             body=json.dumps(session_response),
         )
-        with pytest.raises(StopIteration):
-            next(client.events)
-        mock_sseclient.assert_called_once_with(
-            expected_call_url,
-            auth=("ness", "pk_fire"),
-            last_id=None,
+        add_stream(resp_mock, state_event("1", Email="1"), url=expected_call_url)
+        assert next(client.events) == Event(
+            id="1", data=StateChange(changed={"u1138": TypeState(email="1")})
         )
+        request = resp_mock.calls[1].request
+        assert request.url == expected_call_url
+        assert request.headers["Accept"] == "text/event-stream"
+        assert request.headers["Authorization"].startswith("Basic ")
+        client.close_events()
 
 
-def test_event_source(
-    client,
-    mock_sseclient,
-    http_responses,
-):
-    mock_events = [
-        sseclient.Event(
-            id="8001",
-            event="state",
-            data=json.dumps({"changed": {"u1138": {"Email": "1001"}}}),
-        ),
-        sseclient.Event(
-            id="8001.5",
-            event="ping",
-            data="ignore-me",
-        ),
-        sseclient.Event(
-            id="8002",
-            event="state",
-            data=json.dumps(
-                {
-                    "changed": {
-                        "u1138": {
-                            "CalendarEvent": "1011",
-                            "Email": "1001",
-                            "EmailDelivery": "1003",
-                            "Mailbox": "1021",
-                            "Thread": "1020",
-                        }
-                    }
-                }
-            ),
-        ),
-        sseclient.Event(
-            id="",
-            event="ping",
-            data="also-ignore-me",
-        ),
-        sseclient.Event(
-            event="state",
-            data=json.dumps(
-                {"changed": {"u1138": {"Email": "2000", "Mailbox": "2222"}}}
-            ),
-        ),
-    ]
+def test_event_source(client, http_responses, sleeps):
+    add_stream(
+        http_responses,
+        state_event("8001", Email="1001")
+        + 'id: 8001.5\nevent: ping\ndata: {"interval": 0}\n\n'
+        + ": keepalive comment\n\n"
+        + state_event(
+            "8002",
+            CalendarEvent="1011",
+            Email="1001",
+            EmailDelivery="1003",
+            Mailbox="1021",
+            Thread="1020",
+        ).replace("\n", "\r\n")
+        + "event: ping\ndata: also-ignore-me\n\n"
+        + state_event(None, Email="2000", Mailbox="2222"),
+    )
+    add_stream(http_responses, "", status=401)
     expected_events = [
         Event(
             id="8001",
@@ -169,15 +147,144 @@ def test_event_source(
             ),
         ),
     ]
-    assert isinstance(sseclient.SSEClient, mock.MagicMock)
-    sseclient.SSEClient.return_value.__next__.side_effect = mock_events
     for expected_event in expected_events:
         event = next(client.events)
         assert event == expected_event
-    with pytest.raises(StopIteration):
+    # The stream ended, so it is resumed after the last event id
+    with pytest.raises(requests.HTTPError):
         next(client.events)
-    mock_sseclient.assert_called_once_with(
-        "https://jmap-api.localhost/events/*/no/0",
+    assert http_responses.calls[2].request.headers["Last-Event-ID"] == "8002"
+    assert sleeps == [sse.RECONNECT_DELAY]
+
+
+def test_iter_chunks_gzip():
+    response = requests.Response()
+    # Streamed responses are read without decoding by default, like requests does
+    response.raw = urllib3.HTTPResponse(
+        body=io.BytesIO(gzip.compress(state_event("1", Email="1").encode())),
+        headers={"Content-Encoding": "gzip"},
+        preload_content=False,
+        decode_content=False,
+    )
+    assert b"".join(sse._iter_chunks(response)) == state_event("1", Email="1").encode()
+
+
+def test_event_source_reconnect_backoff(client, http_responses, sleeps):
+    add_stream(http_responses, state_event("1", Email="1"))
+    add_stream(http_responses, requests.ConnectionError("connection reset"))
+    add_stream(http_responses, "", status=503)
+    add_stream(http_responses, "retry: 500\n" + state_event("2", Email="2"))
+    add_stream(http_responses, requests.ConnectionError("connection reset"))
+    add_stream(http_responses, state_event("3", Email="3"))
+    events = client.events
+    assert [next(events).id for _ in range(3)] == ["1", "2", "3"]
+    assert sleeps == [1.0, 2.0, 4.0, 0.5, 1.0]
+    assert [c.request.headers.get("Last-Event-ID") for c in http_responses.calls] == [
+        None,
+        None,
+        "1",
+        "1",
+        "1",
+        "2",
+        "2",
+    ]
+    client.close_events()
+
+
+def test_event_source_stream_errors(client, http_responses, sleeps, monkeypatch):
+    stream_errors = iter(
+        [
+            requests.exceptions.ChunkedEncodingError("truncated"),
+            urllib3.exceptions.ProtocolError("connection reset"),
+            urllib3.exceptions.ReadTimeoutError(None, EVENTS_URL, "read timed out"),
+        ]
+    )
+    iter_chunks = sse._iter_chunks
+
+    def _iter_chunks(response):
+        yield from iter_chunks(response)
+        error = next(stream_errors, None)
+        if error:
+            raise error
+
+    monkeypatch.setattr(sse, "_iter_chunks", _iter_chunks)
+    # A retry field without data still sets the reconnection time
+    add_stream(http_responses, "retry: 250\n\n" + state_event("1", Email="1"))
+    for i in (2, 3, 4):
+        add_stream(http_responses, state_event(str(i), Email=str(i)))
+    events = client.events
+    assert [next(events).id for _ in range(4)] == ["1", "2", "3", "4"]
+    assert sleeps == [0.25, 0.25, 0.25]
+    client.close_events()
+
+
+def test_event_source_closeafter_state(http_responses, sleeps):
+    client = Client(
+        host="jmap-example.localhost",
         auth=("ness", "pk_fire"),
-        last_id=None,
+        last_event_id="100",
+        event_source_config=EventSourceConfig(closeafter="state", ping=30),
+    )
+    session_response = make_session_response()
+    session_response["eventSourceUrl"] = (
+        "https://jmap-api.localhost/events/{types}/{closeafter}/{ping}"
     )
+    http_responses.replace(
+        responses.GET,
+        "https://jmap-example.localhost/.well-known/jmap",
+        body=json.dumps(session_response),
+    )
+    url = "https://jmap-api.localhost/events/*/state/30"
+    add_stream(http_responses, state_event("101", Email="1"), url=url)
+    add_stream(http_responses, state_event("102", Email="2"), url=url)
+    events = client.events
+    assert [next(events).id for _ in range(2)] == ["101", "102"]
+    # Streams closed after a state event are reconnected without delay
+    assert not sleeps
+    assert [
+        c.request.headers.get("Last-Event-ID") for c in http_responses.calls[1:]
+    ] == ["100", "101"]
+    assert all(
+        c.request.req_kwargs["timeout"] == (sse.CONNECT_TIMEOUT, 60)
+        for c in http_responses.calls[1:]
+    )
+    client.close_events()
+
+
+def test_event_source_reset_after_error(client, http_responses, sleeps):
+    add_stream(http_responses, "", status=403)
+    add_stream(http_responses, state_event("1", Email="1"))
+    with pytest.raises(requests.HTTPError):
+        next(client.events)
+    assert next(client.events).id == "1"
+    client.close_events()
+
+
+def test_iter_lines():
+    chunks = [b"data: a", b"b\r\n\r", b"\ndata: c\n", b"\n", b"tail"]
+    assert list(iter_lines(chunks)) == [b"data: ab", b"", b"data: c", b"", b"tail"]
+
+
+def test_parse_events():
+    lines = [
+        b": comment",
+        b"",
+        b"event: state",
+        b"data: first",
+        b"data:second",
+        b"id: 7",
+        b"retry: 1500",
+        b"",
+        b"data",
+        b"id: bad\0id",
+        b"unknown: field",
+        b"",
+        b"event: ignored-without-data",
+        b"",
+    ]
+    retries = []
+    assert list(parse_events([*lines, b"retry: 30", b""], retries.append)) == [
+        ServerSentEvent(event="state", data="first\nsecond", id="7", retry=1500),
+        ServerSentEvent(event="message", data=""),
+    ]
+    assert retries == [1500, 30]
@@ -0,0 +1,153 @@
+import json
+import mailbox
+import re
+from pathlib import Path
+
+import pytest
+import responses
+
+from jmaplib.exporter import EmailExporter
+from tests.fake_server import FakeJMAPServer, FakeMailAccount
+
+DOWNLOAD_URL = re.compile(r"https://jmap-api\.localhost/jmap/download/u1138/(\w+)/")
+
+
+def raw_message(i):
+    return (
+        f"Subject: Message {i}\r\nMessage-ID: <{i}@example.net>\r\n\r\n"
+        f"Body {i}\r\nFrom the start of a line\r\n"
+    ).encode()
+
+
+@pytest.fixture
+def jmap(http_responses):
+    return FakeJMAPServer(http_responses)
+
+
+@pytest.fixture
+def account(jmap, http_responses):
+    account = FakeMailAccount(jmap)
+    account.blobs = {}
+
+    def _download(request):
+        blob_id = DOWNLOAD_URL.match(request.url).group(1)
+        return 200, {}, account.blobs[blob_id]
+
+    http_responses.add_callback(responses.GET, DOWNLOAD_URL, callback=_download)
+    account.add_mailbox("MB1", "Inbox")
+    account.add_mailbox("MB2", "Lists", parentId="MB1")
+    for i, mailbox_id in enumerate(["MB1", "MB2", "MB1"]):
+        add_email(account, f"M{i}", mailbox_id)
+    return account
+
+
+def add_email(account, email_id, mailbox_id, **kwargs):
+    data = raw_message(email_id)
+    account.blobs[f"B{email_id}"] = data
+    kwargs.setdefault("size", len(data))
+    account.add_email(email_id, mailbox_id, blobId=f"B{email_id}", **kwargs)
+
+
+def test_export_mbox(client, account, tempdir):
+    stats = EmailExporter(
+        client, tempdir / "export", state_path=tempdir / "state.json"
+    ).run()
+    assert (stats.exported, stats.failed) == (3, 0)
+    inbox = mailbox.mbox(tempdir / "export" / "Inbox.mbox")
+    assert [m["Subject"] for m in inbox] == ["Message M0", "Message M2"]
+    assert inbox[0].get_payload() == "Body M0\n>From the start of a line\n"
+    lists = mailbox.mbox(tempdir / "export" / "Inbox" / "Lists.mbox")
+    assert [m["Subject"] for m in lists] == ["Message M1"]
+    assert json.loads((tempdir / "state.json").read_text()) == {"Email": "3"}
+    # Only new emails are appended by the next export
+    add_email(account, "M3", "MB2")
+    stats = EmailExporter(
+        client, tempdir / "export", state_path=tempdir / "state.json"
+    ).run()
+    assert stats.exported == 1
+    lists = mailbox.mbox(tempdir / "export" / "Inbox" / "Lists.mbox")
+    assert [m["Subject"] for m in lists] == ["Message M1", "Message M3"]
+
+
+def test_export_maildir_changes(client, account, tempdir):
+    def _export():
+        return EmailExporter(
+            client,
+            tempdir / "export",
+            format="maildir",
+            state_path=tempdir / "state.json",
+            workers=2,
+        ).run()
+
+    _export()
+    inbox = tempdir / "export" / "Inbox" / "cur"
+    assert sorted(p.name for p in inbox.iterdir()) == ["M0:2,", "M2:2,"]
+    account.set(
+        "Email",
+        {
+            **account.objects["Email"]["M0"],
+            "keywords": {"$seen": True, "$flagged": True},
+        },
+    )
+    account.destroy("Email", "M2")
+    add_email(account, "M3", "MB1")
+    stats = _export()
+    assert (stats.exported, stats.removed) == (2, 2)
+    assert sorted(p.name for p in inbox.iterdir()) == ["M0:2,FS", "M3:2,"]
+    assert (inbox / "M3:2,").read_bytes() == raw_message("M3")
+    assert list((tempdir / "export" / "Inbox" / "tmp").iterdir()) == []
+
+
+def test_export_size_mismatch(client, account, tempdir):
+    account.set("Email", {**account.objects["Email"]["M2"], "size": 1})
+    stats = EmailExporter(client, tempdir, format="maildir").run()
+    assert (stats.exported, stats.failed) == (2, 1)
+    assert sorted(p.name for p in (tempdir / "Inbox" / "cur").iterdir()) == ["M0:2,"]
+    assert list((tempdir / "Inbox" / "tmp").iterdir()) == []
+
+
+def test_export_cannot_calculate_changes(client, account, tempdir):
+    (tempdir / "state.json").write_text(json.dumps({"Email": "1"}))
+    account.min_state["Email"] = 2
+    stats = EmailExporter(
+        client, tempdir / "export", state_path=tempdir / "state.json"
+    ).run()
+    assert stats.exported == 3
+    assert json.loads((tempdir / "state.json").read_text()) == {"Email": "3"}
+
+
+def test_export_changes_while_exporting(client, jmap, account, tempdir):
+    query = jmap.handlers["Email/query"]
+
+    def _query(arguments):
+        if arguments["filter"]["inMailbox"] == "MB2" and "M3" not in account.blobs:
+            # Emails arrive in both mailboxes after the inbox was exported
+            add_email(account, "M3", "MB1")
+            add_email(account, "M4", "MB2")
+        return query(arguments)
+
+    jmap.on("Email/query", _query)
+    stats = EmailExporter(
+        client, tempdir / "export", state_path=tempdir / "state.json"
+    ).run()
+    assert stats.exported == 5
+    inbox = mailbox.mbox(tempdir / "export" / "Inbox.mbox")
+    assert [m["Subject"] for m in inbox] == [
+        "Message M0",
+        "Message M2",
+        "Message M3",
+    ]
+    lists = mailbox.mbox(tempdir / "export" / "Inbox" / "Lists.mbox")
+    assert [m["Subject"] for m in lists] == ["Message M1", "Message M4"]
+    assert json.loads((tempdir / "state.json").read_text()) == {"Email": "5"}
+
+
+def test_export_mailbox_path(client, account, tempdir):
+    account.add_mailbox("MB3", "..", parentId="MB1")
+    account.add_mailbox("MB4", "a/b")
+    exporter = EmailExporter(client, tempdir, format="maildir")
+    exporter.run()
+    mailboxes = exporter._mailboxes
+    assert exporter.mailbox_path(mailboxes["MB3"]) == Path("Inbox") / "__"
+    assert exporter.mailbox_path(mailboxes["MB4"]) == Path("a_b")
+    assert (tempdir / "Inbox" / "__" / "cur").is_dir()
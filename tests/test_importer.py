@@ -0,0 +1,163 @@
+import itertools
+import json
+import mailbox
+from datetime import datetime, timezone
+
+import pytest
+import responses
+
+from jmaplib.importer import (
+    EmailImporter,
+    ImportCheckpoint,
+    SourceMessage,
+    iter_messages,
+    parse_message,
+)
+from tests.fake_server import FakeJMAPServer
+
+UPLOAD_URL = "https://jmap-api.localhost/jmap/upload/u1138/"
+
+
+def make_message(i, **headers):
+    lines = [f"Subject: Message {i}", f"Message-ID: <{i}@example.net>"]
+    lines += [f"{name.replace('_', '-')}: {value}" for name, value in headers.items()]
+    return "\n".join([*lines, "", f"Body {i}", ""])
+
+
+@pytest.fixture
+def mbox_path(tempdir):
+    path = tempdir / "import.mbox"
+    mbox = mailbox.mbox(path)
+    for i in range(5):
+        mbox.add(make_message(i, Date="Tue, 01 Apr 2025 10:00:00 +0200"))
+    mbox.add(
+        make_message(
+            5, Status="RO", X_Status="DT", Date="Tue, 01 Apr 2025 10:00:00 +0200"
+        )
+    )
+    mbox.flush()
+    return path
+
+
+@pytest.fixture
+def jmap(http_responses):
+    jmap = FakeJMAPServer(http_responses)
+    blobs = {}
+    counter = itertools.count()
+
+    def _upload(request):
+        blob_id = f"B{next(counter)}"
+        blobs[blob_id] = request.body
+        body = {"accountId": "u1138", "blobId": blob_id, "type": "message/rfc822"}
+        return 200, {}, json.dumps({**body, "size": len(request.body)})
+
+    def _import(arguments):
+        created, not_created = {}, {}
+        for creation_id, email in arguments["emails"].items():
+            if b"Message 3" in blobs[email["blobId"]]:
+                not_created[creation_id] = {"type": "invalidEmail"}
+            else:
+                created[creation_id] = {"id": f"M{email['blobId']}"}
+        return {
+            "accountId": "u1138",
+            "oldState": "1",
+            "newState": "2",
+            "created": created,
+            "notCreated": not_created,
+        }
+
+    http_responses.add_callback(responses.POST, UPLOAD_URL, callback=_upload)
+    jmap.on("Email/import", _import)
+    jmap.blobs = blobs
+    return jmap
+
+
+def test_parse_message():
+    message = SourceMessage(
+        key="maildir:1",
+        data=make_message(1, Date="Tue, 01 Apr 2025 10:00:00 +0200").encode(),
+        flags="FS",
+    )
+    parsed = parse_message(message)
+    assert parsed.data.startswith(b"Subject: Message 1\r\nMessage-ID:")
+    assert parsed.data.endswith(b"\r\n\r\nBody 1\r\n")
+    assert parsed.received_at == datetime(2025, 4, 1, 8, tzinfo=timezone.utc)
+    assert parsed.keywords == {"$flagged": True, "$seen": True}
+
+
+def test_iter_maildir(tempdir):
+    maildir = mailbox.Maildir(tempdir / "Maildir")
+    message = mailbox.MaildirMessage(make_message(1))
+    message.set_flags("RS")
+    key = maildir.add(message)
+    new_key = maildir.add(make_message(2))
+    path = (tempdir / "Maildir").resolve()
+    assert sorted(iter_messages(tempdir / "Maildir"), key=lambda m: m.key) == sorted(
+        [
+            SourceMessage(
+                key=f"maildir:{path}:{key}", data=message.as_bytes(), flags="RS"
+            ),
+            SourceMessage(
+                key=f"maildir:{path}:{new_key}", data=make_message(2).encode()
+            ),
+        ],
+        key=lambda m: m.key,
+    )
+
+
+def test_iter_maildir_missing_subdir(tempdir):
+    (tempdir / "Maildir" / "cur").mkdir(parents=True)
+    (tempdir / "Maildir" / "cur" / "1.host:2,S").write_text(make_message(1))
+    path = (tempdir / "Maildir").resolve()
+    assert list(iter_messages(tempdir / "Maildir")) == [
+        SourceMessage(
+            key=f"maildir:{path}:1.host", data=make_message(1).encode(), flags="S"
+        )
+    ]
+
+
+@pytest.mark.parametrize("processes", [0, 2])
+def test_import_mbox(client, jmap, mbox_path, tempdir, processes):
+    progress = []
+    importer = EmailImporter(
+        client,
+        "MB1",
+        checkpoint=tempdir / "checkpoint",
+        processes=processes,
+        batch_size=2,
+        progress=lambda stats: progress.append(stats.imported),
+    )
+    stats = importer.run(mbox_path)
+    assert (stats.imported, stats.failed, stats.skipped) == (5, 1, 0)
+    assert progress == [2, 3, 5]
+    calls = jmap.calls("Email/import")
+    assert [len(c["emails"]) for c in calls] == [2, 2, 2]
+    assert calls[0]["emails"]["0"] == {
+        "blobId": calls[0]["emails"]["0"]["blobId"],
+        "mailboxIds": {"MB1": True},
+        "receivedAt": "2025-04-01T08:00:00Z",
+    }
+    # "D" marks a deleted message, not a draft
+    assert calls[2]["emails"]["1"]["keywords"] == {"$seen": True, "$draft": True}
+    assert all(b"\r\n" in blob for blob in jmap.blobs.values())
+    assert ImportCheckpoint(tempdir / "checkpoint").done == {
+        f"mbox:{mbox_path.resolve()}:{i}" for i in (0, 1, 2, 4, 5)
+    }
+
+
+def test_import_resume(client, jmap, mbox_path, tempdir):
+    checkpoint = ImportCheckpoint(tempdir / "checkpoint")
+    checkpoint.add([f"mbox:{mbox_path.resolve()}:{i}" for i in range(3)])
+    stats = EmailImporter(client, "MB1", checkpoint=checkpoint, processes=0).run(
+        mbox_path, limit=5
+    )
+    # Only the failed message and the one after it are left
+    assert (stats.imported, stats.failed, stats.skipped) == (1, 1, 3)
+    assert len(jmap.calls("Email/import")) == 1
+    assert f"mbox:{mbox_path.resolve()}:4" in checkpoint
+    # Messages of another mbox file are imported again
+    other = mbox_path.rename(tempdir / "other.mbox")
+    stats = EmailImporter(client, "MB1", checkpoint=checkpoint, processes=0).run(
+        other, limit=1
+    )
+    assert (stats.imported, stats.skipped) == (1, 0)
@@ -0,0 +1,99 @@
+import pytest
+
+from jmaplib import ClientError, EmailQueryFilterCondition
+from jmaplib.live_query import LiveQuery
+from jmaplib.methods import EmailQuery
+from tests.fake_server import FakeJMAPServer, FakeMailAccount, MethodError
+
+
+@pytest.fixture
+def server(http_responses):
+    return FakeJMAPServer(http_responses)
+
+
+@pytest.fixture
+def account(server):
+    account = FakeMailAccount(server)
+    for i in range(1, 6):
+        account.add_email(f"M{i}", "MB1")
+    account.add_email("M9", "MB2")
+    return account
+
+
+def inbox_query(**kwargs):
+    return EmailQuery(filter=EmailQueryFilterCondition(in_mailbox="MB1"), **kwargs)
+
+
+def test_live_query(client, server, account):
+    live = LiveQuery(client, inbox_query(limit=3, calculate_total=True))
+    assert live.refresh()
+    assert list(live) == ["M1", "M2", "M3"]
+    assert live.total == 5
+    account.add_email("M0", "MB1")
+    account.add_email("M8", "MB2")
+    account.destroy("Email", "M2")
+    assert live.refresh()
+    assert list(live) == ["M0", "M1", "M3"]
+    assert live.total == 5
+    assert live.query_state == account.state("Email")
+    changes = server.calls("Email/queryChanges")
+    assert changes == [
+        {
+            "accountId": "u1138",
+            "filter": {"inMailbox": "MB1"},
+            "sinceQueryState": "6",
+            "upToId": "M3",
+            "calculateTotal": True,
+        }
+    ]
+    assert not live.refresh()
+    assert len(server.calls("Email/query")) == 1
+
+
+def test_live_query_fill_window(client, server, account):
+    live = LiveQuery(client, inbox_query(limit=3))
+    live.load()
+    account.destroy("Email", "M1")
+    account.destroy("Email", "M3")
+    assert live.refresh()
+    # Ids that moved up into the window are queried from their position
+    assert list(live) == ["M2", "M4", "M5"]
+    fill = server.calls("Email/query")[-1]
+    assert (fill["position"], fill["limit"]) == (1, 2)
+
+
+def test_live_query_without_limit(client, server, account):
+    live = LiveQuery(client, inbox_query(), max_changes=10)
+    live.load()
+    account.add_email("M6", "MB1")
+    account.destroy("Email", "M1")
+    live.refresh()
+    assert list(live) == ["M2", "M3", "M4", "M5", "M6"]
+    assert "upToId" not in server.calls("Email/queryChanges")[0]
+
+
+def test_live_query_reload(client, server, account):
+    live = LiveQuery(client, inbox_query(limit=2), max_changes=1)
+    live.load()
+    account.add_email("M0", "MB1")
+    account.destroy("Email", "M1")
+    assert live.refresh()
+    assert list(live) == ["M0", "M2"]
+    account.destroy("Email", "M2")
+    account.min_state["Email"] = 20
+    live.refresh()
+    assert list(live) == ["M0", "M3"]
+    assert len(server.calls("Email/query")) == 3
+
+
+def test_live_query_errors(client, server, account):
+    def query_changes(arguments):
+        raise MethodError("unsupportedFilter")
+
+    with pytest.raises(ValueError, match="first result"):
+        LiveQuery(client, inbox_query(position=5))
+    live = LiveQuery(client, inbox_query())
+    live.load()
+    server.on("Email/queryChanges", query_changes)
+    with pytest.raises(ClientError, match="unsupportedFilter"):
+        live.refresh()
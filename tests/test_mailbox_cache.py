@@ -0,0 +1,84 @@
+import pytest
+
+from jmaplib.mailbox_cache import MailboxCache
+from tests.fake_server import FakeJMAPServer, FakeMailAccount
+
+
+@pytest.fixture
+def server(http_responses):
+    return FakeJMAPServer(http_responses)
+
+
+@pytest.fixture
+def account(server):
+    account = FakeMailAccount(server)
+    account.add_mailbox("MB1", "Inbox", role="inbox", unreadEmails=3)
+    account.add_mailbox("MB2", "Lists", parentId="MB1", sortOrder=2)
+    account.add_mailbox("MB3", "Python", parentId="MB2")
+    account.add_mailbox("MB4", "Archive", parentId="MB1", sortOrder=1)
+    account.add_mailbox("MB5", "Archive", role="archive", sortOrder=5)
+    return account
+
+
+@pytest.fixture
+def cache(client, account):
+    cache = MailboxCache(client)
+    cache.refresh()
+    return cache
+
+
+def test_mailbox_cache_lookups(cache, server):
+    assert len(cache) == 5
+    assert cache.by_role("Inbox").id == "MB1"
+    assert cache.by_role("drafts") is None
+    assert sorted(m.id for m in cache.by_name("Archive")) == ["MB4", "MB5"]
+    assert cache.by_path("Inbox/Lists/Python").id == "MB3"
+    assert cache.path("MB4") == "Inbox/Archive"
+    assert [m.id for m in cache.ancestors("MB3")] == ["MB1", "MB2"]
+    assert [m.id for m in cache.children("MB1")] == ["MB4", "MB2"]
+    assert [(depth, m.id) for depth, m in cache.walk()] == [
+        (0, "MB1"),
+        (1, "MB4"),
+        (1, "MB2"),
+        (2, "MB3"),
+        (0, "MB5"),
+    ]
+    assert [(depth, m.id) for depth, m in cache.walk("MB2")] == [(0, "MB3")]
+    assert server.api_requests == 1
+
+
+def test_mailbox_cache_refresh(cache, account, server):
+    account.add_mailbox("MB6", "Rust", parentId="MB2")
+    account.add_mailbox("MB4", "Old", parentId="MB5")
+    account.destroy("Mailbox", "MB3")
+    cache.refresh()
+    assert cache.by_path("Inbox/Lists/Rust").id == "MB6"
+    assert cache.by_path("Archive/Old").id == "MB4"
+    assert cache.by_path("Inbox/Archive") is None
+    assert "MB3" not in cache
+    assert [m.id for m in cache.children("MB2")] == ["MB6"]
+    assert cache.state == account.state("Mailbox")
+
+
+def test_mailbox_cache_refresh_counts(cache, account, server):
+    account.updated_properties = ["unreadEmails"]
+    account.add_mailbox("MB1", "Renamed", role="inbox", unreadEmails=4)
+    cache.refresh()
+    inbox = cache.by_path("Inbox")
+    assert inbox.unread_emails == 4
+    assert cache.by_role("inbox") is inbox
+    assert cache.children()[0] is inbox
+    updated_get = server.calls("Mailbox/get")[-1]
+    assert updated_get == {
+        "accountId": "u1138",
+        "ids": ["MB1"],
+        "properties": ["unreadEmails"],
+    }
+
+
+def test_mailbox_cache_reload(cache, account, server):
+    account.add_mailbox("MB6", "Rust", parentId="MB2")
+    account.min_state["Mailbox"] = 6
+    cache.refresh()
+    assert cache.path("MB6") == "Inbox/Lists/Rust"
+    assert "ids" not in server.calls("Mailbox/get")[-1]
@@ -0,0 +1,197 @@
+import itertools
+import json
+import re
+
+import pytest
+import responses
+
+from jmaplib import Client
+from jmaplib.importer import ImportCheckpoint
+from jmaplib.migration import Migration, map_mailboxes
+from tests.data import make_session_response
+from tests.fake_server import FakeJMAPServer, FakeMailAccount
+
+DOWNLOAD_URL = re.compile(r"https://jmap-api\.localhost/jmap/download/u1138/(\w+)/")
+DESTINATION_URL = "https://jmap-dest.localhost"
+
+
+def raw_message(i):
+    return f"Subject: Message {i}\r\nMessage-ID: <{i}@example.net>\r\n\r\nBody\r\n"
+
+
+@pytest.fixture
+def source(http_responses):
+    account = FakeMailAccount(FakeJMAPServer(http_responses))
+    account.blobs = {}
+    account.add_mailbox("MB1", "Inbox", role="inbox")
+    account.add_mailbox("MB2", "Projects")
+    account.add_mailbox("MB3", "Archive", parentId="MB2")
+    for i, mailbox_id in enumerate(["MB1", "MB3", "MB1", "MB2"]):
+        data = raw_message(i).encode()
+        account.blobs[f"B{i}"] = data
+        account.add_email(
+            f"M{i}",
+            mailbox_id,
+            blobId=f"B{i}",
+            size=len(data),
+            messageId=[f"{i}@example.net"],
+            keywords={"$seen": True} if i % 2 else {},
+        )
+    return account
+
+
+@pytest.fixture
+def destination(http_responses):
+    session = make_session_response()
+    for key in ("apiUrl", "downloadUrl", "uploadUrl", "eventSourceUrl"):
+        session[key] = session[key].replace(
+            "https://jmap-api.localhost", DESTINATION_URL
+        )
+    http_responses.add(
+        responses.GET,
+        f"{DESTINATION_URL}/.well-known/jmap",
+        body=json.dumps(session),
+    )
+    server = FakeJMAPServer(http_responses, url=f"{DESTINATION_URL}/api")
+    account = FakeMailAccount(server)
+    account.server = server
+    account.blobs = {}
+    account.add_mailbox("D1", "INBOX", role="inbox")
+    account.add_mailbox("D2", "Projects")
+    account.add_email("D3", "D1", messageId=["2@example.net"])
+
+    def _mailbox_set(arguments):
+        created = {}
+        for creation_id, mailbox in arguments["create"].items():
+            mailbox_id = f"D{len(account.objects['Mailbox']) + 10}"
+            account.set("Mailbox", {**mailbox, "id": mailbox_id})
+            created[creation_id] = {"id": mailbox_id}
+        return {
+            "accountId": "u1138",
+            "oldState": "0",
+            "newState": "1",
+            "created": created,
+            "updated": None,
+            "destroyed": None,
+        }
+
+    def _import(arguments):
+        created = {}
+        for creation_id, email in arguments["emails"].items():
+            email_id = f"D{email['blobId']}"
+            account.set("Email", {**email, "id": email_id})
+            created[creation_id] = {"id": email_id}
+        return {
+            "accountId": "u1138",
+            "oldState": "0",
+            "newState": "1",
+            "created": created,
+        }
+
+    server.on("Mailbox/set", _mailbox_set)
+    server.on("Email/import", _import)
+    return account
+
+
+@pytest.fixture
+def transfers(http_responses, source, destination):
+    def _download(request):
+        blob_id = DOWNLOAD_URL.match(request.url).group(1)
+        return 200, {}, source.blobs[blob_id]
+
+    counter = itertools.count()
+
+    def _upload(request):
+        blob_id = f"U{next(counter)}"
+        body = request.body
+        destination.blobs[blob_id] = body if isinstance(body, bytes) else b"".join(body)
+        size = len(destination.blobs[blob_id])
+        assert int(request.headers["Content-Length"]) == size
+        blob = {"accountId": "u1138", "blobId": blob_id, "type": "message/rfc822"}
+        return 200, {}, json.dumps({**blob, "size": size})
+
+    http_responses.add_callback(responses.GET, DOWNLOAD_URL, callback=_download)
+    http_responses.add_callback(
+        responses.POST, f"{DESTINATION_URL}/jmap/upload/u1138/", callback=_upload
+    )
+
+
+@pytest.fixture
+def destination_client():
+    return Client(host="jmap-dest.localhost", auth=("ness", "pk_fire"))
+
+
+def test_map_mailboxes(client, destination_client, source, destination):
+    mapping = map_mailboxes(client, destination_client)
+    assert mapping == {"MB1": "D1", "MB2": "D2", "MB3": "D12"}
+    assert destination.objects["Mailbox"]["D12"] == {
+        "id": "D12",
+        "name": "Archive",
+        "parentId": "D2",
+        "sortOrder": 0,
+        "isSubscribed": False,
+    }
+    # Mailboxes created by an earlier run are reused
+    assert map_mailboxes(client, destination_client) == mapping
+    assert len(destination.server.calls("Mailbox/set")) == 1
+
+
+def test_migration(client, destination_client, source, destination, transfers, tempdir):
+    checkpoint = ImportCheckpoint(tempdir / "checkpoint")
+    stats = Migration(
+        client, destination_client, checkpoint=checkpoint, workers=2, batch_size=2
+    ).run()
+    assert (stats.imported, stats.failed, stats.skipped) == (3, 0, 1)
+    assert stats.bytes == sum(len(source.blobs[f"B{i}"]) for i in (0, 1, 3))
+    imports = destination.server.calls("Email/import")
+    assert [len(c["emails"]) for c in imports] == [2, 1]
+    emails = {
+        email["blobId"]: email
+        for email in destination.objects["Email"].values()
+        if "blobId" in email
+    }
+    assert sorted(destination.blobs[b] for b in emails) == sorted(
+        source.blobs[f"B{i}"] for i in (0, 1, 3)
+    )
+    migrated = {destination.blobs[b]: email for b, email in emails.items()}
+    assert migrated[source.blobs["B1"]]["mailboxIds"] == {"D12": True}
+    assert migrated[source.blobs["B1"]]["keywords"] == {"$seen": True}
+    assert migrated[source.blobs["B1"]]["receivedAt"] == "2024-01-01T00:00:01Z"
+    assert checkpoint.done == {"M0", "M1", "M3"}
+    # Migrated emails are skipped without transferring them again
+    stats = Migration(
+        client, destination_client, checkpoint=tempdir / "checkpoint"
+    ).run()
+    assert (stats.imported, stats.skipped) == (0, 4)
+    assert len(destination.server.calls("Email/import")) == 2
+
+
+def test_migration_retries_failed_message_id(
+    client, destination_client, source, destination, transfers
+):
+    data = raw_message(0).encode()
+    source.blobs["B4"] = data
+    source.add_email(
+        "M4", "MB1", blobId="B4", size=len(data), messageId=["0@example.net"]
+    )
+    import_email = destination.server.handlers["Email/import"]
+    calls = itertools.count()
+
+    def _import(arguments):
+        if next(calls):
+            return import_email(arguments)
+        # The first copy of the Message-ID doesn't arrive
+        return {
+            "accountId": "u1138",
+            "oldState": "0",
+            "newState": "1",
+            "created": None,
+            "notCreated": {
+                creation_id: {"type": "overQuota"}
+                for creation_id in arguments["emails"]
+            },
+        }
+
+    destination.server.on("Email/import", _import)
+    stats = Migration(client, destination_client, batch_size=1).run()
+    assert (stats.imported, stats.failed, stats.skipped) == (3, 1, 1)
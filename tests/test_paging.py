@@ -0,0 +1,163 @@
+import pytest
+
+from jmaplib import ClientError, Email, EmailQueryFilterCondition
+from jmaplib.methods import EmailGet, EmailQuery
+from jmaplib.paging import QueryChangedError, iter_query_pages
+from tests.fake_server import FakeJMAPServer, MethodError
+
+
+class FakeMailbox:
+    def __init__(self, server, count=10):
+        self.ids = [f"E{i:02}" for i in range(count)]
+        self.query_state = "q1"
+        server.on("Email/query", self.query)
+        server.on("Email/get", self.get)
+        self.server = server
+        self.after_query = None
+
+    def query(self, arguments):
+        if "anchor" in arguments:
+            if arguments["anchor"] not in self.ids:
+                raise MethodError("anchorNotFound")
+            position = self.ids.index(arguments["anchor"]) + arguments.get(
+                "anchorOffset", 0
+            )
+        else:
+            position = arguments.get("position", 0)
+        limit = min(arguments.get("limit", 100), 4)
+        response = {
+            "accountId": "u1138",
+            "queryState": self.query_state,
+            "canCalculateChanges": True,
+            "position": position,
+            "ids": self.ids[position : position + limit],
+            "limit": limit,
+        }
+        if self.after_query:
+            self.after_query()
+        return response
+
+    def get(self, arguments):
+        return {
+            "accountId": "u1138",
+            "list": [
+                {"id": i, "subject": f"Subject {i}"} for i in reversed(arguments["ids"])
+            ],
+            "notFound": [],
+            "state": "s1",
+        }
+
+
+@pytest.fixture
+def server(http_responses):
+    return FakeJMAPServer(http_responses)
+
+
+def test_iter_query_with_get(client, server):
+    FakeMailbox(server)
+    emails = list(
+        client.iter_query(
+            EmailQuery(filter=EmailQueryFilterCondition(in_mailbox="MBX1")),
+            page_size=4,
+            get=EmailGet(ids=None, properties=["id", "subject"]),
+        )
+    )
+    assert emails == [
+        Email(id=f"E{i:02}", subject=f"Subject E{i:02}") for i in range(10)
+    ]
+    assert server.api_requests == 3
+    queries = server.calls("Email/query")
+    assert [(q.get("position"), q.get("anchor")) for q in queries] == [
+        (0, None),
+        (None, "E03"),
+        (None, "E07"),
+    ]
+    assert all(q["filter"] == {"inMailbox": "MBX1"} for q in queries)
+    assert all(q["limit"] == 4 for q in queries)
+    assert [g["ids"] for g in server.calls("Email/get")] == [
+        ["E00", "E01", "E02", "E03"],
+        ["E04", "E05", "E06", "E07"],
+        ["E08", "E09"],
+    ]
+
+
+def test_iter_query_ids_only(client, server):
+    FakeMailbox(server, count=8)
+    assert list(client.iter_query(EmailQuery(), page_size=10)) == [
+        f"E{i:02}" for i in range(8)
+    ]
+    # The server limited the page size to 4, paging continues until a short page
+    assert server.api_requests == 3
+    assert not server.calls("Email/get")
+
+
+def test_iter_query_limit(client, server):
+    FakeMailbox(server)
+    assert list(client.iter_query(EmailQuery(limit=6), page_size=4)) == [
+        f"E{i:02}" for i in range(6)
+    ]
+    assert server.api_requests == 2
+
+
+def test_iter_query_pages(client, server):
+    FakeMailbox(server, count=5)
+    pages = list(
+        iter_query_pages(client, EmailQuery(), page_size=4, get=EmailGet(ids=None))
+    )
+    assert [(p.position, p.ids, p.query_state, p.state) for p in pages] == [
+        (0, ["E00", "E01", "E02", "E03"], "q1", "s1"),
+        (4, ["E04"], "q1", "s1"),
+    ]
+
+
+def test_iter_query_state_changed(client, server):
+    mailbox = FakeMailbox(server)
+
+    def _insert_email():
+        mailbox.query_state = "q2"
+        mailbox.ids.insert(0, "E99")
+
+    mailbox.after_query = _insert_email
+    ids = list(client.iter_query(EmailQuery(), page_size=4))
+    # Anchor-based paging neither repeats nor skips ids after the insertion
+    assert ids == [f"E{i:02}" for i in range(10)]
+
+
+def test_iter_query_state_changed_strict(client, server):
+    mailbox = FakeMailbox(server)
+
+    def _change_state():
+        mailbox.query_state = "q2"
+
+    mailbox.after_query = _change_state
+    pages = iter_query_pages(client, EmailQuery(), page_size=4, strict=True)
+    next(pages)
+    with pytest.raises(QueryChangedError):
+        next(pages)
+
+
+def test_iter_query_anchor_not_found(client, server):
+    mailbox = FakeMailbox(server)
+
+    def _remove_last_seen():
+        if "E03" in mailbox.ids:
+            mailbox.ids.remove("E03")
+
+    mailbox.after_query = _remove_last_seen
+    ids = list(client.iter_query(EmailQuery(), page_size=4))
+    assert ids == ["E00", "E01", "E02", "E03", "E05", "E06", "E07", "E08", "E09"]
+    assert [(q.get("position"), q.get("anchor")) for q in server.calls("Email/query")][
+        1:3
+    ] == [(None, "E03"), (4, None)]
+
+
+def test_iter_query_error(client, server):
+    def _fail(arguments):
+        raise MethodError("unsupportedFilter")
+
+    server.on("Email/query", _fail)
+    with pytest.raises(ClientError) as e:
+        list(client.iter_query(EmailQuery()))
+    assert (
+        str(e.value) == 'Method call single.Email/query failed with "unsupportedFilter"'
+    )
@@ -0,0 +1,97 @@
+import pytest
+import requests
+
+from jmaplib.auth import BearerAuth
+from jmaplib.methods import CoreEcho, CoreEchoResponse
+from jmaplib.pool import ClientPool, credential_key
+from tests.fake_server import FakeJMAPServer
+
+
+@pytest.fixture
+def pool():
+    with ClientPool(max_clients=3) as pool:
+        yield pool
+
+
+@pytest.fixture
+def jmap(http_responses):
+    jmap = FakeJMAPServer(http_responses)
+    jmap.on("Core/echo", lambda arguments: arguments)
+    return jmap
+
+
+def test_pool_shares_sessions(pool, jmap, http_responses):
+    auth = ("ness", "pk_fire")
+    primary = pool.client("jmap-example.localhost", auth)
+    shared = pool.client("jmap-example.localhost", auth, account_id="u2000")
+    assert pool.client("jmap-example.localhost", auth) is primary
+    assert primary.account_id == "u1138"
+    assert shared.account_id == "u2000"
+    # The session resource was only fetched once for both accounts
+    assert shared.jmap_session is primary.jmap_session
+    assert shared.requests_session is primary.requests_session
+    assert shared.executor is primary.executor
+    assert shared.websocket is None
+    assert len(http_responses.calls) == 1
+    assert shared.request(CoreEcho(data={"x": 1})) == CoreEchoResponse(data={"x": 1})
+
+
+def test_pool_credentials(pool, http_responses):
+    first = pool.client("jmap-example.localhost", ("ness", "pk_fire"))
+    second = pool.client("jmap-example.localhost", ("paula", "psi_freeze"))
+    assert first.requests_session is not second.requests_session
+    assert first.requests_session.get_adapter(
+        "https://jmap-example.localhost/"
+    ) is second.requests_session.get_adapter("https://jmap-api.localhost/")
+    assert len(http_responses.calls) == 2
+
+
+def test_pool_evicts_least_recently_used(pool, http_responses):
+    auth = ("ness", "pk_fire")
+    clients = [
+        pool.client("jmap-example.localhost", auth, account_id=f"u{i}")
+        for i in range(3)
+    ]
+    pool.client("jmap-example.localhost", auth, account_id="u0")
+    pool.client("jmap-example.localhost", auth, account_id="u3")
+    assert len(pool) == 3
+    # u1 was used least recently and has been closed
+    with pytest.raises(RuntimeError):
+        clients[1].executor  # noqa: B018
+    assert pool.client("jmap-example.localhost", auth, account_id="u0") is clients[0]
+    assert pool.client("jmap-example.localhost", auth, account_id="u2") is clients[2]
+    # Closing an evicted client leaves the shared executor running
+    future = clients[2].executor.submit(lambda: "PK Fire")
+    assert future.result() == "PK Fire"
+    assert pool.client("jmap-example.localhost", auth, account_id="u1") is not (
+        clients[1]
+    )
+
+
+def test_pool_refreshes_session(pool, jmap, http_responses, monkeypatch):
+    auth = ("ness", "pk_fire")
+    first = pool.client("jmap-example.localhost", auth)
+    handle_request = jmap.handle_request
+
+    def changed_session_state(body):
+        return {**handle_request(body), "sessionState": "new;session;state"}
+
+    monkeypatch.setattr(jmap, "handle_request", changed_session_state)
+    first.request(CoreEcho(data={}))
+    assert len(http_responses.calls) == 2
+    # The next client fetches the session resource again
+    pool.client("jmap-example.localhost", auth, account_id="u2000")
+    assert len(http_responses.calls) == 3
+
+
+@pytest.mark.parametrize(
+    ["auth", "key"],
+    [
+        (None, None),
+        (("ness", "pk_fire"), ("ness", "pk_fire")),
+        (requests.auth.HTTPBasicAuth("ness", "pk_fire"), ("ness", "pk_fire")),
+        (BearerAuth("token"), ("Bearer", "token")),
+    ],
+)
+def test_credential_key(auth, key):
+    assert credential_key(auth) == key
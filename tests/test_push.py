@@ -0,0 +1,103 @@
+import pytest
+
+from jmaplib import Event, StateChange, TypeState
+from jmaplib.push import PushUpdater
+from jmaplib.sync import MailStore, SyncEngine
+from tests.fake_server import FakeJMAPServer, FakeMailAccount
+
+
+@pytest.fixture
+def server(http_responses):
+    return FakeJMAPServer(http_responses)
+
+
+@pytest.fixture
+def account(server):
+    account = FakeMailAccount(server)
+    account.add_mailbox("MBX1", "Inbox")
+    account.add_email("E1", "MBX1")
+    return account
+
+
+def state_change(account, account_id="u1138", **overrides):
+    states = {
+        "email": account.state("Email"),
+        "mailbox": account.state("Mailbox"),
+        "thread": account.state("Thread"),
+    }
+    return StateChange(
+        changed={account_id: TypeState(**{**states, **overrides})}, type="StateChange"
+    )
+
+
+def test_push_updater(client, server, account):
+    received = []
+    updater = PushUpdater(client)
+    updater.register("Email", lambda *args: received.append(args))
+    updater.handle(state_change(account))
+    # The first event only records the known states
+    assert not received
+    assert not server.method_calls
+    account.add_email("E2", "MBX1", subject="New")
+    updater.handle(Event(id="1", data=state_change(account)))
+    assert len(received) == 1
+    account_id, type_name, page = received[0]
+    assert (account_id, type_name) == ("u1138", "Email")
+    assert [e.subject for e in page.created] == ["New"]
+    # Thread changed as well, but has no callbacks
+    assert [name for name, _ in server.method_calls] == [
+        "Email/changes",
+        "Email/get",
+        "Email/get",
+    ]
+    assert updater.states["u1138"] == {
+        "Email": account.state("Email"),
+        "Mailbox": account.state("Mailbox"),
+        "Thread": account.state("Thread"),
+    }
+
+
+def test_push_updater_unchanged(client, server, account):
+    received = []
+    updater = PushUpdater(client, fetch=False)
+    updater.register("Mailbox", lambda *args: received.append(args))
+    updater.set_state("u1138", "Mailbox", account.state("Mailbox"))
+    account.add_email("E2", "MBX1")
+    updater.run([state_change(account), state_change(account, account_id="u2000")])
+    assert not received
+    assert not server.method_calls
+    account.add_mailbox("MBX2", "Archive")
+    updater.handle(state_change(account))
+    assert [page.created for _, _, page in received] == [["MBX2"]]
+
+
+def test_push_updater_cannot_calculate_changes(client, server, account):
+    received = []
+    updater = PushUpdater(client)
+    updater.register("Email", lambda *args: received.append(args))
+    updater.set_state("u1138", "Email", "0")
+    account.min_state["Email"] = 1
+    updater.handle(state_change(account))
+    assert received == [("u1138", "Email", None)]
+    assert updater.states["u1138"]["Email"] == account.state("Email")
+
+
+def test_push_updater_sync_engine(client, server, account):
+    store = MailStore()
+    engine = SyncEngine(client, store)
+    engine.sync()
+    updater = PushUpdater(client)
+    for type_name in ("Mailbox", "Email", "Thread"):
+        updater.register(type_name, engine.apply)
+        updater.set_state("u1138", type_name, store.get_state("u1138", type_name))
+    account.add_email("E2", "MBX1")
+    account.destroy("Email", "E1")
+    updater.handle(state_change(account))
+    assert store.ids("u1138", "Email") == ["E2"]
+    assert store.get_state("u1138", "Email") == account.state("Email")
+    assert store.thread("u1138", "TE2").email_ids == ["E2"]
+
+
+def test_push_updater_unsupported_type(client):
+    with pytest.raises(ValueError, match="not supported"):
+        PushUpdater(client).register("CalendarEvent", print)
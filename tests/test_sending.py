@@ -0,0 +1,186 @@
+import time
+
+import pytest
+import requests
+
+from jmaplib import Address, Email, Envelope, SetError
+from jmaplib.sending import EmailSender, OutgoingEmail, TokenBucket
+from tests.fake_server import FakeJMAPServer, MethodError
+
+
+def email_set(arguments):
+    created, not_created = {}, {}
+    for creation_id, email in arguments["create"].items():
+        if email["subject"] == "Invalid":
+            not_created[creation_id] = {"type": "invalidProperties"}
+        else:
+            created[creation_id] = {"id": f"M{creation_id}"}
+    return {
+        "accountId": "u1138",
+        "oldState": "1",
+        "newState": "2",
+        "created": created,
+        "updated": None,
+        "destroyed": None,
+        "notCreated": not_created or None,
+    }
+
+
+def submission_set(arguments):
+    if any(
+        s["identityId"] != "I1" or s["emailId"] == "#draft9"
+        for s in arguments["create"].values()
+    ):
+        raise MethodError("forbidden")
+    created, not_created = {}, {}
+    for creation_id, submission in arguments["create"].items():
+        recipients = [
+            a["email"]
+            for a in (submission.get("envelope") or {}).get("rcptTo", [])
+            if a["email"].endswith(".invalid")
+        ]
+        if submission["emailId"] == "#draft1":
+            not_created[creation_id] = {"type": "notFound"}
+        elif recipients:
+            not_created[creation_id] = {
+                "type": "invalidRecipients",
+                "invalidRecipients": recipients,
+            }
+        else:
+            created[creation_id] = {"id": f"S{creation_id}"}
+    return {
+        "accountId": "u1138",
+        "oldState": "1",
+        "newState": "2",
+        "created": created,
+        "updated": None,
+        "destroyed": None,
+        "notCreated": not_created or None,
+    }
+
+
+@pytest.fixture
+def jmap(http_responses):
+    jmap = FakeJMAPServer(http_responses)
+    jmap.on("Email/set", email_set)
+    jmap.on("EmailSubmission/set", submission_set)
+    return jmap
+
+
+def test_send_emails(client, jmap):
+    emails = [
+        Email(subject="Hello", keywords={"$seen": True}),
+        Email(subject="Invalid"),
+        OutgoingEmail(
+            Email(subject="Hello"),
+            envelope=Envelope(
+                mail_from=Address(email="ness@onett.example.net"),
+                rcpt_to=[
+                    Address(email="paula@twoson.example.net"),
+                    Address(email="jeff@winters.invalid"),
+                ],
+            ),
+        ),
+        *[Email(subject="Hello") for _ in range(3)],
+    ]
+    sender = EmailSender(client, "I1", "MBdrafts", "MBsent", chunk_size=4)
+    result = sender.send(emails)
+    assert result.sent == {0: "Ssend0", 3: "Ssend3", 4: "Ssend4", 5: "Ssend5"}
+    assert result.not_created == {
+        1: SetError(type="invalidProperties"),
+        2: SetError(
+            type="invalidRecipients", invalid_recipients=["jeff@winters.invalid"]
+        ),
+    }
+    assert result.invalid_recipients == {2: ["jeff@winters.invalid"]}
+    # Drafts and their submissions are created in the same request
+    assert jmap.api_requests == 2
+    # Chunks are sent concurrently, so their requests may be in any order
+    drafts = next(
+        c["create"] for c in jmap.calls("Email/set") if "draft0" in c["create"]
+    )
+    assert sorted(drafts) == ["draft0", "draft1", "draft2", "draft3"]
+    assert drafts["draft0"]["mailboxIds"] == {"MBdrafts": True}
+    assert drafts["draft0"]["keywords"] == {"$seen": True, "$draft": True}
+    submission = next(
+        c for c in jmap.calls("EmailSubmission/set") if "send4" in c["create"]
+    )
+    assert submission["create"] == {
+        "send4": {"identityId": "I1", "emailId": "#draft4"},
+        "send5": {"identityId": "I1", "emailId": "#draft5"},
+    }
+    assert submission["onSuccessUpdateEmail"]["#send4"] == {
+        "keywords/$draft": None,
+        "mailboxIds/MBdrafts": None,
+        "mailboxIds/MBsent": True,
+    }
+
+
+def test_send_emails_without_sent_mailbox(client, jmap):
+    result = EmailSender(client, "I1", "MBdrafts").send([Email(subject="Hello")])
+    assert result.sent == {0: "Ssend0"}
+    submission = jmap.calls("EmailSubmission/set")[0]
+    assert submission["onSuccessDestroyEmail"] == ["#send0"]
+    assert "onSuccessUpdateEmail" not in submission
+
+
+def test_send_emails_method_error(client, jmap):
+    emails = [Email(subject="Hello") for _ in range(10)]
+    result = EmailSender(client, "I1", "MBdrafts", chunk_size=4).send(emails)
+    # The other chunks are still sent
+    assert sorted(result.sent) == [0, 2, 3, 4, 5, 6, 7]
+    assert result.not_created == {1: SetError(type="notFound")}
+    assert list(result.errors) == [2]
+    assert result.errors[2].type == "forbidden"
+
+
+def test_send_emails_transport_error(client, jmap):
+    handle_request = jmap.handle_request
+
+    def _handle_request(body):
+        calls = {name: arguments for name, arguments, _ in body["methodCalls"]}
+        if "draft4" in calls["Email/set"]["create"]:
+            raise requests.ConnectionError("connection reset")
+        response = handle_request(body)
+        # The server moves the sent emails with an implicit Email/set call
+        submission = response["methodResponses"][-1]
+        response["methodResponses"].append(
+            [
+                "Email/set",
+                {
+                    "accountId": "u1138",
+                    "oldState": "2",
+                    "newState": "3",
+                    "created": None,
+                    "updated": {"Mdraft0": None},
+                    "destroyed": None,
+                    "notUpdated": {"Mdraft3": {"type": "overQuota"}},
+                },
+                submission[2],
+            ]
+        )
+        return response
+
+    jmap.handle_request = _handle_request
+    emails = [Email(subject="Hello") for _ in range(6)]
+    result = EmailSender(client, "I1", "MBdrafts", "MBsent", chunk_size=4).send(emails)
+    # The chunk sent before the failed one is kept
+    assert result.sent == {0: "Ssend0", 2: "Ssend2", 3: "Ssend3"}
+    assert result.not_moved == {3: SetError(type="overQuota")}
+    assert list(result.errors) == [1]
+    assert isinstance(result.errors[1], requests.ConnectionError)
+
+
+def test_token_bucket(monkeypatch):
+    sleeps = []
+    now = [100.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    monkeypatch.setattr(time, "sleep", sleeps.append)
+    bucket = TokenBucket(rate=10, capacity=20)
+    assert bucket.acquire(15) == 0
+    assert bucket.acquire(10) == pytest.approx(0.5)
+    # Tokens are refilled over time, up to the capacity
+    now[0] += 10
+    assert bucket.acquire(20) == 0
+    assert bucket.acquire(40) == pytest.approx(4)
+    assert sleeps == [pytest.approx(0.5), pytest.approx(4)]
@@ -0,0 +1,163 @@
+import json
+import threading
+import time
+
+import pytest
+import responses
+
+from jmaplib import ClientError
+from jmaplib.methods import (
+    EmailChanges,
+    EmailChangesResponse,
+    EmailImport,
+    MailboxGet,
+    MailboxQuery,
+    MailboxSet,
+)
+from jmaplib.ref import Ref
+from jmaplib.singleflight import SingleFlight
+
+
+@pytest.fixture
+def changes_calls(http_responses):
+    release = threading.Event()
+    method_calls = []
+
+    def _callback(request):
+        release.wait(timeout=5)
+        method_responses = []
+        for name, arguments, call_id in json.loads(request.body)["methodCalls"]:
+            method_calls.append([name, arguments, call_id])
+            if arguments["sinceState"] == "error":
+                method_responses.append(
+                    ["error", {"type": "cannotCalculateChanges"}, call_id]
+                )
+                continue
+            method_responses.append(
+                [
+                    name,
+                    {
+                        "accountId": "u1138",
+                        "oldState": arguments["sinceState"],
+                        "newState": "3000",
+                        "hasMoreChanges": False,
+                        "created": ["f0001"],
+                        "updated": [],
+                        "destroyed": [],
+                    },
+                    call_id,
+                ]
+            )
+        return (
+            200,
+            {},
+            json.dumps(
+                {
+                    "methodResponses": method_responses,
+                    "sessionState": "test;session;state",
+                }
+            ),
+        )
+
+    http_responses.add_callback(
+        method=responses.POST,
+        url="https://jmap-api.localhost/api",
+        callback=_callback,
+    )
+    return method_calls, release
+
+
+def run_concurrently(single_flight, calls, release):
+    results = [None] * len(calls)
+
+    def _run(i, call):
+        results[i] = single_flight.request(call)
+
+    threads = [
+        threading.Thread(target=_run, args=(i, call)) for i, call in enumerate(calls)
+    ]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.1)
+    release.set()
+    for thread in threads:
+        thread.join(timeout=5)
+    return results
+
+
+def test_single_flight_identical_calls(client, changes_calls):
+    method_calls, release = changes_calls
+    single_flight = SingleFlight(client)
+    client.jmap_session  # noqa: B018  # fetch session before starting threads
+    results = run_concurrently(
+        single_flight,
+        [EmailChanges(since_state="2999") for _ in range(5)]
+        + [EmailChanges(since_state="2000")],
+        release,
+    )
+    assert len(method_calls) == 2
+    assert all(r is results[0] for r in results[:5])
+    assert results[0] == EmailChangesResponse(
+        account_id="u1138",
+        old_state="2999",
+        new_state="3000",
+        has_more_changes=False,
+        created=["f0001"],
+        updated=[],
+        destroyed=[],
+    )
+    assert results[5].old_state == "2000"
+    assert not single_flight._in_flight
+
+
+def test_single_flight_sequential_calls(client, changes_calls):
+    method_calls, release = changes_calls
+    release.set()
+    single_flight = SingleFlight(client)
+    single_flight.request(EmailChanges(since_state="2999"))
+    single_flight.request(EmailChanges(since_state="2999"))
+    assert len(method_calls) == 2
+
+
+def test_single_flight_raise_errors(client, changes_calls):
+    _, release = changes_calls
+    release.set()
+    single_flight = SingleFlight(client)
+    with pytest.raises(ClientError):
+        single_flight.request(EmailChanges(since_state="error"), raise_errors=True)
+
+
+def test_single_flight_http_error(client, http_responses):
+    http_responses.add(
+        method=responses.POST,
+        url="https://jmap-api.localhost/api",
+        status=503,
+    )
+    single_flight = SingleFlight(client)
+    with pytest.raises(Exception) as e:
+        single_flight.request(MailboxGet(ids=None))
+    assert e.value.response.status_code == 503
+    assert not single_flight._in_flight
+
+
+@pytest.mark.parametrize(
+    "method",
+    [
+        MailboxSet(destroy=["MBX1"]),
+        EmailImport(emails={}),
+        MailboxGet(ids=Ref("/ids")),
+    ],
+)
+def test_single_flight_not_deduplicated(client, method):
+    assert SingleFlight(client).key(method) is None
+
+
+def test_single_flight_key(client, http_responses):
+    single_flight = SingleFlight(client)
+    assert single_flight.key(MailboxQuery(limit=5)) == single_flight.key(
+        MailboxQuery(limit=5)
+    )
+    assert single_flight.key(MailboxQuery(limit=5)) != single_flight.key(
+        MailboxQuery(limit=6)
+    )
+    assert single_flight.key(MailboxGet(ids=None))[:2] == ("u1138", "Mailbox/get")
@@ -0,0 +1,204 @@
+import concurrent.futures
+import json
+import socket
+import threading
+
+import pytest
+import responses
+
+from jmaplib import Client, Event, StateChange, TypeState, constants
+from jmaplib.methods import CoreEcho, CoreEchoResponse, MailboxGet
+from jmaplib.websocket import WebSocketConnection, WebSocketError, WebSocketTransport
+from tests.data import make_session_response
+from tests.fake_server import FakeJMAPServer
+from tests.websocket_server import FakeProxy, FakeWebSocketServer
+
+
+@pytest.fixture
+def jmap():
+    jmap = FakeJMAPServer()
+    jmap.on("Core/echo", lambda arguments: arguments)
+    return jmap
+
+
+@pytest.fixture
+def ws_server(jmap):
+    server = FakeWebSocketServer(jmap)
+    yield server
+    server.close()
+
+
+@pytest.fixture
+def ws_session(http_responses_base, ws_server):
+    session_response = make_session_response()
+    session_response["capabilities"][constants.JMAP_URN_WEBSOCKET] = {
+        "url": ws_server.url,
+        "supportsPush": True,
+    }
+    http_responses_base.add(
+        method=responses.GET,
+        url="https://jmap-example.localhost/.well-known/jmap",
+        body=json.dumps(session_response),
+    )
+    return http_responses_base
+
+
+@pytest.fixture
+def ws_client(ws_session):
+    client = Client(host="jmap-example.localhost", auth=("ness", "pk_fire"))
+    yield client
+    if client.websocket:
+        client.websocket.close()
+
+
+@pytest.mark.parametrize("size", [0, 125, 126, 65535, 65536])
+def test_websocket_frames(size):
+    client_sock, server_sock = socket.socketpair()
+    client = WebSocketConnection(client_sock)
+    server = WebSocketConnection(server_sock, mask=False)
+    text = "x" * size
+    client.send_text(text)
+    assert server.recv_text() == text
+    server.send_text(text[::-1])
+    assert client.recv_text() == text[::-1]
+    client.close()
+    assert server.recv_text() is None
+    assert server.closed
+
+
+def test_websocket_request(ws_client, ws_server):
+    response = ws_client.request(CoreEcho(data={"who": "Ness"}))
+    assert response == CoreEchoResponse(data={"who": "Ness"})
+    assert ws_server.handshakes[0]["Sec-WebSocket-Protocol"] == "jmap"
+    assert ws_server.handshakes[0]["Authorization"].startswith("Basic ")
+    assert ws_server.messages == [
+        {
+            "@type": "Request",
+            "id": "r0",
+            "methodCalls": [["Core/echo", {"who": "Ness"}, "single.Core/echo"]],
+            "using": ["urn:ietf:params:jmap:core"],
+        }
+    ]
+
+
+def test_websocket_concurrent_requests(ws_client, ws_server, jmap):
+    release = threading.Event()
+
+    def _slow_echo(arguments):
+        release.wait(timeout=5)
+        return arguments
+
+    jmap.on("Core/echo", _slow_echo)
+    jmap.on(
+        "Mailbox/get",
+        lambda arguments: release.set()
+        or {
+            "accountId": "u1138",
+            "list": [],
+            "notFound": [],
+            "state": "1",
+        },
+    )
+    ws_client.jmap_session  # noqa: B018  # fetch session before starting threads
+    slow = ws_client.executor.submit(ws_client.request, CoreEcho(data={"n": 1}))
+    # The second request is answered first, which releases the first one
+    assert ws_client.request(MailboxGet(ids=None)).state == "1"
+    assert slow.result(timeout=5) == CoreEchoResponse(data={"n": 1})
+    assert len(ws_server.connections) == 1
+
+
+def test_websocket_push(ws_client, ws_server):
+    ws_client._last_event_id = "p0"
+    events = ws_client.events
+
+    def _push():
+        ws_server.push_enabled.wait(timeout=5)
+        ws_server.push({"changed": {"u1138": {"Email": "2"}}, "pushState": "p1"})
+
+    threading.Thread(target=_push).start()
+    assert next(events) == Event(
+        id="p1", data=StateChange(changed={"u1138": TypeState(email="2")})
+    )
+    assert ws_server.messages[-1] == {
+        "@type": "WebSocketPushEnable",
+        "pushState": "p0",
+    }
+    assert ws_client._last_event_id == "p1"
+
+
+def test_websocket_request_error(ws_client, ws_server):
+    future = ws_client.websocket.submit(_InvalidRequest())
+    with pytest.raises(WebSocketError, match="notRequest"):
+        future.result(timeout=5)
+
+
+def test_websocket_invalid_response():
+    client_sock, server_sock = socket.socketpair()
+    server = WebSocketConnection(server_sock, mask=False)
+    with WebSocketTransport(WebSocketConnection(client_sock)) as transport:
+        future = transport.submit(_InvalidRequest())
+        server.recv_text()
+        server.send_text(json.dumps({"@type": "Response", "requestId": "r0"}))
+        with pytest.raises(KeyError):
+            future.result(timeout=5)
+        # The connection is still usable after a response failed to decode
+        with pytest.raises(concurrent.futures.TimeoutError):
+            transport.request(_InvalidRequest(), timeout=0.01)
+        assert not transport._pending
+        assert not transport.closed
+    server.close()
+
+
+def test_websocket_reconnect(ws_client, ws_server):
+    ws_client.request(CoreEcho(data={}))
+    ws_server.disconnect()
+    with pytest.raises(WebSocketError):
+        ws_client.websocket.request(_InvalidRequest(), timeout=5)
+    assert ws_client.request(CoreEcho(data={"n": 2})) == CoreEchoResponse(data={"n": 2})
+    assert len(ws_server.handshakes) == 2
+
+
+def test_websocket_connect_once(ws_client, ws_server):
+    ws_client.jmap_session  # noqa: B018  # fetch session before starting threads
+    futures = [
+        ws_client.executor.submit(ws_client.request, CoreEcho(data={"n": i}))
+        for i in range(8)
+    ]
+    assert [future.result(timeout=5).data["n"] for future in futures] == list(range(8))
+    assert len(ws_server.handshakes) == 1
+
+
+def test_websocket_proxy(ws_client, ws_server):
+    proxy = FakeProxy()
+    ws_client.requests_session.proxies = {"http": proxy.url}
+    try:
+        assert ws_client.request(CoreEcho(data={})) == CoreEchoResponse(data={})
+    finally:
+        proxy.close()
+    assert proxy.targets == [ws_server.url.split("/")[2]]
+    assert len(ws_server.handshakes) == 1
+
+
+def test_websocket_disabled(ws_session, ws_server, jmap):
+    jmap_http = FakeJMAPServer(ws_session)
+    jmap_http.on("Core/echo", lambda arguments: arguments)
+    client = Client(
+        host="jmap-example.localhost", auth=("ness", "pk_fire"), use_websocket=False
+    )
+    assert client.request(CoreEcho(data={})) == CoreEchoResponse(data={})
+    assert client.websocket is None
+    assert not ws_server.handshakes
+
+
+def test_websocket_connection_failed(ws_session, ws_server, jmap):
+    jmap_http = FakeJMAPServer(ws_session)
+    jmap_http.on("Core/echo", lambda arguments: arguments)
+    ws_server.close()
+    client = Client(host="jmap-example.localhost", auth=("ness", "pk_fire"))
+    assert client.request(CoreEcho(data={})) == CoreEchoResponse(data={})
+    assert jmap_http.api_requests == 1
+
+
+class _InvalidRequest:
+    def to_dict(self, encode_json=False):
+        return {"using": []}
@@ -0,0 +1,165 @@
+from __future__ import annotations
+
+import base64
+import contextlib
+import hashlib
+import json
+import socket
+import threading
+from typing import TYPE_CHECKING, Any
+
+from jmaplib.websocket import WEBSOCKET_GUID, WebSocketConnection, WebSocketError
+
+if TYPE_CHECKING:
+    from tests.fake_server import FakeJMAPServer
+
+
+class FakeWebSocketServer:
+    """Local JMAP over WebSocket endpoint answering with a FakeJMAPServer."""
+
+    def __init__(self, jmap: FakeJMAPServer) -> None:
+        self.jmap = jmap
+        self.handshakes: list[dict[str, str]] = []
+        self.messages: list[dict[str, Any]] = []
+        self.connections: list[WebSocketConnection] = []
+        self.push_enabled = threading.Event()
+        self._listener = socket.create_server(("127.0.0.1", 0))
+        self._closed = False
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    @property
+    def url(self) -> str:
+        return f"ws://127.0.0.1:{self._listener.getsockname()[1]}/jmap/ws"
+
+    def push(self, state_change: dict[str, Any]) -> None:
+        for connection in self.connections:
+            connection.send_text(json.dumps({"@type": "StateChange", **state_change}))
+
+    def disconnect(self) -> None:
+        for connection in self.connections:
+            connection.close()
+
+    def close(self) -> None:
+        self._closed = True
+        # Shutting down wakes up the accept() call before closing the socket
+        with contextlib.suppress(OSError):
+            self._listener.shutdown(socket.SHUT_RDWR)
+        self._listener.close()
+        self.disconnect()
+
+    def _accept(self) -> None:
+        while not self._closed:
+            try:
+                sock, _ = self._listener.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._serve, args=(sock,), daemon=True).start()
+
+    def _handshake(self, sock: socket.socket) -> None:
+        data = b""
+        while b"\r\n\r\n" not in data:
+            data += sock.recv(4096)
+        lines = data.decode().split("\r\n")[1:]
+        headers = {
+            name.strip(): value.strip()
+            for name, _, value in (line.partition(":") for line in lines if line)
+        }
+        self.handshakes.append(headers)
+        accept = base64.b64encode(
+            hashlib.sha1(
+                (headers["Sec-WebSocket-Key"] + WEBSOCKET_GUID).encode(),
+                usedforsecurity=False,
+            ).digest()
+        ).decode()
+        sock.sendall(
+            (
+                "HTTP/1.1 101 Switching Protocols\r\n"
+                "Upgrade: websocket\r\n"
+                "Connection: Upgrade\r\n"
+                f"Sec-WebSocket-Accept: {accept}\r\n"
+                "Sec-WebSocket-Protocol: jmap\r\n\r\n"
+            ).encode()
+        )
+
+    def _serve(self, sock: socket.socket) -> None:
+        self._handshake(sock)
+        connection = WebSocketConnection(sock, mask=False)
+        self.connections.append(connection)
+        try:
+            while (text := connection.recv_text()) is not None:
+                message = json.loads(text)
+                self.messages.append(message)
+                if message["@type"] == "WebSocketPushEnable":
+                    self.push_enabled.set()
+                    continue
+                # Requests are answered concurrently, possibly out of order
+                threading.Thread(
+                    target=self._respond, args=(connection, message), daemon=True
+                ).start()
+        except (OSError, WebSocketError):
+            pass
+
+    def _respond(
+        self, connection: WebSocketConnection, message: dict[str, Any]
+    ) -> None:
+        if message["@type"] != "Request" or "methodCalls" not in message:
+            response = {
+                "@type": "RequestError",
+                "requestId": message.get("id"),
+                "type": "urn:ietf:params:jmap:error:notRequest",
+                "status": 400,
+                "detail": "Invalid request",
+            }
+        else:
+            response = {
+                "@type": "Response",
+                "requestId": message["id"],
+                **self.jmap.handle_request(message),
+            }
+        connection.send_text(json.dumps(response))
+
+
+class FakeProxy:
+    """Local HTTP proxy tunnelling CONNECT requests to their target."""
+
+    def __init__(self) -> None:
+        self.targets: list[str] = []
+        self._listener = socket.create_server(("127.0.0.1", 0))
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self._listener.getsockname()[1]}"
+
+    def close(self) -> None:
+        with contextlib.suppress(OSError):
+            self._listener.shutdown(socket.SHUT_RDWR)
+        self._listener.close()
+
+    def _accept(self) -> None:
+        while True:
+            try:
+                sock, _ = self._listener.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._tunnel, args=(sock,), daemon=True).start()
+
+    def _tunnel(self, sock: socket.socket) -> None:
+        data = b""
+        while b"\r\n\r\n" not in data:
+            data += sock.recv(4096)
+        target = data.decode().split(" ", 2)[1]
+        self.targets.append(target)
+        host, _, port = target.rpartition(":")
+        upstream = socket.create_connection((host, int(port)))
+        sock.sendall(b"HTTP/1.1 200 Connection established\r\n\r\n")
+        threading.Thread(target=self._pipe, args=(upstream, sock), daemon=True).start()
+        self._pipe(sock, upstream)
+
+    @staticmethod
+    def _pipe(source: socket.socket, destination: socket.socket) -> None:
+        with contextlib.suppress(OSError):
+            while data := source.recv(65536):
+                destination.sendall(data)
+        with contextlib.suppress(OSError):
+            destination.shutdown(socket.SHUT_WR)